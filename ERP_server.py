@@ -11,15 +11,12 @@ import threading
 import sqlite3
 import argparse
 from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
 from flask import Flask, jsonify, send_from_directory
 from flask_login import LoginManager
 import flask.cli
-from models import db, User
-from blueprints.orders import orders_bp
-from blueprints.lager import lager_bp
-from blueprints.email_notify import email_bp, notification_scheduler
-from blueprints.config import config_bp
-from blueprints.auth import auth_bp
+from models import db, User, READONLY_BIND
+from migrations import LATEST_VERSION, run_migrations, schema_version
 
 
 def load_erp_config():
@@ -79,57 +76,172 @@ def configure_logging(app, level):
     root_logger.info(f"Logging configured: level={logging.getLevelName(level)}, log_file={log_file}")
 
 
-def create_app():
-    """Application factory pattern."""
-    logger = logging.getLogger(__name__)
-    logger.info("Creating Flask application...")
-    
+def configure_database(app, data_dir=None):
+    """DATA_DIR, SQLite engines (read-write + read-only bind) and db.init_app. Returns db_file."""
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DATA_DIR = os.path.join(BASE_DIR, 'data')
-    IMAGES_DIR = os.path.join(BASE_DIR, 'images')
-
-    logger.debug(f"BASE_DIR: {BASE_DIR}")
-    logger.debug(f"DATA_DIR: {DATA_DIR}")
-    logger.debug(f"IMAGES_DIR: {IMAGES_DIR}")
-
+    DATA_DIR = data_dir or os.path.join(BASE_DIR, 'data')
     os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(IMAGES_DIR, exist_ok=True)
-    logger.info(f"Directories initialized: data={DATA_DIR}, images={IMAGES_DIR}")
-
-    app = Flask(
-        __name__,
-        static_folder='static',
-        template_folder='templates'
-    )
-
-    # ─── Configuration ─────────────────────────────────────────
     db_file = os.path.join(DATA_DIR, 'erp.db')
-    logger.info(f"Database file: {db_file}")
-    
+    logger = logging.getLogger(__name__)
+    logger.debug(f"Database file: {db_file}")
+
     def get_sqlite_connection():
         logger.debug("Creating SQLite connection with optimized settings")
         conn = sqlite3.connect(db_file, check_same_thread=False)
+        # Only takes effect on a new database (or the next full VACUUM);
+        # lets the maintenance scheduler run incremental_vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("PRAGMA synchronous=OFF")
         conn.execute("PRAGMA temp_store=MEMORY")
         conn.execute("PRAGMA cache_size=-32000")
         return conn
-    
+
+    def get_readonly_connection():
+        # Readers in WAL mode never wait on the writer; query_only guards
+        # against accidental writes through this pool.
+        logger.debug("Creating read-only SQLite connection")
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-32000")
+        return conn
+
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_file}"
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'creator': get_sqlite_connection
     }
+    # List and report endpoints marked with @read_only use this engine
+    app.config['SQLALCHEMY_BINDS'] = {
+        READONLY_BIND: {
+            'url': f"sqlite:///{db_file}",
+            'creator': get_readonly_connection
+        }
+    }
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['IMAGES_DIR'] = IMAGES_DIR
     app.config['DATA_DIR'] = DATA_DIR
+    app.config['IMAGES_DIR'] = os.path.join(BASE_DIR, 'images')
+    db.init_app(app)
+    return db_file
+
+
+def missing_derived_schema(db_file):
+    """Names of the schema pieces kept outside the models that are missing.
+
+    Covers the FTS tables/triggers, the report index/triggers and the
+    rollup and customer backfills. Read-only probes on sqlite_master and
+    LIMIT 1 queries, cheap enough for every start; they catch an upgrade
+    that died after the user_version bump but before the ensure_* steps.
+    """
+    from blueprints.search import SEARCH_INDEXES
+    from blueprints.reports import REPORT_SCHEMA_OBJECTS
+
+    expected = set(REPORT_SCHEMA_OBJECTS)
+    for fts in SEARCH_INDEXES:
+        expected.update((fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au'))
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        missing = sorted(expected - existing)
+        if conn.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM sales_rollups) "
+            "AND EXISTS (SELECT 1 FROM orders WHERE status = 'realized')"
+        ).fetchone()[0]:
+            missing.append('sales_rollups backfill')
+        if conn.execute(
+            "SELECT 1 FROM orders WHERE customer_id IS NULL AND TRIM(customer) != '' LIMIT 1"
+        ).fetchone():
+            missing.append('customers backfill')
+    finally:
+        conn.close()
+    return missing
+
+
+def ensure_schema(app, db_file, force=False):
+    """Create/upgrade the schema, but only when PRAGMA user_version is behind.
+
+    A database already at LATEST_VERSION gets only the read-only
+    missing_derived_schema() check: no table reflection, no DDL and no
+    write lock at startup unless something has to be repaired. Otherwise
+    (or with force) this runs create_all, the pending migrations and the
+    schema that lives outside the models (FTS index, report index/triggers,
+    rollup and customer backfill). Returns True if anything was done.
+    """
+    logger = logging.getLogger(__name__)
+    current = schema_version(db_file)
+    if not force and current is not None and current >= LATEST_VERSION:
+        if current > LATEST_VERSION:
+            logger.warning(f"Database schema version {current} is newer than this code ({LATEST_VERSION})")
+            return False
+        missing = missing_derived_schema(db_file)
+        if not missing:
+            logger.debug(f"Schema up to date (user_version={current}), skipping create_all")
+            return False
+        logger.warning(f"Schema at user_version={current} but missing: {', '.join(missing)}; repairing")
+
+    from blueprints.search import ensure_search_index
+    from blueprints.reports import ensure_sales_rollups, ensure_report_schema
+    from blueprints.customers import ensure_customers
+
+    logger.info(f"Preparing database schema (user_version={current}, latest={LATEST_VERSION})")
+    with app.app_context():
+        # The read-only bind points at the same file and cannot run DDL
+        db.create_all(bind_key=None)
+        # Versioned migrations (PRAGMA user_version) before anything reads the schema
+        run_migrations(db_file)
+        ensure_search_index()
+        ensure_report_schema()
+        ensure_sales_rollups()
+        ensure_customers()
+    logger.info("Database schema ready")
+    return True
+
+
+def create_db_app(data_dir=None):
+    """Bare Flask app with only the database configured.
+
+    For scripts and CLI commands that need models and db.session but no
+    routes, login, metrics or templates.
+    """
+    app = Flask(__name__, static_folder=None)
+    db_file = configure_database(app, data_dir)
+    ensure_schema(app, db_file)
+    return app
+
+
+@contextmanager
+def db_context(data_dir=None):
+    """with db_context() as app: ... - create_db_app() inside an app context."""
+    app = create_db_app(data_dir)
+    with app.app_context():
+        yield app
+
+
+def create_app(data_dir=None):
+    """Application factory pattern.
+
+    data_dir overrides the default BASE_DIR/data location (used by
+    scripts that run against a scratch database).
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Creating Flask application...")
+
+    app = Flask(
+        __name__,
+        static_folder='static',
+        template_folder='templates'
+    )
+
+    # ─── Configuration ─────────────────────────────────────────
+    db_file = configure_database(app, data_dir)
+    DATA_DIR = app.config['DATA_DIR']
+    IMAGES_DIR = app.config['IMAGES_DIR']
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    logger.debug(f"Directories: data={DATA_DIR}, images={IMAGES_DIR}")
     app.config['SECRET_KEY'] = 'latice-sa-pricom-erp-secret'
 
     # ─── Initialize Extensions ─────────────────────────────────
-    logger.info("Initializing database...")
-    db.init_app(app)
-    
     # Flask-Login setup
-    logger.info("Initializing Flask-Login...")
     login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -145,10 +257,7 @@ def create_app():
             logger.warning(f"User not found: ID={user_id}")
         return user
 
-    with app.app_context():
-        logger.info("Creating database tables...")
-        db.create_all()
-        logger.info("Database tables created successfully")
+    ensure_schema(app, db_file)
 
     @app.context_processor
     def inject_config():
@@ -165,14 +274,36 @@ def create_app():
         return {'config': config}
 
     # ─── Register Blueprints ───────────────────────────────────
+    # Imported here so that scripts using create_db_app() never load them
+    from blueprints.auth import auth_bp
+    from blueprints.orders import orders_bp
+    from blueprints.lager import lager_bp
+    from blueprints.email_notify import email_bp
+    from blueprints.config import config_bp
+    from blueprints.search import search_bp
+    from blueprints.reports import reports_bp
+    from blueprints.customers import customers_bp
+    from metrics import init_metrics
+    from profiling import init_profiling
+    from health import init_health
+
     # Auth blueprint must be first (handles landing page at '/')
-    logger.info("Registering blueprints...")
+    logger.debug("Registering blueprints...")
     app.register_blueprint(auth_bp)
     app.register_blueprint(orders_bp)
     app.register_blueprint(lager_bp)
     app.register_blueprint(email_bp)
     app.register_blueprint(config_bp)
-    logger.info("All blueprints registered successfully")
+    app.register_blueprint(search_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(customers_bp)
+    logger.debug("All blueprints registered successfully")
+
+    # ─── Request Metrics ───────────────────────────────────────
+    init_metrics(app, db)
+
+    # ─── Request Profiling ─────────────────────────────────────
+    init_profiling(app)
 
     # ─── Serve Uploaded Images ─────────────────────────────────
     @app.route('/images/<path:filename>')
@@ -200,12 +331,8 @@ def create_app():
         logger.error(f"Internal server error (500): {e}", exc_info=True)
         return jsonify({'error': 'Greška na serveru', 'status': 500}), 500
 
-    # ─── Health Check ─────────────────────────────────────────
-    @app.route('/health')
-    def health_check():
-        """Health check endpoint"""
-        logger.debug("Health check requested")
-        return jsonify({'status': 'healthy','version': '1.0.0','database': 'connected'})
+    # ─── Health Checks ─────────────────────────────────────────
+    init_health(app)
 
     logger.info("Flask application created successfully")
     return app
@@ -242,6 +369,19 @@ def main():
         sys.exit(1)
         
     configure_logging(app, logging.DEBUG if debug else logging.INFO)
+    app.config['SLOW_QUERY_MS'] = float(erp_config.get('SLOW_QUERY_MS', app.config['SLOW_QUERY_MS']))
+    app.config['QUERY_COUNT_WARN'] = int(erp_config.get('QUERY_COUNT_WARN', app.config['QUERY_COUNT_WARN']))
+    app.config['PROFILE_SAMPLE_RATE'] = float(erp_config.get('PROFILE_SAMPLE_RATE', app.config['PROFILE_SAMPLE_RATE']))
+    for key in ('HEALTH_DB_WARN_MS', 'HEALTH_WAL_WARN_MB', 'HEALTH_DISK_WARN_MB', 'HEALTH_DISK_FAIL_MB'):
+        app.config[key] = float(erp_config.get(key, app.config[key]))
+    app.config['VERSION'] = erp_config.get('VERSION', 'unknown')
+    for key in ('MAINTENANCE_INTERVAL', 'WAL_CHECKPOINT_MB', 'ANALYZE_INTERVAL', 'IDLE_SECONDS'):
+        if key in erp_config:
+            app.config[key] = float(erp_config[key])
+
+    from blueprints.lager import stock_snapshot_scheduler
+    from blueprints.email_notify import notification_scheduler
+    from maintenance import maintenance_scheduler
 
     flask.cli.show_server_banner = lambda *args, **kwargs: None
 
@@ -250,6 +390,16 @@ def main():
     t.start()
     logger.info("Notification scheduler started")
 
+    logger.info("Starting stock snapshot scheduler thread...")
+    t = threading.Thread(target=stock_snapshot_scheduler, args=(app,), daemon=True)
+    t.start()
+    logger.info("Stock snapshot scheduler started")
+
+    logger.info("Starting database maintenance scheduler thread...")
+    t = threading.Thread(target=maintenance_scheduler, args=(app,), daemon=True)
+    t.start()
+    logger.info("Database maintenance scheduler started")
+
     app.logger.info("Starting ERP server on %s:%s (debug=%s)", host, port, debug)
     try:
         app.run(host=host, port=port, debug=debug, use_reloader=False)
@@ -23,15 +23,20 @@ mkdir -p "$LOG_DIR"
 
 echo "=== Backup started: $(date) ===" >> "$LOG_FILE"
 
-# Export to JSON
+# Consistent SQLite snapshot (online backup API) + retention rotation
 cd "$INSTALL_DIR"
-./venv/bin/python scripts/export_to_json.py >> "$LOG_FILE" 2>&1
+./venv/bin/python db_backup.py --data-dir "$DATA_DIR" >> "$LOG_FILE" 2>&1
+
+# Incremental export: only shards whose content changed are rewritten
+# Restore: ./venv/bin/python scripts/migrate_json.py --data-dir "$DATA_DIR" --from-export
+cd "$INSTALL_DIR"
+./venv/bin/python scripts/export_to_json.py --sharded --data-dir "$DATA_DIR" >> "$LOG_FILE" 2>&1
 
 sleep 10
 
-# Git backup
+# Git backup (-A also stages removed shards)
 cd "$DATA_DIR"
-git add *.json 2>> "$LOG_FILE"
+git add -A export 2>> "$LOG_FILE"
 git commit -m "Backup $(date '+%Y-%m-%d %H:%M')" >> "$LOG_FILE" 2>&1 || true
 git push origin master >> "$LOG_FILE" 2>&1
 
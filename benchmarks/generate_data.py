@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+generate_data.py - Fill a scratch ERP database with realistic synthetic data.
+
+Scale is the number of orders (10k to 1M); lager items, users and
+notification keys grow with it. Distributions roughly follow a real shop:
+most orders are realized, customers and products follow a long tail,
+realized orders are spread over two years (denser recently) and open
+orders are dated in the coming weeks.
+
+Rows are inserted with sqlite3 executemany while the FTS and change-log
+triggers are off; indexes, rollups and the search index are rebuilt once
+at the end, the same way scripts/migrate_json.py does it.
+
+Run:
+    python benchmarks/generate_data.py --scale 100000 --data-dir /tmp/erp_bench
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+
+# Ensure we can import from the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from werkzeug.security import generate_password_hash
+from ERP_server import create_db_app
+from blueprints.search import SEARCH_INDEXES, ensure_search_index
+from blueprints.reports import ensure_report_schema, ensure_sales_rollups
+from blueprints.customers import ensure_customers
+
+logger = logging.getLogger(__name__)
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-pass'
+BATCH_SIZE = 10000
+
+STATUS_WEIGHTS = (('realized', 70), ('for_delivery', 12), ('new', 18))
+PRODUCTS = (
+    ('Buket ruža', 3500), ('Venac', 6000), ('Aranžman u kutiji', 4200), ('Suvi buket', 2800),
+    ('Cvetna korpa', 5200), ('Bidermajer', 4800), ('Orhideja u saksiji', 3900),
+    ('Poklon paket', 2500), ('Buket lala', 2200), ('Ikebana', 4500), ('Mini buket', 1200),
+    ('Svadbeni aranžman', 9500),
+)
+COLORS = ('crvena', 'bela', 'roze', 'žuta', 'ljubičasta', 'plava', 'narandžasta', '')
+LOCATIONS = ('House', 'Radnja', 'Magacin')
+FIRST_NAMES = ('Ana', 'Marko', 'Jelena', 'Nikola', 'Milica', 'Stefan', 'Ivana', 'Luka', 'Jovana',
+               'Nemanja', 'Teodora', 'Đorđe', 'Katarina', 'Miloš', 'Sanja', 'Vuk', 'Dragana', 'Petar')
+LAST_NAMES = ('Jovanović', 'Petrović', 'Nikolić', 'Marković', 'Đorđević', 'Stojanović', 'Ilić',
+              'Stanković', 'Pavlović', 'Milošević', 'Todorović', 'Kostić', 'Popović', 'Živković')
+WORDS = ('hitno', 'dostava', 'preuzimanje', 'čestitka', 'rođendan', 'venčanje', 'godišnjica',
+         'pakovanje', 'mašna', 'bez', 'sa', 'poruka', 'popodne', 'ujutru', 'adresa')
+
+
+def _zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _order_date(rng, status, today):
+    if rng.random() < 0.02:
+        return ''
+    if status == 'realized':
+        # Triangular with mode 0: more recent days are more likely
+        offset = -int(rng.triangular(0, 730, 0))
+    elif status == 'for_delivery':
+        offset = rng.randint(-3, 10)
+    else:
+        offset = rng.randint(0, 30)
+    return (today + timedelta(days=offset)).strftime('%d.%m.%Y')
+
+
+def generate_rows(scale, seed=42, today=None):
+    """Build (users, lager, orders, notification keys) for `scale` orders."""
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    customers = list({f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+                      for _ in range(max(50, scale // 20))})
+    rng.shuffle(customers)
+    customer_weights = _zipf_weights(len(customers))
+    product_weights = _zipf_weights(len(PRODUCTS), 0.8)
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    created = datetime.now().isoformat(timespec='seconds')
+    n_users = 3 + scale // 100000
+    users = [(BENCH_USER, 'bench@example.com', password_hash, 1, 0, created)]
+    users += [(f'user{i}', f'user{i}@example.com', password_hash, 0, 0, created) for i in range(1, n_users)]
+
+    n_lager = max(20, scale // 200)
+    lager = []
+    for item_id in range(1, n_lager + 1):
+        name, base = rng.choices(PRODUCTS, product_weights)[0]
+        lager.append((item_id, name, base * 100, rng.choice(COLORS),
+                      rng.randint(0, 200), rng.choice(LOCATIONS), ''))
+
+    statuses = [s for s, _ in STATUS_WEIGHTS]
+    status_weights = [w for _, w in STATUS_WEIGHTS]
+    orders, keys = [], []
+    window_end = today + timedelta(days=7)
+    for order_id in range(1, scale + 1):
+        status = rng.choices(statuses, status_weights)[0]
+        name, base = rng.choices(PRODUCTS, product_weights)[0]
+        quantity = 1 if rng.random() < 0.6 else rng.randint(2, 5)
+        price = round(base * quantity * rng.uniform(0.8, 1.3), -1)
+        paid = rng.random() < (0.95 if status == 'realized' else 0.3)
+        order_date = _order_date(rng, status, today)
+        lager_id = rng.randint(1, n_lager) if rng.random() < 0.3 else None
+        description = ' '.join(rng.choices(WORDS, k=rng.randint(0, 8)))
+        orders.append((order_id, name, round(price * 100), paid, rng.choices(customers, customer_weights)[0],
+                       order_date, quantity, rng.choice(COLORS), description, '', status, lager_id))
+
+        # Open orders due within a week were already notified; older realized
+        # ones keep their historical keys
+        if order_date and (status != 'realized' or rng.random() < 0.1):
+            due = datetime.strptime(order_date, '%d.%m.%Y').date()
+            if status == 'realized' or today <= due <= window_end:
+                keys.append((f'{order_id}_{order_date}',))
+    return users, lager, orders, keys
+
+
+def generate(data_dir, scale, seed=42, progress=print):
+    """Create data_dir/erp.db filled with `scale` orders. Returns row counts."""
+    started = time.monotonic()
+    app = create_db_app(data_dir=data_dir)
+    db_file = os.path.join(data_dir, 'erp.db')
+
+    users, lager, orders, keys = generate_rows(scale, seed)
+    progress(f'  Generated rows in {time.monotonic() - started:.1f}s')
+
+    conn = sqlite3.connect(db_file, isolation_level=None, timeout=30)
+    try:
+        if conn.execute("SELECT (SELECT COUNT(*) FROM orders) + (SELECT COUNT(*) FROM users)").fetchone()[0]:
+            raise RuntimeError(f"{db_file} is not empty; use an empty data dir")
+        conn.execute("BEGIN IMMEDIATE")
+        for name in list(SEARCH_INDEXES) + ['order_changes']:
+            for suffix in ('ai', 'ad', 'au'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+        conn.executemany(
+            "INSERT INTO users (username, email, password_hash, is_admin, password_change_required, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", users)
+        conn.executemany(
+            "INSERT INTO lager (id, name, price_minor, color, quantity, location, image) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            lager)
+        conn.execute(
+            "INSERT INTO stock_movements (lager_id, delta, reason, created_at) "
+            "SELECT id, quantity, 'initial', ? FROM lager", (datetime.now().isoformat(timespec='seconds'),))
+        for i in range(0, len(orders), BATCH_SIZE):
+            conn.executemany(
+                "INSERT INTO orders (id, name, price_minor, paid, customer, date, quantity, color, description, "
+                "image, status, lager_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                orders[i:i + BATCH_SIZE])
+            progress(f'  Orders: {min(i + BATCH_SIZE, len(orders))}/{len(orders)}')
+        conn.executemany("INSERT OR IGNORE INTO notification_log (notify_key) VALUES (?)", keys)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    with app.app_context():
+        ensure_search_index()
+        ensure_report_schema()
+        ensure_sales_rollups()
+        ensure_customers()
+
+    counts = {'users': len(users), 'lager': len(lager), 'orders': len(orders), 'notification_log': len(keys)}
+    progress(f'  Done in {time.monotonic() - started:.1f}s: {counts}')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic ERP data for benchmarks')
+    parser.add_argument('--scale', type=int, default=10000, help='Broj porudžbina (10000 - 1000000)')
+    parser.add_argument('--data-dir', required=True, help='Prazan folder za erp.db')
+    parser.add_argument('--seed', type=int, default=42, help='Seed za ponovljive podatke')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='[%(levelname)s] - [%(name)s] - %(message)s')
+    os.makedirs(args.data_dir, exist_ok=True)
+    print(f'Generating {args.scale} orders into {args.data_dir}...')
+    generate(args.data_dir, args.scale, args.seed)
+    print(f'✓ Login: {BENCH_USER} / {BENCH_PASSWORD}')
+
+
+if __name__ == '__main__':
+    main()
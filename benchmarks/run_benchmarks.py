@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py - End-to-end benchmark suite with a JSON report.
+
+Drives create_app() through the Flask test client and times every API
+route on a scratch copy of a generated database, plus check_and_notify(),
+export_to_json.main (full and sharded), the schema migrations on a legacy
+Serbian-column database and migrate_json.main on legacy JSON files.
+Startup is timed in fresh interpreters (create_app vs create_db_app) and
+the report includes a `python -X importtime` breakdown for both.
+
+Each case runs --repeat times (after one warm-up for read routes); the
+report stores min / median / p95 / mean in milliseconds and, for HTTP
+routes, the SQL statement count from the X-Query-Count header. Compare
+two releases with --compare; medians slower than --threshold are listed
+and the exit code is 1.
+
+Run:
+    python benchmarks/generate_data.py --scale 100000 --data-dir /tmp/erp_bench
+    python benchmarks/run_benchmarks.py --data-dir /tmp/erp_bench --output bench.json
+    python benchmarks/run_benchmarks.py --data-dir /tmp/erp_bench --compare bench.json
+
+Without --data-dir a fresh database of --scale orders is generated first.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+# Ensure we can import from the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import g
+from ERP_server import create_app
+from models import db, EmailConfig
+from generate_data import BENCH_USER, BENCH_PASSWORD, generate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+READ_ROUTES = [
+    ('orders.all', '/api/orders'),
+    ('orders.new', '/api/orders/new'),
+    ('orders.for_delivery', '/api/orders/for_delivery'),
+    ('orders.realized', '/api/orders/realized'),
+    ('orders.get', '/api/order/1'),
+    ('inventory.list', '/api/inventory'),
+    ('inventory.stock', '/api/inventory/1/stock'),
+    ('inventory.stock_as_of', '/api/inventory/1/stock?as_of=2000-01-01'),
+    ('inventory.movements', '/api/inventory/1/movements'),
+    ('search.all', '/api/search?q=buket'),
+    ('search.orders_status', '/api/search?q=ruža&type=orders&status=realized'),
+    ('search.prefix', '/api/search?q=Jov&type=orders&page=3'),
+    ('reports.sales', '/api/reports/sales'),
+    ('reports.sales_month', '/api/reports/sales/month'),
+    ('reports.sales_customer', '/api/reports/sales/customer'),
+    ('reports.revenue_day', '/api/reports/revenue?bucket=day'),
+    ('reports.revenue_month', '/api/reports/revenue?bucket=month'),
+    ('reports.top_customers', '/api/reports/top/customers'),
+    ('reports.top_products_range', '/api/reports/top/products?from={year_ago}&to={today}'),
+    ('reports.turnover', '/api/reports/turnover'),
+    ('email.config', '/api/email_config'),
+    ('user.profile', '/api/user/profile'),
+]
+
+
+# ─── Measurement ───────────────────────────────────────────────
+
+def summarize(durations, queries=None):
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'queries': queries,
+    }
+
+
+def timed(fn, repeat, setup=None, warmup=False):
+    """Run fn `repeat` times; setup (untimed) runs before every call."""
+    if warmup:
+        if setup:
+            setup()
+        fn()
+    durations, result = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return durations, result
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hide what the scripts print; the report is the output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ─── Cases ─────────────────────────────────────────────────────
+
+def bench_http(app, repeat, results):
+    client = app.test_client()
+    response = client.post('/login', data={'username': BENCH_USER, 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login as {BENCH_USER} failed; generate the data with generate_data.py")
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    year_ago = f'{int(today[:4]) - 1}{today[4:]}'
+
+    def request(method, path, body=None):
+        def call():
+            response = client.open(path, method=method, json=body)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {path} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            return response
+        return call
+
+    for name, path in READ_ROUTES:
+        path = path.format(today=today, year_ago=year_ago)
+        durations, response = timed(request('GET', path), repeat, warmup=True)
+        results[f'http.{name}'] = summarize(durations, int(response.headers.get('X-Query-Count', 0)))
+
+    with app.app_context():
+        open_ids = [row[0] for row in db.session.execute(db.text(
+            "SELECT id FROM orders WHERE status = 'new' ORDER BY id LIMIT 200"))]
+        lager_id = db.session.execute(db.text(
+            "SELECT id FROM lager ORDER BY quantity DESC LIMIT 1")).scalar()
+    if len(open_ids) < 101:
+        raise RuntimeError("Not enough 'new' orders for the write benchmarks; use a larger --scale")
+
+    # Writes flip orders back and forth so every run does the same work
+    flips = iter(['realized', 'new'] * repeat)
+    durations, response = timed(
+        lambda: request('POST', '/api/update_status', {'id': open_ids[0], 'status': next(flips)})(), repeat)
+    results['http.update_status'] = summarize(durations, int(response.headers.get('X-Query-Count', 0)))
+
+    batch = open_ids[1:101]
+    flips = iter(['for_delivery', 'new'] * repeat)
+    durations, response = timed(
+        lambda: request('POST', '/api/orders/bulk_status', {'ids': batch, 'status': next(flips)})(), repeat)
+    results['http.bulk_status_100'] = summarize(durations, int(response.headers.get('X-Query-Count', 0)))
+
+    body = {'lager_id': lager_id, 'quantity': 1, 'name': 'Benchmark', 'price': 1000,
+            'customer': 'Benchmark Kupac', 'date': datetime.now().strftime('%d.%m.%Y')}
+    durations, response = timed(request('POST', '/api/order_from_lager', body), repeat)
+    results['http.order_from_lager'] = summarize(durations, int(response.headers.get('X-Query-Count', 0)))
+
+
+def bench_notifications(app, repeat, results):
+    from blueprints.email_notify import check_and_notify
+
+    with app.app_context():
+        config = EmailConfig.query.first() or EmailConfig()
+        config.enabled = True
+        config.days_before = 7
+        db.session.add(config)
+        # Every open order counts as already notified, so the check scans
+        # the whole window without sending mail
+        db.session.execute(db.text(
+            "INSERT OR IGNORE INTO notification_log (notify_key) "
+            "SELECT id || '_' || date FROM orders WHERE status IN ('new', 'for_delivery') AND date != ''"))
+        db.session.commit()
+
+    def run():
+        with app.app_context():
+            check_and_notify()
+            return g.get('query_count', 0)
+
+    durations, queries = timed(run, repeat)
+    results['task.check_and_notify'] = summarize(durations, queries)
+
+
+def bench_export(work_dir, repeat, results):
+    import export_to_json
+
+    export_dir = os.path.join(work_dir, 'export')
+
+    def full():
+        with quiet():
+            export_to_json.main(['--data-dir', work_dir])
+
+    def sharded():
+        with quiet():
+            export_to_json.main(['--data-dir', work_dir, '--sharded'])
+
+    durations, _ = timed(full, repeat)
+    results['task.export_full'] = summarize(durations)
+    durations, _ = timed(sharded, repeat, setup=lambda: shutil.rmtree(export_dir, ignore_errors=True))
+    results['task.export_sharded_first'] = summarize(durations)
+    durations, _ = timed(sharded, repeat)
+    results['task.export_sharded_unchanged'] = summarize(durations)
+
+
+def build_legacy_db(source_db, legacy_db):
+    """Pre-migration schema: Serbian column names, user_version 0."""
+    conn = sqlite3.connect(legacy_db, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (source_db,))
+        conn.execute("BEGIN")
+        conn.execute("""CREATE TABLE users (
+            id INTEGER PRIMARY KEY, username TEXT UNIQUE NOT NULL, email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL, is_admin BOOLEAN DEFAULT 0, created_at TEXT DEFAULT '')""")
+        conn.execute("""CREATE TABLE orders (
+            id INTEGER PRIMARY KEY, naziv TEXT NOT NULL, cena REAL NOT NULL DEFAULT 0,
+            placeno BOOLEAN DEFAULT 0, kupac TEXT NOT NULL, datum TEXT DEFAULT '',
+            kolicina INTEGER DEFAULT 1, boja TEXT DEFAULT '', opis TEXT DEFAULT '',
+            slika TEXT DEFAULT '', status TEXT NOT NULL DEFAULT 'new')""")
+        conn.execute("""CREATE TABLE lager (
+            id INTEGER PRIMARY KEY, naziv TEXT NOT NULL, cena REAL DEFAULT 0, boja TEXT DEFAULT '',
+            kolicina INTEGER DEFAULT 0, lokacija TEXT DEFAULT 'House', slika TEXT DEFAULT '')""")
+        conn.execute("INSERT INTO users SELECT id, username, email, password_hash, is_admin, created_at "
+                     "FROM src.users")
+        conn.execute("INSERT INTO orders SELECT id, name, price_minor / 100.0, paid, customer, date, quantity, color, "
+                     "description, image, status FROM src.orders")
+        conn.execute("INSERT INTO lager SELECT id, name, price_minor / 100.0, color, quantity, location, image FROM src.lager")
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+
+
+def write_legacy_json(source_db, json_dir):
+    """Legacy JSON export (Serbian keys) as migrate_json.py expects it."""
+    conn = sqlite3.connect(source_db)
+    try:
+        for filename, status in (('new_ord', 'new'), ('for_delivery', 'for_delivery'), ('realized', 'realized')):
+            rows = conn.execute(
+                "SELECT id, name, price_minor / 100.0, paid, customer, date, quantity, color, description, image, lager_id "
+                "FROM orders WHERE status = ? ORDER BY id", (status,))
+            keys = ('id', 'naziv', 'cena', 'placeno', 'kupac', 'datum', 'kolicina', 'boja', 'opis', 'slika', 'lager_id')
+            with open(os.path.join(json_dir, f'{filename}.json'), 'w', encoding='utf-8') as f:
+                json.dump([dict(zip(keys, row)) for row in rows], f, ensure_ascii=False)
+        rows = conn.execute("SELECT id, name, price_minor / 100.0, color, quantity, location, image FROM lager ORDER BY id")
+        keys = ('id', 'naziv', 'cena', 'boja', 'kolicina', 'lokacija', 'slika')
+        with open(os.path.join(json_dir, 'lager.json'), 'w', encoding='utf-8') as f:
+            json.dump([dict(zip(keys, row)) for row in rows], f, ensure_ascii=False)
+        with open(os.path.join(json_dir, 'notified.json'), 'w', encoding='utf-8') as f:
+            json.dump([row[0] for row in conn.execute("SELECT notify_key FROM notification_log")], f)
+    finally:
+        conn.close()
+
+
+def _remove_db(db_file):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+
+def bench_migrations(work_dir, repeat, results):
+    from migrations import run_migrations
+    import migrate_json
+
+    source_db = os.path.join(work_dir, 'erp.db')
+    template = os.path.join(work_dir, 'legacy_template.db')
+    legacy_dir = os.path.join(work_dir, 'legacy')
+    legacy_db = os.path.join(legacy_dir, 'erp.db')
+    os.makedirs(legacy_dir, exist_ok=True)
+    build_legacy_db(source_db, template)
+
+    def fresh_legacy_db():
+        _remove_db(legacy_db)
+        shutil.copyfile(template, legacy_db)
+
+    durations, applied = timed(lambda: run_migrations(legacy_db), repeat, setup=fresh_legacy_db)
+    if not applied:
+        raise RuntimeError("Legacy database needed no migrations")
+    results['task.run_migrations_legacy'] = summarize(durations)
+
+    json_dir = os.path.join(work_dir, 'legacy_json')
+    os.makedirs(json_dir, exist_ok=True)
+    write_legacy_json(source_db, json_dir)
+
+    def import_json():
+        with quiet():
+            migrate_json.main(['--data-dir', json_dir, '--yes'])
+
+    durations, _ = timed(import_json, repeat, setup=lambda: _remove_db(os.path.join(json_dir, 'erp.db')))
+    results['task.migrate_json'] = summarize(durations)
+
+
+STARTUP_CASES = {
+    'create_app': 'import ERP_server; ERP_server.create_app(data_dir=sys.argv[1])',
+    'create_db_app': 'import ERP_server; ERP_server.create_db_app(data_dir=sys.argv[1])',
+}
+
+
+def parse_importtime(stderr, top=15):
+    """Total import time and the slowest top-level imports from `python -X importtime`."""
+    total_us, modules = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        total_us += int(self_us)
+        # Only top-level imports; nested ones are part of their cumulative time
+        if not name.startswith('  '):
+            modules.append((name.strip(), int(cumulative_us)))
+    modules.sort(key=lambda m: -m[1])
+    return {
+        'total_ms': round(total_us / 1000, 1),
+        'top': [[name, round(us / 1000, 1)] for name, us in modules[:top]],
+    }
+
+
+def bench_startup(work_dir, repeat, results, importtime):
+    """Fresh interpreter per run: import + app factory on an up-to-date database."""
+    def script(code):
+        return f'import sys; sys.path.insert(0, {PROJECT_ROOT!r}); {code}'
+
+    def spawn(code, *flags):
+        return subprocess.run([sys.executable, *flags, '-c', script(code), work_dir],
+                              capture_output=True, text=True, check=True)
+
+    durations, _ = timed(lambda: spawn('pass'), repeat)
+    results['startup.interpreter'] = summarize(durations)
+    for name, code in STARTUP_CASES.items():
+        durations, _ = timed(lambda: spawn(code), repeat, warmup=True)
+        results[f'startup.{name}'] = summarize(durations)
+        importtime[name] = parse_importtime(spawn(code, '-X', 'importtime').stderr)
+
+
+# ─── Report ────────────────────────────────────────────────────
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Cases whose median got slower than baseline by more than threshold."""
+    regressions = []
+    for name, stats in sorted(report['results'].items()):
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('median_ms'):
+            continue
+        ratio = stats['median_ms'] / before['median_ms']
+        if ratio > 1 + threshold:
+            regressions.append((name, before['median_ms'], stats['median_ms'], ratio))
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{'case':40} {'median':>10} {'p95':>10} {'min':>10} {'queries':>8}")
+    for name, stats in sorted(report['results'].items()):
+        queries = '' if stats['queries'] is None else stats['queries']
+        print(f"{name:40} {stats['median_ms']:>8.1f}ms {stats['p95_ms']:>8.1f}ms "
+              f"{stats['min_ms']:>8.1f}ms {queries:>8}")
+    for name, imports in report.get('importtime', {}).items():
+        print(f"\nImport time ({name}): {imports['total_ms']:.0f}ms, slowest top-level imports:")
+        for module, ms in imports['top'][:8]:
+            print(f"  {module:38} {ms:>8.1f}ms")
+
+
+def run(data_dir, repeat, only=None):
+    """Copy data_dir/erp.db to a scratch folder and run every case on it."""
+    work_dir = tempfile.mkdtemp(prefix='erp_bench_')
+    try:
+        source = sqlite3.connect(os.path.join(data_dir, 'erp.db'))
+        target = sqlite3.connect(os.path.join(work_dir, 'erp.db'))
+        source.backup(target)
+        target.close()
+        source.close()
+
+        app = create_app(data_dir=work_dir)
+        app.debug = True                        # X-Query-Count header
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        app.config['SLOW_QUERY_MS'] = 0
+        app.config['QUERY_COUNT_WARN'] = 0
+
+        with app.app_context():
+            scale = db.session.execute(db.text("SELECT COUNT(*) FROM orders")).scalar()
+
+        results, importtime = {}, {}
+        suites = [
+            ('startup', lambda: bench_startup(work_dir, repeat, results, importtime)),
+            ('http', lambda: bench_http(app, repeat, results)),
+            ('notify', lambda: bench_notifications(app, repeat, results)),
+            ('export', lambda: bench_export(work_dir, repeat, results)),
+            ('migrate', lambda: bench_migrations(work_dir, repeat, results)),
+        ]
+        for name, suite in suites:
+            if only and name not in only:
+                continue
+            print(f'Running {name} benchmarks...')
+            started = time.monotonic()
+            suite()
+            print(f'  done in {time.monotonic() - started:.1f}s')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'scale': scale,
+            'repeat': repeat,
+        },
+        'results': results,
+        'importtime': importtime,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the ERP benchmark suite')
+    parser.add_argument('--data-dir', help='Folder sa erp.db iz generate_data.py (kopira se, ne menja)')
+    parser.add_argument('--scale', type=int, default=10000, help='Broj porudžbina ako nema --data-dir')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Ponavljanja po slučaju')
+    parser.add_argument('--only', nargs='+', choices=('startup', 'http', 'notify', 'export', 'migrate'),
+                        help='Pokreni samo ove grupe')
+    parser.add_argument('--output', help='Upiši JSON izveštaj u fajl')
+    parser.add_argument('--compare', help='Prethodni JSON izveštaj za poređenje')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Dozvoljeno usporenje medijane (default: {DEFAULT_THRESHOLD} = 20%%)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR, format='[%(levelname)s] - [%(name)s] - %(message)s')
+
+    generated_dir = None
+    data_dir = args.data_dir
+    if not data_dir:
+        generated_dir = data_dir = tempfile.mkdtemp(prefix='erp_bench_data_')
+        print(f'Generating {args.scale} orders...')
+        generate(data_dir, args.scale, progress=lambda message: None)
+    try:
+        report = run(data_dir, args.repeat, args.only)
+    finally:
+        if generated_dir:
+            shutil.rmtree(generated_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\n✓ Report: {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        base_meta = baseline.get('meta', {})
+        print(f"\nCompared with {base_meta.get('git_commit')} (scale {base_meta.get('scale')}):")
+        if base_meta.get('scale') != report['meta']['scale']:
+            print(f"  [WARNING] Different scale ({report['meta']['scale']}), timings are not comparable")
+        if not regressions:
+            print(f'✓ No case slower than +{args.threshold:.0%}')
+            return 0
+        for name, before, after, ratio in regressions:
+            print(f'  ✗ {name}: {before:.1f}ms → {after:.1f}ms ({ratio - 1:+.0%})')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
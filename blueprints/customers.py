@@ -0,0 +1,150 @@
+"""
+Customers Blueprint - Kupci: autocomplete i istorija porudžbina po kupcu
+"""
+
+import logging
+import unicodedata
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from sqlalchemy import func, text
+from models import db, read_only, Customer, Order
+
+customers_bp = Blueprint('customers', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 50
+MAX_HISTORY = 500
+BACKFILL_BATCH_SIZE = 5000
+# Upper bound for a key prefix range scan on the unique key index
+_KEY_MAX = '\U0010ffff'
+
+_CUSTOMER_INSERT = text(
+    "INSERT INTO customers (name, key, created_at) VALUES (:name, :key, :created_at) "
+    "ON CONFLICT (key) DO UPDATE SET key = excluded.key RETURNING id"
+)
+
+
+# ─── Helper Functions ──────────────────────────────────────────
+
+def customer_key(name):
+    """Normalized lookup key: case, spacing and diacritics ignored.
+
+    "Đorđe  Perić" and "djordje peric" map to the same customer.
+    """
+    value = (name or '').replace('đ', 'dj').replace('Đ', 'Dj')
+    value = ''.join(ch for ch in unicodedata.normalize('NFKD', value) if not unicodedata.combining(ch))
+    return ' '.join(value.casefold().split())
+
+
+def customer_id_for(name, conn=None):
+    """Id of the customer matching `name`, created on first use. None for a blank name.
+
+    Runs on the session (or conn) so it commits together with the order.
+    """
+    key = customer_key(name)
+    if not key:
+        return None
+    execute = conn.execute if conn is not None else db.session.execute
+    customer_id = execute(text("SELECT id FROM customers WHERE key = :key"), {'key': key}).scalar()
+    if customer_id is None:
+        customer_id = execute(_CUSTOMER_INSERT, {
+            'name': ' '.join(name.split()), 'key': key,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }).scalar()
+        logger.debug(f"Customer created: {name} (ID: {customer_id})")
+    return customer_id
+
+
+def backfill_customers(batch_size=BACKFILL_BATCH_SIZE):
+    """Link every order without customer_id, creating one customer per distinct key.
+
+    Orders are walked by id in batches, each its own short transaction, so
+    the server's writers are never blocked for long. The first spelling of
+    a name (lowest order id) becomes the customer's display name.
+    Returns (orders linked, customers created).
+    """
+    with db.engine.connect() as conn:
+        known = dict(conn.execute(text("SELECT key, id FROM customers")).all())
+    keys = {}    # raw name -> key; names repeat on many orders
+    linked, created_before, last_id = 0, len(known), 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, customer FROM orders WHERE id > :last_id AND customer_id IS NULL "
+                "ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).all()
+            if not rows:
+                break
+            links = []
+            for order_id, name in rows:
+                key = keys.get(name)
+                if key is None:
+                    key = keys[name] = customer_key(name)
+                if not key:
+                    continue
+                if key not in known:
+                    known[key] = customer_id_for(name, conn)
+                links.append((known[key], order_id))
+            if links:
+                conn.exec_driver_sql("UPDATE orders SET customer_id = ? WHERE id = ?", links)
+        linked += len(links)
+        last_id = rows[-1][0]
+        logger.info(f"Customer backfill: linked {linked} order(s) so far")
+    return linked, len(known) - created_before
+
+
+def ensure_customers():
+    """Backfill customers once orders exist that are not linked yet (first start after migration 8)."""
+    unlinked = db.session.execute(text(
+        "SELECT 1 FROM orders WHERE customer_id IS NULL AND TRIM(customer) != '' LIMIT 1"
+    )).first()
+    db.session.rollback()
+    if unlinked is not None:
+        logger.info("Orders without customer_id found, backfilling customers")
+        linked, created = backfill_customers()
+        logger.info(f"Customer backfill done: {linked} order(s) linked, {created} customer(s) created")
+
+
+# ─── API Routes ────────────────────────────────────────────────
+
+@customers_bp.route('/api/customers', methods=['GET'])
+@login_required
+@read_only
+def autocomplete_customers():
+    """Customers whose normalized name starts with ?q=, most orders first."""
+    key = customer_key(request.args.get('q', ''))
+    limit = min(request.args.get('limit', 10, type=int), MAX_SUGGESTIONS)
+    if not key or limit < 1:
+        return jsonify([])
+    # Range on the unique key index; order counts come from ix_orders_customer_id_id
+    order_count = (db.session.query(func.count(Order.id))
+                   .filter(Order.customer_id == Customer.id)
+                   .correlate(Customer).scalar_subquery())
+    rows = (db.session.query(Customer.id, Customer.name, order_count.label('orders'))
+            .filter(Customer.key >= key, Customer.key < key + _KEY_MAX)
+            .order_by(order_count.desc(), Customer.name)
+            .limit(limit).all())
+    return jsonify([{'id': r.id, 'name': r.name, 'orders': r.orders} for r in rows])
+
+
+@customers_bp.route('/api/customers/<int:customer_id>/orders', methods=['GET'])
+@login_required
+@read_only
+def customer_orders(customer_id):
+    """A customer's orders, newest first, paginated with ?before_id=."""
+    customer = db.session.get(Customer, customer_id)
+    if not customer:
+        logger.warning(f"Customer {customer_id} not found")
+        return jsonify({'error': 'Kupac nije pronađen'}), 404
+    limit = max(1, min(request.args.get('limit', 100, type=int), MAX_HISTORY))
+    before_id = request.args.get('before_id', type=int)
+    query = Order.query.filter(Order.customer_id == customer_id)
+    if before_id:
+        query = query.filter(Order.id < before_id)
+    orders = query.order_by(Order.id.desc()).limit(limit).all()
+    total = db.session.query(func.count(Order.id)).filter(Order.customer_id == customer_id).scalar()
+    return jsonify({
+        'customer': {**customer.to_dict(), 'orders': total},
+        'orders': [o.to_dict() for o in orders],
+    })
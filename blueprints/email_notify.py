@@ -7,10 +7,13 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from models import db, Order, EmailConfig, NotificationLog
+from health import heartbeat
 
 email_bp = Blueprint('email', __name__)
 logger = logging.getLogger(__name__)
 
+NOTIFY_INTERVAL = 3600 * 23
+
 
 # ─── Helper Functions ──────────────────────────────────────────
 
@@ -122,14 +125,17 @@ def notification_scheduler(app):
     """Background thread that checks every ~23 hours."""
     logger.info("Notification scheduler thread started")
     while True:
+        error = None
         try:
             logger.debug("Scheduler running notification check...")
             with app.app_context():
                 check_and_notify()
             logger.debug("Scheduler check completed, sleeping for 23 hours")
         except Exception as e:
+            error = e
             logger.exception(f"Scheduler error: {e}")
-        time.sleep(3600 * 23)
+        heartbeat('notifications', NOTIFY_INTERVAL, error)
+        time.sleep(NOTIFY_INTERVAL)
 
 
 # ─── Page Route ────────────────────────────────────────────────
@@ -3,12 +3,337 @@ import logging
 from flask_login import login_required, current_user
 import time
 import os
-from models import db, LagerItem
+import io
+import csv
+import json
+from itertools import islice
+from datetime import datetime
+from sqlalchemy import update, insert, select, func, text
+from models import db, read_only, LagerItem, StockMovement, StockSnapshot, to_minor
+from health import heartbeat
 
 lager_bp = Blueprint('lager', __name__)
 logger = logging.getLogger(__name__)
 
 
+# ─── Helper Functions ──────────────────────────────────────────
+# Stock changes are single conditional UPDATEs evaluated by SQLite, so
+# concurrent workers can never read a stale quantity and overwrite it.
+# Every change is also appended to stock_movements in the same
+# transaction, so history never depends on log lines.
+
+SNAPSHOT_INTERVAL = 3600 * 24
+
+
+def now_iso():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def record_movement(item_id, delta, reason, order_id=None):
+    """Append one row to the stock ledger (committed with the caller's transaction)."""
+    db.session.add(StockMovement(
+        lager_id=item_id,
+        delta=delta,
+        reason=reason,
+        order_id=order_id,
+        created_at=now_iso()
+    ))
+
+
+def reserve_stock(item_id, quantity, order_id=None):
+    """Take quantity from stock only if enough is available.
+
+    Returns the remaining quantity, or None if the item is missing or
+    has insufficient stock (nothing is changed in that case).
+    """
+    row = db.session.execute(
+        update(LagerItem)
+        .where(LagerItem.id == item_id,
+               LagerItem.quantity >= quantity,
+               LagerItem.quantity > 0)
+        .values(quantity=LagerItem.quantity - quantity)
+        .returning(LagerItem.quantity)
+        .execution_options(synchronize_session='fetch')
+    ).first()
+    if row is None:
+        return None
+    record_movement(item_id, -quantity, 'reserve', order_id)
+    return row[0]
+
+
+def add_stock(item_id, quantity, reason='restock', order_id=None):
+    """Add quantity to stock. Returns the new quantity, or None if the item is missing."""
+    row = db.session.execute(
+        update(LagerItem)
+        .where(LagerItem.id == item_id)
+        .values(quantity=func.coalesce(LagerItem.quantity, 0) + quantity)
+        .returning(LagerItem.quantity)
+        .execution_options(synchronize_session='fetch')
+    ).first()
+    if row is None:
+        return None
+    record_movement(item_id, quantity, reason, order_id)
+    return row[0]
+
+
+def take_stock_snapshots():
+    """Snapshot every item that has no snapshot yet or moved since its last one.
+
+    A single INSERT ... SELECT, so quantities and the movement high-water
+    mark are read from the same consistent state. Returns rows written.
+    """
+    result = db.session.execute(text("""
+        INSERT INTO stock_snapshots (lager_id, quantity, movement_id, taken_at)
+        SELECT l.id, COALESCE(l.quantity, 0),
+               (SELECT COALESCE(MAX(id), 0) FROM stock_movements),
+               :taken_at
+        FROM lager l
+        WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots s WHERE s.lager_id = l.id)
+           OR EXISTS (
+                SELECT 1 FROM stock_movements m
+                WHERE m.lager_id = l.id
+                  AND m.id > (SELECT MAX(s2.movement_id) FROM stock_snapshots s2
+                              WHERE s2.lager_id = l.id)
+           )
+    """), {'taken_at': now_iso()})
+    db.session.commit()
+    return result.rowcount
+
+
+def stock_as_of(item_id, as_of=None):
+    """Stock level at as_of (ISO date or datetime), from the latest
+    snapshot before it plus the short tail of movements after it.
+
+    None when as_of is before the item's recorded history: no snapshot
+    and no 'initial' movement at or before it (items older than the
+    ledger start at their opening snapshot from migration 11).
+    """
+    if not as_of:
+        as_of = now_iso()
+    elif len(as_of) == 10:
+        # Date only: include the whole day
+        as_of = f"{as_of}T23:59:59"
+
+    snapshot = (StockSnapshot.query
+                .filter(StockSnapshot.lager_id == item_id, StockSnapshot.taken_at <= as_of)
+                .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc())
+                .first())
+    if snapshot is None and db.session.execute(
+        db.select(StockMovement.id)
+        .where(StockMovement.lager_id == item_id,
+               StockMovement.reason == 'initial',
+               StockMovement.created_at <= as_of)
+        .limit(1)
+    ).first() is None:
+        return None
+    base = snapshot.quantity if snapshot else 0
+    after_id = snapshot.movement_id if snapshot else 0
+
+    tail = db.session.execute(
+        db.select(func.coalesce(func.sum(StockMovement.delta), 0))
+        .where(StockMovement.lager_id == item_id,
+               StockMovement.id > after_id,
+               StockMovement.created_at <= as_of)
+    ).scalar()
+    return base + tail
+
+
+def stock_snapshot_scheduler(app):
+    """Background thread that snapshots stock once a day."""
+    logger.info("Stock snapshot scheduler thread started")
+    while True:
+        error = None
+        try:
+            with app.app_context():
+                count = take_stock_snapshots()
+            logger.info(f"Stock snapshots taken: {count} item(s)")
+        except Exception as e:
+            error = e
+            logger.exception(f"Stock snapshot error: {e}")
+        heartbeat('stock_snapshots', SNAPSHOT_INTERVAL, error)
+        time.sleep(SNAPSHOT_INTERVAL)
+
+
+# ─── Bulk Import ───────────────────────────────────────────────
+# Rows without an id create new items; rows with an id apply a quantity
+# delta to an existing item. Each chunk is one transaction, and a bad row
+# is reported without aborting the rest of the batch.
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_FORMATS = ('csv', 'jsonl', 'json')
+
+
+def parse_import_rows(lines, fmt):
+    """Yield dict rows from a text stream in csv, jsonl (NDJSON) or json (array) format.
+
+    Malformed JSON lines are yielded as {'_error': ...} so they are
+    reported per row instead of stopping the parse.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            yield {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ''}
+    elif fmt == 'jsonl':
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {'_error': f'Neispravan JSON: {e.msg}'}
+    elif fmt == 'json':
+        data = json.load(lines) if hasattr(lines, 'read') else json.loads(''.join(lines))
+        if not isinstance(data, list):
+            raise ValueError('JSON mora biti lista objekata')
+        yield from data
+    else:
+        raise ValueError(f'Nepoznat format: {fmt}')
+
+
+def detect_import_format(filename='', content_type=''):
+    """Guess the import format from a filename or Content-Type."""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'jsonl'
+    return 'json'
+
+
+def _validate_import_row(row):
+    """Return ('delta', values) or ('create', values); raise ValueError with a user message."""
+    if not isinstance(row, dict):
+        raise ValueError('Red mora biti objekat')
+    if '_error' in row:
+        raise ValueError(row['_error'])
+
+    if row.get('id') not in (None, ''):
+        try:
+            item_id = int(row['id'])
+            delta = int(row.get('quantity', 0))
+        except (ValueError, TypeError):
+            raise ValueError('ID i količina moraju biti celi brojevi')
+        if delta == 0:
+            raise ValueError('Količina mora biti različita od 0')
+        return 'delta', {'id': item_id, 'delta': delta}
+
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('Naziv je obavezan')
+    try:
+        price_minor = to_minor(row.get('price') or 0)
+    except (ValueError, TypeError):
+        raise ValueError('Cena mora biti broj')
+    try:
+        quantity = int(row.get('quantity') or 0)
+    except (ValueError, TypeError):
+        raise ValueError('Količina mora biti ceo broj')
+    if quantity < 0:
+        raise ValueError('Količina ne može biti negativna')
+    return 'create', {
+        'name': name,
+        'price_minor': price_minor,
+        'color': str(row.get('color') or ''),
+        'quantity': quantity,
+        'location': str(row.get('location') or 'House'),
+        'image': str(row.get('image') or '')
+    }
+
+
+def _apply_import_chunk(chunk, results):
+    """Validate and apply one chunk [(row_no, row), ...] in a single transaction."""
+    creates, deltas = [], []
+    for row_no, row in chunk:
+        try:
+            kind, values = _validate_import_row(row)
+        except ValueError as e:
+            results.append({'row': row_no, 'ok': False, 'error': str(e)})
+            continue
+        (creates if kind == 'create' else deltas).append((row_no, values))
+
+    try:
+        new_ids = []
+        if creates:
+            new_ids = db.session.execute(
+                insert(LagerItem).returning(LagerItem.id, sort_by_parameter_order=True),
+                [values for _, values in creates]
+            ).scalars().all()
+
+        # Deltas: the guard is part of each UPDATE (like reserve_stock), so a
+        # concurrent reservation can never be pushed below zero by an import
+        valid_deltas = []
+        lager = LagerItem.__table__
+        for row_no, values in deltas:
+            stock = func.coalesce(lager.c.quantity, 0)
+            row = db.session.execute(
+                lager.update()
+                .where(lager.c.id == values['id'], stock + values['delta'] >= 0)
+                .values(quantity=stock + values['delta'])
+                .returning(lager.c.quantity)
+            ).first()
+            if row is not None:
+                valid_deltas.append((row_no, values))
+            elif db.session.execute(select(LagerItem.id).where(LagerItem.id == values['id'])).first() is None:
+                results.append({'row': row_no, 'ok': False, 'error': 'Artikal nije pronađen'})
+            else:
+                results.append({'row': row_no, 'ok': False, 'error': 'Nedovoljno na stanju'})
+
+        created_at = now_iso()
+        movements = [
+            {'lager_id': item_id, 'delta': values['quantity'], 'reason': 'initial', 'created_at': created_at}
+            for item_id, (_, values) in zip(new_ids, creates) if values['quantity']
+        ] + [
+            {'lager_id': v['id'], 'delta': v['delta'], 'reason': 'import', 'created_at': created_at}
+            for _, v in valid_deltas
+        ]
+        if movements:
+            db.session.execute(insert(StockMovement), movements)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error applying inventory import chunk")
+        failed = {r['row'] for r in results}
+        for row_no, _ in creates + deltas:
+            if row_no in failed:
+                continue
+            results.append({'row': row_no, 'ok': False, 'error': f'Greška pri upisu: {str(e)}'})
+        return
+
+    for item_id, (row_no, values) in zip(new_ids, creates):
+        results.append({'row': row_no, 'ok': True, 'action': 'created', 'id': item_id, 'quantity': values['quantity']})
+    for row_no, values in valid_deltas:
+        results.append({'row': row_no, 'ok': True, 'action': 'restocked', 'id': values['id'], 'delta': values['delta']})
+
+
+def import_inventory_rows(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Apply import rows in chunked transactions. Returns (summary, per-row results)."""
+    if chunk_size < 1:
+        raise ValueError('Veličina dela mora biti bar 1')
+    results = []
+    numbered = enumerate(rows, start=1)
+    while True:
+        try:
+            chunk = list(islice(numbered, chunk_size))
+        except (ValueError, csv.Error) as e:
+            results.append({'row': None, 'ok': False, 'error': f'Greška pri čitanju: {e}'})
+            break
+        if not chunk:
+            break
+        _apply_import_chunk(chunk, results)
+        logger.debug(f"Inventory import: {len(results)} row(s) processed")
+
+    results.sort(key=lambda r: r['row'] or 0)
+    summary = {
+        'created': sum(1 for r in results if r.get('action') == 'created'),
+        'restocked': sum(1 for r in results if r.get('action') == 'restocked'),
+        'failed': sum(1 for r in results if not r['ok'])
+    }
+    logger.info(f"Inventory import finished: {summary['created']} created, "
+                f"{summary['restocked']} restocked, {summary['failed']} failed")
+    return summary, results
+
+
 # ─── Page Route ────────────────────────────────────────────────
 
 @lager_bp.route('/inventory')
@@ -23,6 +348,7 @@ def inventory_page():
 
 @lager_bp.route('/api/inventory', methods=['GET'])
 @login_required
+@read_only
 def get_inventory():
     logger.debug("Fetching all inventory items")
     try:
@@ -54,10 +380,10 @@ def add_inventory():
             return jsonify({'error': 'Naziv je obavezan'}), 400
         
         try:
-            price = float(form_data.get('price', 0))
+            price_minor = to_minor(form_data.get('price', 0))
         except (ValueError, TypeError):
             logger.warning(f"Invalid price value: {form_data.get('price')}")
-            price = 0.0
+            price_minor = 0
         
         try:
             quantity = int(form_data.get('quantity', 0))
@@ -67,13 +393,16 @@ def add_inventory():
 
         item = LagerItem(
             name=form_data.get('name', ''),
-            price=price,
+            price_minor=price_minor,
             color=form_data.get('color', ''),
             quantity=quantity,
             location=form_data.get('location', 'House'),
             image=filename
         )
         db.session.add(item)
+        db.session.flush()
+        if quantity:
+            record_movement(item.id, quantity, 'initial')
         db.session.commit()
         logger.debug(f"Inventory item added: {item.name} (ID: {item.id}, Qty: {quantity})")
         return jsonify({'ok': True})
@@ -93,6 +422,8 @@ def delete_inventory(item_id):
         return jsonify({'error': 'Artikal nije pronađen'}), 404
     
     item_name = item.name
+    if item.quantity:
+        record_movement(item_id, -item.quantity, 'delete')
     db.session.delete(item)
     db.session.commit()
     logger.debug(f"Inventory item deleted: {item_name} (ID: {item_id})")
@@ -115,8 +446,83 @@ def increase_quantity(item_id):
         logger.warning(f"Invalid quantity increase: {increase_by}")
         return jsonify({'error': 'Količina mora biti veća od 0'}), 400
     
-    old_quantity = item.quantity
-    item.quantity += increase_by
+    item_name = item.name
+    new_quantity = add_stock(item_id, increase_by)
+    if new_quantity is None:
+        db.session.rollback()
+        logger.warning(f"Increase quantity failed: Item {item_id} deleted concurrently")
+        return jsonify({'error': 'Artikal nije pronađen'}), 404
     db.session.commit()
-    logger.info(f"Inventory quantity increased for {item.name} (ID: {item_id}): {old_quantity} -> {item.quantity}")
-    return jsonify({'ok': True, 'new_quantity': item.quantity})
+    logger.info(f"Inventory quantity increased for {item_name} (ID: {item_id}): +{increase_by} -> {new_quantity}")
+    return jsonify({'ok': True, 'new_quantity': new_quantity})
+
+
+@lager_bp.route('/api/inventory/<int:item_id>/stock', methods=['GET'])
+@login_required
+@read_only
+def get_stock(item_id):
+    """Stock level now or as of ?as_of=YYYY-MM-DD[THH:MM:SS].
+
+    quantity is null when as_of predates the item's stock history.
+    """
+    as_of = request.args.get('as_of', '')
+    if as_of:
+        try:
+            datetime.fromisoformat(as_of)
+        except ValueError:
+            logger.warning(f"Invalid as_of value: {as_of}")
+            return jsonify({'error': 'Datum mora biti u formatu YYYY-MM-DD'}), 400
+    item = db.session.get(LagerItem, item_id)
+    return jsonify({
+        'lager_id': item_id,
+        'as_of': as_of or None,
+        'quantity': stock_as_of(item_id, as_of),
+        'current_quantity': item.quantity if item else 0
+    })
+
+
+@lager_bp.route('/api/inventory/<int:item_id>/movements', methods=['GET'])
+@login_required
+@read_only
+def get_movements(item_id):
+    """Newest stock movements for an item, paginated with ?before_id=."""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    before_id = request.args.get('before_id', type=int)
+    query = StockMovement.query.filter(StockMovement.lager_id == item_id)
+    if before_id:
+        query = query.filter(StockMovement.id < before_id)
+    movements = query.order_by(StockMovement.id.desc()).limit(limit).all()
+    return jsonify([m.to_dict() for m in movements])
+
+
+@lager_bp.route('/api/inventory/bulk', methods=['POST'])
+@login_required
+def bulk_import_inventory():
+    """Create items and apply quantity deltas in bulk.
+
+    Accepts a JSON array body, an uploaded 'file' (.csv, .jsonl/.ndjson,
+    .json) or a raw text/csv or application/x-ndjson body. ?format=
+    overrides detection.
+    """
+    fmt = request.args.get('format')
+    if fmt and fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'Format mora biti jedan od: {", ".join(IMPORT_FORMATS)}'}), 400
+
+    file = request.files.get('file')
+    if file and file.filename:
+        fmt = fmt or detect_import_format(file.filename, file.mimetype)
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig')
+    elif request.is_json:
+        fmt = 'json'
+        stream = io.StringIO(request.get_data(as_text=True))
+    else:
+        fmt = fmt or detect_import_format(content_type=request.content_type)
+        stream = io.StringIO(request.get_data(as_text=True))
+
+    logger.info(f"Bulk inventory import requested (format={fmt})")
+    try:
+        summary, results = import_inventory_rows(parse_import_rows(stream, fmt))
+    except ValueError as e:
+        logger.warning(f"Bulk inventory import failed: {e}")
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ok': True, **summary, 'results': results})
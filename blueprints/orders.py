@@ -3,11 +3,70 @@ import logging
 from flask_login import login_required, current_user
 import time
 import os
-from models import db, Order, LagerItem
+from sqlalchemy import delete, select, update
+from models import db, read_only, Order, OrderItem, LagerItem, to_minor
+from blueprints.lager import reserve_stock, add_stock
+from blueprints.reports import order_products, rollup_snapshot, update_sales_rollups
+from blueprints.customers import customer_id_for
 
 orders_bp = Blueprint('orders', __name__)
 logger = logging.getLogger(__name__)
 
+ORDER_STATUSES = ('new', 'for_delivery', 'realized')
+# Keeps IN (...) lists and executemany batches well under SQLite's variable limit
+BULK_CHUNK_SIZE = 500
+MAX_ORDER_ITEMS = 100
+
+
+# ─── Helper Functions ──────────────────────────────────────────
+
+def parse_order_lines(data):
+    """Validated order lines from an order_from_lager body.
+
+    Uses data['items'], or the single lager_id/quantity/price/name/color of
+    older clients (no lines if there is no lager_id). Raises ValueError
+    with a user-facing message.
+    """
+    raw = data.get('items')
+    if raw is None:
+        if not data.get('lager_id'):
+            return []
+        raw = [{key: data[key] for key in ('lager_id', 'quantity', 'price', 'name', 'color') if key in data}]
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('Stavke porudžbine moraju biti neprazna lista')
+    if len(raw) > MAX_ORDER_ITEMS:
+        raise ValueError(f'Najviše {MAX_ORDER_ITEMS} stavki po porudžbini')
+    lines = []
+    for line in raw:
+        if not isinstance(line, dict):
+            raise ValueError('Neispravna stavka porudžbine')
+        try:
+            lager_id = int(line['lager_id'])
+            quantity = int(line.get('quantity', 1))
+            price_minor = to_minor(line.get('price', 0))
+        except (KeyError, ValueError, TypeError):
+            raise ValueError('Stavka mora imati lager_id, a količina i cena moraju biti brojevi')
+        if quantity < 1:
+            raise ValueError('Količina mora biti veća od nule')
+        lines.append({'lager_id': lager_id, 'quantity': quantity, 'price_minor': price_minor,
+                      'name': str(line.get('name') or '')[:200], 'color': str(line.get('color') or '')[:100]})
+    return lines
+
+
+def orders_with_items(orders, *order_filter):
+    """to_dict() of each order plus its 'items', all lines fetched in one query.
+
+    order_filter is the filter the orders were listed with; the lines are
+    joined to orders on it instead of sending the ids back as an IN (...).
+    """
+    query = OrderItem.query
+    if order_filter:
+        query = query.join(Order, Order.id == OrderItem.order_id).filter(*order_filter)
+    lines = {}
+    for item in query.order_by(OrderItem.order_id, OrderItem.id):
+        lines.setdefault(item.order_id, []).append(item.to_dict())
+    return [{**o.to_dict(), 'items': lines.get(o.id, [])} for o in orders]
+
 
 # ─── Page Routes ───────────────────────────────────────────────
 
@@ -57,10 +116,11 @@ def edit():
 
 @orders_bp.route('/api/orders', methods=['GET'])
 @login_required
+@read_only
 def get_all_orders():
     try:
         orders = Order.query.all()
-        return jsonify([o.to_dict() for o in orders])
+        return jsonify(orders_with_items(orders))
     except Exception as e:
         logger.exception("Error getting all orders")
         return jsonify({'error': f'Greška pri učitavanju porudžbina: {str(e)}'}), 500
@@ -68,10 +128,11 @@ def get_all_orders():
 
 @orders_bp.route('/api/orders/new', methods=['GET'])
 @login_required
+@read_only
 def get_new_orders():
     try:
         orders = Order.query.filter_by(status='new').all()
-        return jsonify([o.to_dict() for o in orders])
+        return jsonify(orders_with_items(orders, Order.status == 'new'))
     except Exception as e:
         logger.exception("Error getting new orders")
         return jsonify({'error': f'Greška pri učitavanju novih porudžbina: {str(e)}'}), 500
@@ -79,10 +140,11 @@ def get_new_orders():
 
 @orders_bp.route('/api/orders/for_delivery', methods=['GET'])
 @login_required
+@read_only
 def get_delivery_orders():
     try:
         orders = Order.query.filter_by(status='for_delivery').all()
-        return jsonify([o.to_dict() for o in orders])
+        return jsonify(orders_with_items(orders, Order.status == 'for_delivery'))
     except Exception as e:
         logger.exception("Error getting delivery orders")
         return jsonify({'error': f'Greška pri učitavanju porudžbina za dostavu: {str(e)}'}), 500
@@ -90,10 +152,11 @@ def get_delivery_orders():
 
 @orders_bp.route('/api/orders/realized', methods=['GET'])
 @login_required
+@read_only
 def get_realized_orders():
     try:
         orders = Order.query.filter_by(status='realized').all()
-        return jsonify([o.to_dict() for o in orders])
+        return jsonify(orders_with_items(orders, Order.status == 'realized'))
     except Exception as e:
         logger.exception("Error getting realized orders")
         return jsonify({'error': f'Greška pri učitavanju realizovanih porudžbina: {str(e)}'}), 500
@@ -122,7 +185,7 @@ def create_order():
             return jsonify({'error': 'Kupac je obavezan'}), 400
         
         try:
-            price = float(form_data.get('price', 0))
+            price_minor = to_minor(form_data.get('price', 0))
         except (ValueError, TypeError):
             logger.error(f"Invalid price value: {form_data.get('price')}")
             return jsonify({'error': 'Cena mora biti broj'}), 400
@@ -135,9 +198,10 @@ def create_order():
 
         order = Order(
             name=form_data['name'],
-            price=price,
+            price_minor=price_minor,
             paid=form_data.get('paid', 'false') == 'true',
             customer=form_data['customer'],
+            customer_id=customer_id_for(form_data['customer']),
             date=form_data.get('date', ''),
             quantity=quantity,
             color=form_data.get('color', ''),
@@ -147,7 +211,7 @@ def create_order():
         )
         db.session.add(order)
         db.session.commit()
-        logger.debug(f"Order created: {order.name} for {order.customer} (ID: {order.id}, Qty: {quantity}, Price: {price})")
+        logger.debug(f"Order created: {order.name} for {order.customer} (ID: {order.id}, Qty: {quantity}, Price: {order.price})")
         return jsonify({'ok': True})
     except Exception as e:
         db.session.rollback()
@@ -168,26 +232,111 @@ def update_status():
         return jsonify({'error': 'Porudžbina nije pronađena'}), 404
 
     old_status = order.status
+    old_rollup = rollup_snapshot(order)
     if 'paid' in data:
         old_paid = order.paid
         order.paid = data['paid']
         logger.info(f"Order {order_id} payment status changed: {old_paid} -> {order.paid}")
     
     order.status = data['status']
+    update_sales_rollups([(old_rollup, rollup_snapshot(order))])
     db.session.commit()
     logger.info(f"Order status changed: {order.name} (ID: {order_id}): {old_status} -> {order.status}")
     return jsonify({'ok': True})
 
 
+@orders_bp.route('/api/orders/bulk_status', methods=['POST'])
+@login_required
+def bulk_update_status():
+    """Move many orders to one status (and optionally set paid) in a single transaction.
+
+    Body: {"ids": [1, 2, ...], "status": "realized", "paid": true}
+    Returns per-id results in request order.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    new_status = data.get('status')
+    logger.debug(f"Bulk status update requested: {len(ids) if isinstance(ids, list) else 0} orders -> {new_status}")
+
+    if new_status not in ORDER_STATUSES:
+        logger.warning(f"Bulk status update failed: invalid status {new_status}")
+        return jsonify({'error': 'Neispravan status'}), 400
+    if not isinstance(ids, list) or not ids:
+        logger.warning("Bulk status update failed: no ids")
+        return jsonify({'error': 'Lista porudžbina je prazna'}), 400
+    # Only a real JSON boolean; bool("false") would mark orders paid
+    set_paid = 'paid' in data
+    paid = data.get('paid', False)
+    if not isinstance(paid, bool):
+        logger.warning(f"Bulk status update failed: invalid paid value {paid!r}")
+        return jsonify({'error': 'paid mora biti true ili false'}), 400
+
+    results = []
+    order_ids = []
+    for raw_id in ids:
+        try:
+            order_id = int(raw_id)
+        except (ValueError, TypeError):
+            results.append({'id': raw_id, 'ok': False, 'error': 'Neispravan ID'})
+            continue
+        order_ids.append(order_id)
+        results.append({'id': order_id})
+
+    unique_ids = list(dict.fromkeys(order_ids))
+
+    try:
+        old_orders = {}
+        for i in range(0, len(unique_ids), BULK_CHUNK_SIZE):
+            chunk = unique_ids[i:i + BULK_CHUNK_SIZE]
+            for row in db.session.execute(
+                select(Order.id, Order.status, Order.date, Order.customer, Order.name,
+                       Order.price_minor, Order.quantity).where(Order.id.in_(chunk))
+            ):
+                old_orders[row.id] = row
+        old_statuses = {order_id: row.status for order_id, row in old_orders.items()}
+
+        # ORM bulk UPDATE by primary key runs as one executemany per chunk
+        params = [{'id': order_id, 'status': new_status} for order_id in old_statuses]
+        if set_paid:
+            for row in params:
+                row['paid'] = paid
+        for i in range(0, len(params), BULK_CHUNK_SIZE):
+            db.session.execute(update(Order), params[i:i + BULK_CHUNK_SIZE])
+        products = order_products(old_orders)
+        update_sales_rollups(
+            (rollup_snapshot(row, products=products), rollup_snapshot(row, status=new_status, products=products))
+            for row in old_orders.values()
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error in bulk status update")
+        return jsonify({'error': f'Greška pri ažuriranju statusa: {str(e)}'}), 500
+
+    for result in results:
+        if 'ok' in result:
+            continue
+        old_status = old_statuses.get(result['id'])
+        if old_status is None:
+            result.update({'ok': False, 'error': 'Porudžbina nije pronađena'})
+        else:
+            result.update({'ok': True, 'old_status': old_status, 'status': new_status})
+
+    logger.info(f"Bulk status update: {len(old_statuses)} order(s) -> {new_status}"
+                + (f", paid={paid}" if set_paid else ""))
+    return jsonify({'ok': True, 'updated': len(old_statuses), 'results': results})
+
+
 @orders_bp.route('/api/order/<int:order_id>', methods=['GET'])
 @login_required
+@read_only
 def get_order(order_id):
     logger.debug(f"Fetching order: {order_id}")
     order = db.session.get(Order, order_id)
     if not order:
         logger.warning(f"Order {order_id} not found")
         return jsonify({'error': 'Porudžbina nije pronađena'}), 404
-    return jsonify(order.to_dict())
+    return jsonify(orders_with_items([order], Order.id == order_id)[0])
 
 
 @orders_bp.route('/api/delete_order/<int:order_id>', methods=['DELETE'])
@@ -200,6 +349,8 @@ def delete_order(order_id):
         return jsonify({'error': 'Porudžbina nije pronađena'}), 404
     
     order_name = order.name
+    update_sales_rollups([(rollup_snapshot(order), None)])
+    db.session.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
     db.session.delete(order)
     db.session.commit()
     logger.debug(f"Order deleted: {order_name} (ID: {order_id})")
@@ -216,6 +367,7 @@ def update_order(order_id):
 
     form_data = request.form
     logger.debug(f"Updating order {order_id} with form data")
+    old_rollup = rollup_snapshot(order)
     
     # Track changes
     changes = {}
@@ -224,7 +376,10 @@ def update_order(order_id):
         order.name = form_data.get('name', order.name)
     if form_data.get('price'):
         old_price = order.price
-        order.price = float(form_data.get('price', order.price))
+        try:
+            order.price = form_data.get('price')
+        except ValueError:
+            return jsonify({'error': 'Cena mora biti broj'}), 400
         if old_price != order.price:
             changes['price'] = f"{old_price} -> {order.price}"
     if form_data.get('paid'):
@@ -235,6 +390,7 @@ def update_order(order_id):
     if form_data.get('customer') and form_data.get('customer') != order.customer:
         changes['customer'] = f"{order.customer} -> {form_data.get('customer')}"
         order.customer = form_data.get('customer', order.customer)
+        order.customer_id = customer_id_for(order.customer)
     if form_data.get('date') and form_data.get('date') != order.date:
         changes['date'] = f"{order.date} -> {form_data.get('date')}"
         order.date = form_data.get('date', order.date)
@@ -250,6 +406,8 @@ def update_order(order_id):
         order.image = filename
         logger.debug(f"Order {order_id} image updated: {filename}")
 
+    # Price, customer, name or date edits move a realized order between buckets
+    update_sales_rollups([(old_rollup, rollup_snapshot(order))])
     db.session.commit()
     if changes:
         changes_str = ', '.join([f"{k}: {v}" for k, v in changes.items()])
@@ -262,53 +420,96 @@ def update_order(order_id):
 @orders_bp.route('/api/order_from_lager', methods=['POST'])
 @login_required
 def order_from_lager():
-    data = request.get_json()
-    logger.info(f"Creating order from lager: lager_id={data.get('lager_id')}")
-    
-    order_qty = int(data.get('quantity', 1))
-    lager_id = int(data.get('lager_id', 0)) if data.get('lager_id') else None
-    
-    # Determine order status based on available stock
-    status = 'new'
-    available_stock = 0
-    
-    if lager_id:
-        item = db.session.get(LagerItem, int(lager_id))
-        if item:
-            available_stock = item.quantity or 0
-            logger.debug(f"Lager item {lager_id} ({item.name}): available={available_stock}, requested={order_qty}")
-            
-            # If requested quantity <= available stock and stock > 0, go to for_delivery
-            # Otherwise (requested > available or stock <= 0), go to new orders
-            if order_qty <= available_stock and available_stock > 0:
-                status = 'for_delivery'
-                # Subtract quantity from lager only if going to for_delivery
-                old_qty = item.quantity
-                item.quantity = max(0, item.quantity - order_qty)
-                logger.info(f"Inventory quantity adjusted for {item.name} (Lager ID: {lager_id}): {old_qty} -> {item.quantity} (allocated to order)")
-            else:
-                logger.debug(f"Insufficient stock for lager {lager_id}, order goes to 'new' status")
-            # If doesn't meet criteria, status remains 'new' and we don't subtract from lager
-        else:
-            logger.warning(f"Lager item {lager_id} not found")
+    """Create an order from inventory lines and reserve stock for all of them.
+
+    Body: {"customer": ..., "date": ..., "items": [{"lager_id": 1, "quantity": 2,
+    "price": 900}, ...]}; older clients send a single lager_id/quantity/price
+    instead of items. Either every line is reserved (status 'for_delivery')
+    or none is (status 'new'), in one transaction.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        lines = parse_order_lines(data)
+    except ValueError as e:
+        logger.warning(f"Order from lager rejected: {e}")
+        return jsonify({'error': str(e)}), 400
+    logger.info(f"Creating order from lager: {len(lines)} line(s), "
+                f"lager_ids={[line['lager_id'] for line in lines]}")
+
+    stock = {}
+    lager_ids = list({line['lager_id'] for line in lines})
+    for i in range(0, len(lager_ids), BULK_CHUNK_SIZE):
+        for item in LagerItem.query.filter(LagerItem.id.in_(lager_ids[i:i + BULK_CHUNK_SIZE])):
+            stock[item.id] = item
+    for line in lines:
+        item = stock.get(line['lager_id'])
+        line['name'] = line['name'] or (item.name if item else '')
+        line['color'] = line['color'] or (item.color if item else '')
+
+    if lines:
+        name = data.get('name') or ', '.join(dict.fromkeys(line['name'] for line in lines if line['name']))
+        price_minor = sum(line['price_minor'] for line in lines)
+        quantity = sum(line['quantity'] for line in lines)
+        color = data.get('color') or (lines[0]['color'] if len(lines) == 1 else '')
+        lager_id = lines[0]['lager_id'] if len(lines) == 1 else None
+    else:
+        try:
+            price_minor = to_minor(data.get('price', 0))
+            quantity = int(data.get('quantity', 1))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Cena i količina moraju biti brojevi'}), 400
+        name, color, lager_id = data.get('name', ''), data.get('color', ''), None
 
+    status = 'new'
     order = Order(
-        name=data.get('name', ''),
-        price=float(data.get('price', 0)),
+        name=name[:200],
+        price_minor=price_minor,
         paid=data.get('paid', 'false') == 'true',
         customer=data.get('customer', ''),
+        customer_id=customer_id_for(data.get('customer', '')),
         date=data.get('date', ''),
-        quantity=order_qty,
-        color=data.get('color', ''),
+        quantity=quantity,
+        color=color,
         description=data.get('description', ''),
         image=data.get('image', ''),
         status=status,
-        lager_id=lager_id if lager_id else None
+        lager_id=lager_id
     )
     db.session.add(order)
+    # Flush to get the order id for the lines and the stock ledger entries
+    db.session.flush()
+    order_items = [OrderItem(order_id=order.id, lager_id=line['lager_id'], name=line['name'],
+                             color=line['color'], quantity=line['quantity'],
+                             price_minor=line['price_minor']) for line in lines]
+    db.session.add_all(order_items)
+
+    missing = [line['lager_id'] for line in lines if line['lager_id'] not in stock]
+    if missing:
+        logger.warning(f"Lager item(s) {missing} not found, order goes to 'new' status")
+    elif order_items:
+        # Reserve atomically: each UPDATE only matches while stock suffices, so
+        # concurrent orders cannot oversell. One short line rolls back the
+        # savepoint, leaving every item untouched and the order in 'new'.
+        savepoint = db.session.begin_nested()
+        for order_item in order_items:
+            remaining = reserve_stock(order_item.lager_id, order_item.quantity, order_id=order.id)
+            if remaining is None:
+                logger.debug(f"Insufficient stock for lager {order_item.lager_id} "
+                             f"(requested {order_item.quantity}), order goes to 'new' status")
+                savepoint.rollback()
+                break
+            logger.info(f"Inventory quantity adjusted for {order_item.name} (Lager ID: {order_item.lager_id}): "
+                        f"-{order_item.quantity} -> {remaining} (allocated to order)")
+        else:
+            savepoint.commit()
+            status = 'for_delivery'
+            order.status = status
+            for order_item in order_items:
+                order_item.reserved = True
+
     db.session.commit()
     logger.debug(f"Order from lager created: {order.name} (ID: {order.id}, Status: {status})")
-    return jsonify({'ok': True, 'status': status})
+    return jsonify({'ok': True, 'id': order.id, 'status': status})
 
 # return_to_lager
 @orders_bp.route('/api/return_to_lager/<int:order_id>', methods=['POST'])
@@ -320,24 +521,45 @@ def return_to_lager(order_id):
         logger.warning(f"Return to lager failed: Order {order_id} not found")
         return jsonify({'error': 'Order not found'}), 404
     
-    if not order.lager_id:
+    # Multi-line orders give back what their lines reserved; older
+    # single-product orders their own lager_id and quantity
+    lines = OrderItem.query.filter_by(order_id=order_id).all()
+    if lines:
+        restock = [(line.lager_id, line.quantity, line.name) for line in lines if line.reserved and line.lager_id]
+    elif order.lager_id:
+        item = db.session.get(LagerItem, int(order.lager_id))
+        if not item:
+            logger.error(f"Return to lager failed: Lager item {order.lager_id} not found")
+            return jsonify({'error': 'Lager item not found'}), 404
+        restock = [(order.lager_id, order.quantity or 0, item.name)]
+    else:
         logger.warning(f"Return to lager failed: Order {order_id} has no lager_id")
         return jsonify({'error': 'Order has no lager_id'}), 404
-    
-    item = db.session.get(LagerItem, int(order.lager_id))
-    if not item:
-        logger.error(f"Return to lager failed: Lager item {order.lager_id} not found")
-        return jsonify({'error': 'Lager item not found'}), 404
-    
-    # Return the order quantity back to lager
-    old_qty = item.quantity
-    item.quantity += order.quantity
-    logger.info(f"Inventory quantity restored for {item.name} (Lager ID: {order.lager_id}): {old_qty} -> {item.quantity} (order returned)")
-    
-    # Delete the order after returning to lager
+
     order_name = order.name
-    db.session.delete(order)
-    
+    old_rollup = rollup_snapshot(order)
+
+    # Delete the order first; only the request whose DELETE matched may
+    # return stock, so a double-submitted return cannot restock twice.
+    deleted = db.session.execute(
+        delete(Order).where(Order.id == order_id).execution_options(synchronize_session='fetch')
+    ).rowcount
+    if deleted != 1:
+        db.session.rollback()
+        logger.warning(f"Return to lager failed: Order {order_id} already returned or deleted")
+        return jsonify({'error': 'Order not found'}), 404
+    db.session.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+
+    # Return the quantities back to lager
+    for lager_id, quantity, name in restock:
+        new_qty = add_stock(lager_id, quantity, reason='return', order_id=order_id)
+        if new_qty is None:
+            db.session.rollback()
+            logger.error(f"Return to lager failed: Lager item {lager_id} deleted concurrently")
+            return jsonify({'error': 'Lager item not found'}), 404
+        logger.info(f"Inventory quantity restored for {name} (Lager ID: {lager_id}): +{quantity} -> {new_qty} (order returned)")
+
+    update_sales_rollups([(old_rollup, None)])
     db.session.commit()
     logger.debug(f"Order {order_id} ({order_name}) returned to lager and deleted")
     return jsonify({'ok': True})
@@ -0,0 +1,573 @@
+"""
+Reports Blueprint - Izveštaji o prodaji iz agregiranih (rollup) tabela
+"""
+
+import re
+import logging
+import threading
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from sqlalchemy import func, select, text
+from models import db, read_only, OrderItem, SalesRollup, from_minor
+
+reports_bp = Blueprint('reports', __name__)
+logger = logging.getLogger(__name__)
+
+ROLLUP_DIMENSIONS = ('day', 'month', 'customer', 'product')
+BUCKETS = ('day', 'week', 'month')
+MAX_REPORT_ROWS = 1000
+MAX_BUCKETS = 3660
+# order_changes trims itself to roughly this many rows
+CHANGE_LOG_KEEP = 10000
+# Order ids per IN (...) when loading order lines
+LINES_CHUNK_SIZE = 500
+
+
+def order_day_sql(column='date'):
+    """SQL mapping Order.date (dd.mm.YYYY, older rows ISO) to YYYY-MM-DD or NULL.
+
+    order_day() below must stay equivalent.
+    """
+    return (
+        f"CASE WHEN {column} GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]' "
+        f"THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2) "
+        f"WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' THEN {column} END"
+    )
+
+
+# Must be written exactly like this in queries for SQLite to use ix_orders_status_day
+ORDER_DAY_SQL = order_day_sql()
+
+_ROLLUP_UPSERT = text(
+    "INSERT INTO sales_rollups (dimension, bucket, orders, quantity, revenue_minor) "
+    "VALUES (:dimension, :bucket, :orders, :quantity, :revenue_minor) "
+    "ON CONFLICT (dimension, bucket) DO UPDATE SET "
+    "orders = orders + excluded.orders, "
+    "quantity = quantity + excluded.quantity, "
+    "revenue_minor = revenue_minor + excluded.revenue_minor"
+)
+# ?sort= values -> sales_rollups columns
+ROLLUP_SORT_COLUMNS = {'revenue': 'revenue_minor', 'quantity': 'quantity', 'orders': 'orders'}
+
+
+def sold_lines_sql(orders_sql):
+    """SQL for the products sold by the orders in `orders_sql`, one row per line.
+
+    Columns: order_id, lager_id, name, quantity, price_minor. Orders with
+    order_items contribute their lines; older orders without lines count
+    as a single line of their own lager_id/name/quantity/price.
+    `orders_sql` must select id, lager_id, name, quantity, price_minor.
+    """
+    return (
+        f"SELECT oi.order_id, oi.lager_id, oi.name, oi.quantity, oi.price_minor "
+        f"FROM order_items oi JOIN ({orders_sql}) o ON o.id = oi.order_id "
+        f"UNION ALL "
+        f"SELECT o.id, o.lager_id, o.name, o.quantity, o.price_minor FROM ({orders_sql}) o "
+        f"WHERE NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)"
+    )
+
+
+# ─── Rollup Maintenance ────────────────────────────────────────
+
+def order_day(date):
+    """dd.mm.YYYY or YYYY-MM-DD -> YYYY-MM-DD, else None (same rules as ORDER_DAY_SQL)."""
+    m = re.fullmatch(r'([0-9]{2})\.([0-9]{2})\.([0-9]{4})', date or '')
+    if m:
+        return f'{m[3]}-{m[2]}-{m[1]}'
+    if re.fullmatch(r'[0-9]{4}-[0-9]{2}-[0-9]{2}', date or ''):
+        return date
+    return None
+
+
+def order_products(order_ids):
+    """{order id: ((product name, quantity, price_minor), ...)} from order_items.
+
+    Lines are summed per product name. Orders without lines are absent.
+    """
+    products = {}
+    ids = list(order_ids)
+    name = func.coalesce(OrderItem.name, '')
+    for i in range(0, len(ids), LINES_CHUNK_SIZE):
+        rows = db.session.execute(
+            select(OrderItem.order_id, name, func.sum(func.coalesce(OrderItem.quantity, 0)),
+                   func.sum(func.coalesce(OrderItem.price_minor, 0)))
+            .where(OrderItem.order_id.in_(ids[i:i + LINES_CHUNK_SIZE]))
+            .group_by(OrderItem.order_id, name).order_by(OrderItem.order_id, name)
+        )
+        for order_id, product, quantity, price in rows:
+            products.setdefault(order_id, []).append((product, quantity, price))
+    return {order_id: tuple(lines) for order_id, lines in products.items()}
+
+
+def rollup_snapshot(order, status=None, products=None):
+    """What an order contributes to the rollups, or None if it is not realized.
+
+    Works on Order objects and on result rows with the same attributes;
+    `status` overrides order.status (for bulk updates before they run).
+    `products` is order_products() for many orders at once; without it
+    the order's lines are loaded here.
+    """
+    if order is None or (status or order.status) != 'realized':
+        return None
+    if products is None:
+        products = order_products([order.id])
+    price, quantity = order.price_minor or 0, order.quantity or 0
+    lines = products.get(order.id) or ((order.name or '', quantity, price),)
+    return (order.date, order.customer or '', price, quantity, lines)
+
+
+def update_sales_rollups(changes):
+    """Apply [(old_snapshot, new_snapshot), ...] to sales_rollups.
+
+    Runs in the caller's transaction, so rollups commit or roll back
+    together with the order change.
+    """
+    deltas = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        for snapshot, sign in ((old, -1), (new, 1)):
+            if snapshot is None:
+                continue
+            date, customer, price, quantity, lines = snapshot
+            keys = [('customer', customer, quantity, price)]
+            day = order_day(date)
+            if day:
+                keys += [('day', day, quantity, price), ('month', day[:7], quantity, price)]
+            # Products come from the order's lines, one bucket per product name
+            keys += [('product', name, line_quantity, line_price) for name, line_quantity, line_price in lines]
+            for dimension, bucket, key_quantity, key_price in keys:
+                delta = deltas.setdefault((dimension, bucket), [0, 0, 0])
+                delta[0] += sign
+                delta[1] += sign * key_quantity
+                delta[2] += sign * key_price
+
+    params = [
+        {'dimension': dim, 'bucket': bucket, 'orders': d[0], 'quantity': d[1], 'revenue_minor': d[2]}
+        for (dim, bucket), d in deltas.items() if any(d)
+    ]
+    if not params:
+        return
+    db.session.execute(_ROLLUP_UPSERT, params)
+    emptied = [p for p in params if p['orders'] < 0]
+    if emptied:
+        db.session.execute(text(
+            "DELETE FROM sales_rollups WHERE dimension = :dimension AND bucket = :bucket AND orders <= 0"
+        ), emptied)
+    logger.debug(f"Sales rollups updated: {len(params)} bucket(s)")
+
+
+def rebuild_sales_rollups():
+    """Recompute all rollups from realized orders (set-based). Returns the realized order count."""
+    insert = "INSERT INTO sales_rollups (dimension, bucket, orders, quantity, revenue_minor)"
+    realized = "FROM orders WHERE status = 'realized'"
+    totals = "COUNT(*), SUM(COALESCE(quantity, 0)), SUM(COALESCE(price_minor, 0))"
+    lines = sold_lines_sql(f"SELECT id, lager_id, name, quantity, price_minor {realized}")
+    statements = [
+        "DELETE FROM sales_rollups",
+        f"{insert} SELECT 'customer', COALESCE(customer, ''), {totals} {realized} GROUP BY 2",
+        f"{insert} SELECT 'product', COALESCE(name, ''), COUNT(DISTINCT order_id), "
+        f"SUM(COALESCE(quantity, 0)), SUM(COALESCE(price_minor, 0)) FROM ({lines}) GROUP BY 2",
+        f"{insert} SELECT 'day', day, COUNT(*), SUM(q), SUM(p) FROM ("
+        f"SELECT {ORDER_DAY_SQL} AS day, COALESCE(quantity, 0) AS q, COALESCE(price_minor, 0) AS p {realized}"
+        f") WHERE day IS NOT NULL GROUP BY day",
+        f"{insert} SELECT 'month', substr(bucket, 1, 7), SUM(orders), SUM(quantity), SUM(revenue_minor) "
+        "FROM sales_rollups WHERE dimension = 'day' GROUP BY 2",
+    ]
+    for sql in statements:
+        db.session.execute(text(sql))
+    count = db.session.execute(text(f"SELECT COUNT(*) {realized}")).scalar()
+    db.session.commit()
+    logger.info(f"Sales rollups rebuilt from {count} realized order(s)")
+    return count
+
+
+def ensure_sales_rollups():
+    """Backfill the rollups on first start (table empty but realized orders exist)."""
+    has_rollups = db.session.execute(text("SELECT 1 FROM sales_rollups LIMIT 1")).first()
+    if has_rollups is None and db.session.execute(
+        text("SELECT 1 FROM orders WHERE status = 'realized' LIMIT 1")
+    ).first() is not None:
+        logger.info("Sales rollups empty, backfilling from orders")
+        rebuild_sales_rollups()
+
+
+# ─── Reporting Schema & Cache ──────────────────────────────────
+
+# Created by ensure_report_schema; the startup check looks for these names
+REPORT_SCHEMA_OBJECTS = (
+    'ix_orders_status_day', 'ix_stock_movements_created_at',
+    'order_changes_ai', 'order_changes_au', 'order_changes_ad', 'order_changes_trim',
+)
+
+
+def ensure_report_schema():
+    """Create the date expression index and the order change-log triggers.
+
+    Like the FTS triggers these live outside the models; a migration that
+    rebuilds orders drops them, and the next start finds them missing
+    (see ERP_server.missing_derived_schema) and recreates them.
+    """
+    day_new, day_old = order_day_sql('new.date'), order_day_sql('old.date')
+    statements = [
+        f"CREATE INDEX IF NOT EXISTS ix_orders_status_day ON orders (status, ({ORDER_DAY_SQL}))",
+        "CREATE INDEX IF NOT EXISTS ix_stock_movements_created_at ON stock_movements (created_at)",
+        f"CREATE TRIGGER IF NOT EXISTS order_changes_ai AFTER INSERT ON orders BEGIN "
+        f"INSERT INTO order_changes (day) VALUES ({day_new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS order_changes_au AFTER UPDATE OF status, date, price_minor, quantity, "
+        f"customer, name, lager_id ON orders BEGIN "
+        f"INSERT INTO order_changes (day) VALUES ({day_old}); "
+        f"INSERT INTO order_changes (day) SELECT {day_new} WHERE new.date IS NOT old.date; END",
+        f"CREATE TRIGGER IF NOT EXISTS order_changes_ad AFTER DELETE ON orders BEGIN "
+        f"INSERT INTO order_changes (day) VALUES ({day_old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS order_changes_trim AFTER INSERT ON order_changes BEGIN "
+        f"DELETE FROM order_changes WHERE id <= new.id - {CHANGE_LOG_KEEP}; END",
+    ]
+    with db.engine.begin() as conn:
+        for sql in statements:
+            conn.execute(text(sql))
+
+
+def bucket_of(day, bucket):
+    """Bucket key of an ISO day: the day, the Monday of its week, or YYYY-MM."""
+    if bucket == 'month':
+        return day[:7]
+    if bucket == 'week':
+        d = date.fromisoformat(day)
+        return (d - timedelta(days=d.weekday())).isoformat()
+    return day
+
+
+def bucket_range(bucket, key):
+    """First and last ISO day covered by a bucket key."""
+    if bucket == 'month':
+        first = date.fromisoformat(key + '-01')
+        last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return first.isoformat(), last.isoformat()
+    if bucket == 'week':
+        return key, (date.fromisoformat(key) + timedelta(days=6)).isoformat()
+    return key, key
+
+
+def bucket_keys(bucket, date_from, date_to):
+    """All bucket keys from date_from to date_to (ISO days), oldest first."""
+    keys = []
+    day = date.fromisoformat(bucket_range(bucket, bucket_of(date_from, bucket))[0])
+    end = date.fromisoformat(date_to)
+    while day <= end and len(keys) < MAX_BUCKETS:
+        keys.append(bucket_of(day.isoformat(), bucket))
+        day = date.fromisoformat(bucket_range(bucket, keys[-1])[1]) + timedelta(days=1)
+    return keys
+
+
+class ReportCache:
+    """Per-process cache of report buckets, invalidated from order_changes.
+
+    Bucket entries are keyed (report, bucket, status, key); range entries
+    (top-N) are keyed by their parameters and dropped when a changed day
+    falls inside their range. Orders without a parseable date never fall
+    into a dated bucket, so their changes invalidate nothing.
+    """
+
+    MAX_RANGE_ENTRIES = 256
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.ranges = {}
+        self.last_change = None
+
+    def sync(self):
+        """Drop entries touched by order writes since the last sync.
+
+        Returns the cache generation (last order_changes id seen). Results
+        computed after a sync are only stored while it is still current,
+        see put_buckets()/put_range().
+        """
+        low, high = db.session.execute(text("SELECT MIN(id), MAX(id) FROM order_changes")).one()
+        with self.lock:
+            if self.last_change is None or (low is not None and low > self.last_change + 1):
+                # First use, or the log was trimmed past us: start over
+                self.buckets.clear()
+                self.ranges.clear()
+            elif high is not None and high > self.last_change:
+                days = {row[0] for row in db.session.execute(text(
+                    "SELECT DISTINCT day FROM order_changes WHERE id > :last AND day IS NOT NULL"
+                ), {'last': self.last_change})}
+                for day in days:
+                    for bucket in BUCKETS:
+                        key = bucket_of(day, bucket)
+                        for cache_key in [k for k in self.buckets if k[1] == bucket and k[3] == key]:
+                            del self.buckets[cache_key]
+                    for range_key in [k for k in self.ranges if k[1] <= day <= k[2]]:
+                        del self.ranges[range_key]
+                logger.debug(f"Report cache: {len(days)} changed day(s) invalidated")
+            self.last_change = high or 0
+            return self.last_change
+
+    def get_range(self, key):
+        with self.lock:
+            return self.ranges.get(key)
+
+    def put_buckets(self, entries, generation):
+        """Store {cache key: entry} unless another sync invalidated since `generation`."""
+        with self.lock:
+            if self.last_change != generation:
+                return False
+            self.buckets.update(entries)
+            return True
+
+    def put_range(self, key, value, generation):
+        with self.lock:
+            if self.last_change != generation:
+                return False
+            if len(self.ranges) >= self.MAX_RANGE_ENTRIES:
+                self.ranges.clear()
+            self.ranges[key] = value
+            return True
+
+
+report_cache = ReportCache()
+
+
+def _status_filter(status):
+    if status == 'all':
+        return "status IN ('new', 'for_delivery', 'realized')", {}
+    return "status = :status", {'status': status}
+
+
+def bucketed_totals(bucket, date_from, date_to, status='realized'):
+    """Orders, quantity and revenue_minor (para) per bucket; empty buckets are zero.
+
+    Only buckets missing from the cache are queried, in one range scan on
+    ix_orders_status_day.
+    """
+    generation = report_cache.sync()
+    keys = bucket_keys(bucket, date_from, date_to)
+    with report_cache.lock:
+        cached = {k: report_cache.buckets.get(('totals', bucket, status, k)) for k in keys}
+    missing = [k for k, v in cached.items() if v is None]
+
+    if missing:
+        where, params = _status_filter(status)
+        params.update({'start': bucket_range(bucket, missing[0])[0],
+                       'end': bucket_range(bucket, missing[-1])[1]})
+        rows = db.session.execute(text(
+            f"SELECT {ORDER_DAY_SQL} AS day, COUNT(*), SUM(COALESCE(quantity, 0)), SUM(COALESCE(price_minor, 0)) "
+            f"FROM orders WHERE {where} AND {ORDER_DAY_SQL} BETWEEN :start AND :end GROUP BY day"
+        ), params).all()
+        fresh = {k: {'bucket': k, 'orders': 0, 'quantity': 0, 'revenue_minor': 0} for k in missing}
+        for day, orders, quantity, revenue_minor in rows:
+            entry = fresh.get(bucket_of(day, bucket))
+            if entry is not None:
+                entry['orders'] += orders
+                entry['quantity'] += quantity
+                entry['revenue_minor'] += revenue_minor
+        # Computed from a snapshot that may predate a change another request
+        # has synced meanwhile; such results are returned but not cached
+        report_cache.put_buckets({('totals', bucket, status, k): entry for k, entry in fresh.items()}, generation)
+        cached.update(fresh)
+        logger.debug(f"Report buckets computed: {len(missing)} of {len(keys)} ({bucket})")
+    return [cached[k] for k in keys]
+
+
+def top_sellers(group, date_from, date_to, sort='revenue', limit=10):
+    """Top customers or products among realized orders dated in the range."""
+    key = (group, date_from, date_to, sort, limit)
+    generation = report_cache.sync()
+    result = report_cache.get_range(key)
+    if result is None:
+        realized = f"FROM orders WHERE status = 'realized' AND {ORDER_DAY_SQL} BETWEEN :start AND :end"
+        if group == 'customer':
+            column, orders, source = 'customer', 'COUNT(*)', realized
+        else:
+            # Products are counted per order line, like the 'product' rollups
+            lines = sold_lines_sql(f"SELECT id, lager_id, name, quantity, price_minor {realized}")
+            column, orders, source = 'name', 'COUNT(DISTINCT order_id)', f"FROM ({lines})"
+        rows = db.session.execute(text(
+            f"SELECT COALESCE({column}, '') AS bucket, {orders} AS orders, "
+            f"SUM(COALESCE(quantity, 0)) AS quantity, SUM(COALESCE(price_minor, 0)) AS revenue "
+            f"{source} GROUP BY bucket ORDER BY {sort} DESC, bucket LIMIT :limit"
+        ), {'start': date_from, 'end': date_to, 'limit': limit}).all()
+        result = [{'bucket': r.bucket, 'orders': r.orders, 'quantity': r.quantity,
+                   'revenue': from_minor(r.revenue)} for r in rows]
+        report_cache.put_range(key, result, generation)
+    return result
+
+
+def inventory_turnover(date_from, date_to, limit=100):
+    """Units sold per lager item in the range against its average stock.
+
+    Sold = order lines (or, for older orders without lines, Order.lager_id)
+    of realized orders dated in the range. Opening/closing stock are
+    rebuilt from the stock ledger, so turnover = sold / ((opening + closing) / 2).
+    """
+    lines = sold_lines_sql(
+        f"SELECT id, lager_id, name, quantity, price_minor FROM orders "
+        f"WHERE status = 'realized' AND {ORDER_DAY_SQL} BETWEEN :start AND :end"
+    )
+    rows = db.session.execute(text(
+        f"WITH sold AS ("
+        f"  SELECT lager_id, SUM(COALESCE(quantity, 0)) AS qty, COUNT(DISTINCT order_id) AS orders "
+        f"  FROM ({lines}) WHERE lager_id IS NOT NULL GROUP BY lager_id"
+        f"), moved AS ("
+        f"  SELECT lager_id, "
+        f"    SUM(CASE WHEN created_at >= :start_ts THEN delta ELSE 0 END) AS since_start, "
+        f"    SUM(CASE WHEN created_at > :end_ts THEN delta ELSE 0 END) AS since_end "
+        f"  FROM stock_movements WHERE created_at >= :start_ts GROUP BY lager_id"
+        f") "
+        f"SELECT l.id, l.name, COALESCE(l.quantity, 0) AS current, sold.qty AS sold, sold.orders, "
+        f"  COALESCE(l.quantity, 0) - COALESCE(moved.since_start, 0) AS opening, "
+        f"  COALESCE(l.quantity, 0) - COALESCE(moved.since_end, 0) AS closing "
+        f"FROM sold JOIN lager l ON l.id = sold.lager_id "
+        f"LEFT JOIN moved ON moved.lager_id = sold.lager_id "
+        f"ORDER BY sold.qty DESC, l.id LIMIT :limit"
+    ), {'start': date_from, 'end': date_to, 'start_ts': f"{date_from}T00:00:00",
+        'end_ts': f"{date_to}T23:59:59", 'limit': limit}).all()
+
+    items = []
+    for r in rows:
+        average = (r.opening + r.closing) / 2
+        items.append({
+            'lager_id': r.id, 'name': r.name, 'sold': r.sold, 'orders': r.orders,
+            'opening_stock': r.opening, 'closing_stock': r.closing, 'current_stock': r.current,
+            'turnover': round(r.sold / average, 3) if average > 0 else None,
+        })
+    return items
+
+
+def _parse_range(default_days):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD, defaulting to the last default_days days."""
+    today = date.today()
+    date_from = request.args.get('from') or (today - timedelta(days=default_days - 1)).isoformat()
+    date_to = request.args.get('to') or today.isoformat()
+    try:
+        if date.fromisoformat(date_from) > date.fromisoformat(date_to):
+            return None
+    except ValueError:
+        return None
+    return date_from, date_to
+
+
+# ─── API Routes ────────────────────────────────────────────────
+
+@reports_bp.route('/api/reports/sales', methods=['GET'])
+@login_required
+@read_only
+def sales_summary():
+    """Total realized orders, quantity and revenue."""
+    # Every realized order is in exactly one customer bucket
+    row = db.session.execute(text(
+        "SELECT COALESCE(SUM(orders), 0), COALESCE(SUM(quantity), 0), COALESCE(SUM(revenue_minor), 0) "
+        "FROM sales_rollups WHERE dimension = 'customer'"
+    )).one()
+    return jsonify({'orders': row[0], 'quantity': row[1], 'revenue': from_minor(row[2])})
+
+
+@reports_bp.route('/api/reports/sales/<dimension>', methods=['GET'])
+@login_required
+@read_only
+def sales_by(dimension):
+    """Realized sales per day, month, customer or product.
+
+    day/month: ?from=YYYY-MM[-DD]&to=YYYY-MM[-DD], oldest first
+    customer/product: ?sort=revenue|quantity|orders&limit=20, largest first
+    """
+    if dimension not in ROLLUP_DIMENSIONS:
+        return jsonify({'error': 'Dimenzija mora biti day, month, customer ili product'}), 400
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_REPORT_ROWS)
+
+    query = SalesRollup.query.filter(SalesRollup.dimension == dimension)
+    if dimension in ('day', 'month'):
+        date_from = request.args.get('from', '')
+        date_to = request.args.get('to', '')
+        if date_from:
+            query = query.filter(SalesRollup.bucket >= date_from)
+        if date_to:
+            # '~' sorts after digits, so to=2024-03 includes all of March
+            query = query.filter(SalesRollup.bucket <= date_to + '~')
+        query = query.order_by(SalesRollup.bucket)
+    else:
+        sort = request.args.get('sort', 'revenue')
+        if sort not in ('revenue', 'quantity', 'orders'):
+            return jsonify({'error': 'Sortiranje mora biti revenue, quantity ili orders'}), 400
+        query = query.order_by(getattr(SalesRollup, ROLLUP_SORT_COLUMNS[sort]).desc(), SalesRollup.bucket)
+
+    rows = query.limit(limit).all()
+    logger.debug(f"Sales report by {dimension}: {len(rows)} row(s)")
+    return jsonify({'dimension': dimension, 'items': [r.to_dict() for r in rows]})
+
+
+@reports_bp.route('/api/reports/revenue', methods=['GET'])
+@login_required
+@read_only
+def revenue_report():
+    """Order count, quantity and revenue per day, week (Monday) or month.
+
+    ?bucket=day|week|month&from=YYYY-MM-DD&to=YYYY-MM-DD&status=realized|new|for_delivery|all
+    """
+    bucket = request.args.get('bucket', 'day')
+    status = request.args.get('status', 'realized')
+    if bucket not in BUCKETS:
+        return jsonify({'error': 'Bucket mora biti day, week ili month'}), 400
+    if status not in ('realized', 'new', 'for_delivery', 'all'):
+        return jsonify({'error': 'Neispravan status'}), 400
+    date_range = _parse_range({'day': 30, 'week': 84, 'month': 365}[bucket])
+    if not date_range:
+        return jsonify({'error': 'Neispravan opseg datuma (YYYY-MM-DD)'}), 400
+
+    totals = bucketed_totals(bucket, *date_range, status=status)
+    return jsonify({
+        'bucket': bucket, 'status': status, 'from': date_range[0], 'to': date_range[1],
+        'total': {
+            'orders': sum(i['orders'] for i in totals),
+            'quantity': sum(i['quantity'] for i in totals),
+            'revenue': from_minor(sum(i['revenue_minor'] for i in totals)),
+        },
+        'items': [{'bucket': i['bucket'], 'orders': i['orders'], 'quantity': i['quantity'],
+                   'revenue': from_minor(i['revenue_minor'])} for i in totals],
+    })
+
+
+@reports_bp.route('/api/reports/top/<group>', methods=['GET'])
+@login_required
+@read_only
+def top_report(group):
+    """Top customers or products: ?from=&to=&sort=revenue|quantity|orders&limit=10
+
+    Without a date range this reads the all-time rollups.
+    """
+    if group not in ('customers', 'products'):
+        return jsonify({'error': 'Grupa mora biti customers ili products'}), 400
+    default_sort = 'revenue' if group == 'customers' else 'quantity'
+    sort = request.args.get('sort', default_sort)
+    if sort not in ('revenue', 'quantity', 'orders'):
+        return jsonify({'error': 'Sortiranje mora biti revenue, quantity ili orders'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_REPORT_ROWS)
+    dimension = group[:-1]
+
+    if not request.args.get('from') and not request.args.get('to'):
+        rows = (SalesRollup.query.filter(SalesRollup.dimension == dimension)
+                .order_by(getattr(SalesRollup, ROLLUP_SORT_COLUMNS[sort]).desc(), SalesRollup.bucket)
+                .limit(limit).all())
+        return jsonify({'group': group, 'sort': sort, 'items': [r.to_dict() for r in rows]})
+
+    date_range = _parse_range(30)
+    if not date_range:
+        return jsonify({'error': 'Neispravan opseg datuma (YYYY-MM-DD)'}), 400
+    items = top_sellers(dimension, *date_range, sort=sort, limit=limit)
+    return jsonify({'group': group, 'sort': sort, 'from': date_range[0], 'to': date_range[1], 'items': items})
+
+
+@reports_bp.route('/api/reports/turnover', methods=['GET'])
+@login_required
+@read_only
+def turnover_report():
+    """Inventory turnover per lager item: ?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=100"""
+    date_range = _parse_range(90)
+    if not date_range:
+        return jsonify({'error': 'Neispravan opseg datuma (YYYY-MM-DD)'}), 400
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_REPORT_ROWS)
+    items = inventory_turnover(*date_range, limit=limit)
+    return jsonify({'from': date_range[0], 'to': date_range[1], 'items': items})
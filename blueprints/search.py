@@ -0,0 +1,150 @@
+"""
+Search Blueprint - Full-text pretraga porudžbina i lagera (SQLite FTS5)
+"""
+
+import re
+import logging
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from sqlalchemy import text
+from models import db, read_only, Order, LagerItem
+
+search_bp = Blueprint('search', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_PER_PAGE = 100
+
+# External-content FTS5 tables: the index stores only tokens, rows stay in
+# orders/lager. Triggers keep it in sync; the UPDATE triggers fire only when
+# an indexed column changes, so status/paid/quantity updates cost nothing.
+# remove_diacritics lets "cvece" match "cveće".
+SEARCH_INDEXES = {
+    'orders_fts': {
+        'table': 'orders',
+        'columns': ['name', 'customer', 'description', 'color'],
+        # bm25 column weights: name and customer matter most
+        'weights': '10.0, 8.0, 1.0, 2.0',
+    },
+    'lager_fts': {
+        'table': 'lager',
+        'columns': ['name', 'color', 'location'],
+        'weights': '10.0, 3.0, 1.0',
+    },
+}
+
+
+# ─── Helper Functions ──────────────────────────────────────────
+
+def _search_index_ddl(fts, spec):
+    table = spec['table']
+    cols = ', '.join(spec['columns'])
+    new_vals = ', '.join(f'new.{c}' for c in spec['columns'])
+    old_vals = ', '.join(f'old.{c}' for c in spec['columns'])
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def ensure_search_index():
+    """Create FTS5 tables and sync triggers if missing.
+
+    The index is rebuilt from the content table whenever the FTS table or
+    any trigger was missing (first run, or a migration that rebuilt the
+    base table and dropped its triggers).
+    """
+    with db.engine.begin() as conn:
+        existing = {row[0] for row in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+        ))}
+        for fts, spec in SEARCH_INDEXES.items():
+            expected = {fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au'}
+            if expected <= existing:
+                continue
+            logger.info(f"Building full-text index {fts} for table {spec['table']}")
+            for ddl in _search_index_ddl(fts, spec):
+                conn.execute(text(ddl))
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            logger.info(f"Full-text index {fts} built")
+
+
+def build_match_query(q):
+    """Turn free user text into a safe FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r'\w+', q or '', flags=re.UNICODE)
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+def _search(fts, model, match, limit, offset, extra_where='', params=None):
+    spec = SEARCH_INDEXES[fts]
+    table = spec['table']
+    params = dict(params or {}, match=match, limit=limit, offset=offset)
+    # Join the content table only when filtering on its columns. CROSS JOIN
+    # keeps the FTS table outer; otherwise the planner may drive from an
+    # index on the filter column and rerun the MATCH once per row
+    join = f"CROSS JOIN {table} t ON t.id = {fts}.rowid" if extra_where else ''
+    total = db.session.execute(text(
+        f"SELECT COUNT(*) FROM {fts} {join} WHERE {fts} MATCH :match {extra_where}"
+    ), params).scalar()
+    ranked = db.session.execute(text(
+        f"SELECT {fts}.rowid, bm25({fts}, {spec['weights']}) AS score "
+        f"FROM {fts} {join} "
+        f"WHERE {fts} MATCH :match {extra_where} "
+        f"ORDER BY score LIMIT :limit OFFSET :offset"
+    ), params).all()
+
+    ids = [row[0] for row in ranked]
+    rows = {r.id: r for r in model.query.filter(model.id.in_(ids)).all()} if ids else {}
+    items = []
+    for row_id, score in ranked:
+        if row_id in rows:
+            item = rows[row_id].to_dict()
+            item['score'] = round(-score, 6)
+            items.append(item)
+    return {'total': total, 'items': items}
+
+
+# ─── API Routes ────────────────────────────────────────────────
+
+@search_bp.route('/api/search', methods=['GET'])
+@login_required
+@read_only
+def search():
+    """Ranked, paginated search.
+
+    ?q=text&type=all|orders|inventory&status=new|for_delivery|realized&page=1&per_page=20
+    """
+    q = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'all')
+    status = request.args.get('status', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+    offset = (page - 1) * per_page
+
+    if search_type not in ('all', 'orders', 'inventory'):
+        return jsonify({'error': 'Tip mora biti all, orders ili inventory'}), 400
+
+    match = build_match_query(q)
+    logger.debug(f"Search: q={q!r}, match={match!r}, type={search_type}, page={page}")
+    if not match:
+        return jsonify({'error': 'Upit za pretragu je prazan'}), 400
+
+    result = {'query': q, 'page': page, 'per_page': per_page}
+    try:
+        if search_type in ('all', 'orders'):
+            extra, params = '', {}
+            if status:
+                extra, params = 'AND t.status = :status', {'status': status}
+            result['orders'] = _search('orders_fts', Order, match, per_page, offset, extra, params)
+        if search_type in ('all', 'inventory'):
+            result['inventory'] = _search('lager_fts', LagerItem, match, per_page, offset)
+    except Exception as e:
+        logger.exception("Search failed")
+        return jsonify({'error': f'Greška pri pretrazi: {str(e)}'}), 500
+    return jsonify(result)
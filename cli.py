@@ -337,25 +337,39 @@ def cmd_backup(args):
                 print(f"\nGreška:\n{error_msg}")
         sys.exit(1)
 
+def _format_check(name, check):
+    """One readiness check as indented lines: '✓ disk' plus its figures."""
+    mark = {'ok': '✓', 'warn': '!', 'fail': '✗'}.get(check.get('status'), '?')
+    lines = [f"  {mark} {name}"]
+    for key, value in check.items():
+        if key == 'status':
+            continue
+        if isinstance(value, dict):
+            inner = ', '.join(f"{k}={v}" for k, v in value.items() if k != 'status' and v is not None)
+            lines.append(f"      {key} [{value.get('status', '-')}]: {inner}")
+        else:
+            lines.append(f"      {key}: {value}")
+    return lines
+
+
 def cmd_health(args):
     """Proveri health status servera"""
+    import json
     import urllib.request
     import urllib.error
     
     port = CONFIG.get('PORT', '8000')
-    url = f"http://localhost:{port}/health"
+    url = f"http://localhost:{port}/health/{'live' if args.live else 'ready'}"
     
     logger.info(f"Checking server health at {url}")
     try:
-        with urllib.request.urlopen(url, timeout=5) as response:
-            logger.info("Server health check passed")
-            print(f"✓ Server je ZDRAV")
-            print(f"  URL: {url}")
-            print(f"  Status: {response.status}")
-            if args.verbose:
-                response_data = response.read().decode()
-                logger.debug(f"Health response: {response_data}")
-                print(f"  Response: {response_data}")
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                status, body = response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            # /health/ready answers 503 with the full report when a check fails
+            status, body = e.code, e.read().decode()
+        report = json.loads(body)
     except urllib.error.URLError as e:
         logger.error(f"Server health check failed: {e.reason}")
         print(f"✗ Server nije dostupan")
@@ -367,6 +381,105 @@ def cmd_health(args):
         print(f"✗ Greška: {e}")
         sys.exit(1)
 
+    logger.debug(f"Health response ({status}): {body}")
+    if status != 200:
+        print(f"✗ Server NIJE SPREMAN ({report.get('status', status)})")
+    elif report.get('status') == 'degraded':
+        print(f"! Server radi uz upozorenja")
+    else:
+        print(f"✓ Server je ZDRAV")
+    print(f"  URL: {url}")
+    print(f"  Status: {status}")
+    if 'uptime_s' in report:
+        print(f"  Uptime: {report['uptime_s']}s")
+    checks = report.get('checks', {})
+    for name, check in checks.items():
+        if args.verbose or check.get('status') != 'ok':
+            print('\n'.join(_format_check(name, check)))
+    if args.verbose and 'duration_ms' in report:
+        print(f"  Provera trajala: {report['duration_ms']}ms (verzija {report.get('version')})")
+    if status != 200:
+        sys.exit(1)
+
+
+def cmd_bench(args):
+    """Load test lokalnog servera"""
+    import json
+    import getpass
+    from loadtest import LoadTest, parse_mix, ensure_local, format_report
+
+    url = args.url or f"http://localhost:{CONFIG.get('PORT', '8000')}"
+    try:
+        ensure_local(url)
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+    password = args.password or os.environ.get('ERP_BENCH_PASSWORD') or getpass.getpass(f"Lozinka za {args.user}: ")
+    limit = f"{args.requests} zahteva" if args.requests else f"{args.duration}s"
+    logger.info(f"Load test against {url}: concurrency={args.concurrency}, limit={limit}")
+    if not args.json:
+        print(f"Load test: {url}, {args.concurrency} korisnika, {limit}...")
+
+    test = LoadTest(url, args.user, password, mix=mix, concurrency=args.concurrency,
+                    duration=None if args.requests else args.duration, max_requests=args.requests,
+                    timeout=args.timeout, seed=args.seed)
+    try:
+        report = test.run()
+    except Exception as e:
+        logger.error(f"Load test failed: {e}", exc_info=True)
+        print(f"✗ Load test nije uspeo: {e}")
+        sys.exit(1)
+
+    logger.info(f"Load test done: {report['requests']} requests, {report['throughput_rps']} req/s, "
+                f"p95 {report['p95_ms']}ms, {report['errors']} errors")
+    print(json.dumps(report, indent=2) if args.json else '\n' + format_report(report))
+    if report['errors'] or report['login_errors']:
+        sys.exit(1)
+
+
+def cmd_profiles(args):
+    """Pregled profila zahteva iz DATA_DIR/profiles"""
+    from profiling import list_profiles, summarize_profiles
+
+    profile_dir = Path(CONFIG.get('DATA_DIR', SCRIPT_DIR / 'data')) / 'profiles'
+    profiles = list_profiles(str(profile_dir), endpoint=args.endpoint)
+    if args.clear:
+        for profile in profiles:
+            os.remove(profile['path'])
+        logger.info(f"Removed {len(profiles)} profile(s) from {profile_dir}")
+        print(f"✓ Obrisano profila: {len(profiles)}")
+        return
+    if not profiles:
+        print(f"Nema profila u {profile_dir}" + (f" za {args.endpoint}" if args.endpoint else ''))
+        print("Uključi: X-Profile: 1 header (admin) ili POST /api/admin/profiling {\"sample_rate\": 0.01}")
+        return
+
+    if args.name:
+        selected = [p for p in profiles if p['name'] == args.name or (args.name == 'latest' and p is profiles[0])]
+        if not selected:
+            print(f"✗ Profil ne postoji: {args.name}")
+            sys.exit(1)
+    elif args.endpoint:
+        # All profiles of one endpoint merged into a single top-N report
+        selected = profiles
+    else:
+        print(f"{'vreme':20} {'ms':>7}  {'endpoint':35} fajl")
+        for p in profiles[:args.limit]:
+            print(f"{p['time']:20} {p['ms']:>7}  {p['endpoint']:35} {p['name']}")
+        by_endpoint = {}
+        for p in profiles:
+            by_endpoint.setdefault(p['endpoint'], []).append(p['ms'])
+        print(f"\nUkupno {len(profiles)} profila. Najsporiji endpointi (prosek ms):")
+        for endpoint, times in sorted(by_endpoint.items(), key=lambda e: -sum(e[1]) / len(e[1]))[:10]:
+            print(f"  {endpoint:35} {sum(times) / len(times):>8.0f} ms  ({len(times)} profila)")
+        print("\nDetalji: erp profiles latest | erp profiles <fajl> | erp profiles -e <endpoint>")
+        return
+
+    print(f"{len(selected)} profil(a), sortirano po {args.sort}, top {args.top}:")
+    print(summarize_profiles([p['path'] for p in selected], limit=args.top, sort=args.sort))
+
 
 def cmd_info(args):
     """Prikaži sve informacije o instalaciji"""
@@ -546,23 +659,66 @@ def cmd_db(args):
             print(f"Veličina: {size:.2f} MB")
         else:
             print("Database ne postoji.")
+
+    elif args.action == 'stats':
+        # Rows, dbstat pages per table/index, freelist, WAL and hot query plans
+        import db_stats
+        argv = ['--data-dir', str(data_dir)] + (['--json'] if args.json else [])
+        sys.exit(db_stats.main(argv))
     
     elif args.action == 'backup':
         if db_file.exists():
-            backup_file = data_dir / f"erp_backup_{subprocess.run(['date', '+%Y%m%d_%H%M%S'], capture_output=True, text=True).stdout.strip()}.db"
-            subprocess.run(['cp', str(db_file), str(backup_file)])
-            print(f"✓ Backup kreiran: {backup_file}")
+            # Online backup API: consistent even while the server writes through WAL
+            from db_backup import backup_database, rotate_backups
+            backup_dir = data_dir / 'backups'
+            logger.info(f"Starting online database backup ({args.method})")
+
+            def show_progress(done, total):
+                print(f"\r  Kopirano stranica: {done}/{total}", end='', flush=True)
+
+            try:
+                backup_file = backup_database(str(db_file), str(backup_dir), method=args.method,
+                                              progress=show_progress)
+                print("")
+                removed = rotate_backups(str(backup_dir), args.keep_last, args.keep_weekly, args.keep_monthly)
+            except Exception as e:
+                print("")
+                logger.error(f"Database backup failed: {e}", exc_info=True)
+                print(f"✗ Backup nije uspeo: {e}")
+                sys.exit(1)
+            print(f"✓ Backup kreiran i proveren (integrity_check): {backup_file}")
+            if removed:
+                print(f"  Obrisano starih backup-a: {len(removed)}")
         else:
             print("Database ne postoji.")
     
     elif args.action == 'vacuum':
         print("Optimizacija baze...")
         venv_python = SCRIPT_DIR / "venv" / "bin" / "python"
+        # The full VACUUM also switches the file to auto_vacuum=INCREMENTAL,
+        # after which the maintenance scheduler reclaims free pages in small steps
         subprocess.run([
             str(venv_python), '-c',
-            f"import sqlite3; c=sqlite3.connect('{db_file}'); c.execute('VACUUM'); c.close(); print('✓ VACUUM završen')"
+            f"import sqlite3; c=sqlite3.connect('{db_file}'); c.execute('PRAGMA auto_vacuum=INCREMENTAL'); "
+            f"c.execute('VACUUM'); c.close(); print('✓ VACUUM završen')"
         ])
 
+    elif args.action == 'maintenance':
+        # Forced pass of the scheduler's tasks: checkpoint, ANALYZE, incremental vacuum
+        import maintenance
+        argv = ['--data-dir', str(data_dir)] + (['--history'] if args.history else [])
+        logger.info("Running database maintenance")
+        sys.exit(maintenance.main(argv))
+
+    elif args.action == 'migrate':
+        # Ordered registry keyed on PRAGMA user_version; only pending steps run
+        import migrations
+        argv = ['--data-dir', str(data_dir), '--batch-size', str(args.batch_size)]
+        if args.status:
+            argv.append('--status')
+        logger.info("Running database migrations")
+        sys.exit(migrations.main(argv))
+
 def cmd_reset_users(args):
     """Obriši sve korisnike i kreiraj novog admina"""
     logger.warning("User reset initiated")
@@ -577,11 +733,10 @@ def cmd_reset_users(args):
         from datetime import datetime
         import secrets
         import string
-        from ERP_server import create_app
+        from ERP_server import db_context
         from models import db, User
 
-        app = create_app()
-        with app.app_context():
+        with db_context():
             user_count = User.query.count()
             logger.info(f"Deleting {user_count} users from database")
             User.query.delete()
@@ -613,6 +768,56 @@ def cmd_reset_users(args):
         print(f"✗ Greška: {e}")
         sys.exit(1)
 
+def cmd_import_lager(args):
+    """Bulk uvoz artikala i dopuna zaliha iz CSV/JSON fajla"""
+    logger.info(f"Importing inventory from {args.file}")
+    if args.chunk_size < 1:
+        print("GREŠKA: --chunk-size mora biti veći od 0")
+        sys.exit(1)
+    path = Path(args.file)
+    if not path.exists():
+        logger.error(f"Import file not found: {path}")
+        print(f"GREŠKA: Fajl ne postoji: {path}")
+        sys.exit(1)
+
+    try:
+        from ERP_server import db_context
+        from blueprints.lager import parse_import_rows, import_inventory_rows, detect_import_format
+
+        fmt = args.format or detect_import_format(path.name)
+        with db_context():
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                summary, results = import_inventory_rows(parse_import_rows(f, fmt), chunk_size=args.chunk_size)
+
+        for result in results:
+            if not result['ok']:
+                print(f"  ✗ Red {result['row']}: {result['error']}")
+        print(f"✓ Uvoz završen ({fmt}):")
+        print(f"  Novi artikli:  {summary['created']}")
+        print(f"  Dopunjeno:     {summary['restocked']}")
+        print(f"  Greške:        {summary['failed']}")
+        if summary['failed']:
+            sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error importing inventory: {e}", exc_info=True)
+        print(f"✗ Greška: {e}")
+        sys.exit(1)
+
+def cmd_rebuild_rollups(args):
+    """Ponovo izračunaj agregate prodaje iz realizovanih porudžbina"""
+    logger.info("Rebuilding sales rollups")
+    try:
+        from ERP_server import db_context
+        from blueprints.reports import rebuild_sales_rollups
+
+        with db_context():
+            count = rebuild_sales_rollups()
+        print(f"✓ Agregati prodaje ponovo izračunati ({count} realizovanih porudžbina)")
+    except Exception as e:
+        logger.error(f"Error rebuilding sales rollups: {e}", exc_info=True)
+        print(f"✗ Greška: {e}")
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(
         prog='erp',
@@ -627,9 +832,17 @@ def main():
             erp restart         Restartuj servis
             erp logs -f         Prati aplikacijske logove
             erp config --edit   Edituj konfiguraciju
-            erp health          Proveri da li server radi
+            erp health          Proveri da li je server spreman (baza, disk, scheduleri)
+            erp health -v       Sve provere sa merenjima (latencija baze, WAL, pool...)
+            erp bench -c 20     Load test lokalnog servera (20 korisnika, 30s)
+            erp profiles latest Najnoviji profil zahteva (top funkcije)
             erp backup          Ručni backup
             erp update          Ažuriraj iz git-a
+            erp import-lager f.csv  Bulk uvoz/dopuna lagera
+            erp db stats        Veličina tabela/indeksa, fragmentacija i planovi upita
+            erp db migrate      Primeni pending migracije baze
+            erp db maintenance  Checkpoint WAL-a, ANALYZE i incremental vacuum odmah
+            erp rebuild-rollups Ponovo izračunaj agregate prodaje
         """
     )
     
@@ -643,8 +856,32 @@ def main():
     
     # health
     health_parser = subparsers.add_parser('health', help='Proveri health servera')
-    health_parser.add_argument('-v', '--verbose', action='store_true', help='Prikaži response')
-    
+    health_parser.add_argument('-v', '--verbose', action='store_true', help='Prikaži sve provere i merenja')
+    health_parser.add_argument('--live', action='store_true', help='Samo liveness (bez provere baze i diska)')
+
+    # bench
+    bench_parser = subparsers.add_parser('bench', help='Load test lokalnog servera')
+    bench_parser.add_argument('--url', help='Adresa servera (default: http://localhost:PORT, samo lokalno)')
+    bench_parser.add_argument('-u', '--user', default='admin', help='Korisnik za prijavu (default: admin)')
+    bench_parser.add_argument('--password', help='Lozinka (ili ERP_BENCH_PASSWORD, inače se pita)')
+    bench_parser.add_argument('-c', '--concurrency', type=int, default=10, help='Broj istovremenih korisnika')
+    bench_parser.add_argument('-d', '--duration', type=float, default=30, help='Trajanje u sekundama')
+    bench_parser.add_argument('-n', '--requests', type=int, help='Ukupan broj zahteva (umesto trajanja)')
+    bench_parser.add_argument('--mix', help='Težine operacija, npr. dashboard=40,list=35,status=15,image=10')
+    bench_parser.add_argument('--timeout', type=float, default=10, help='Timeout po zahtevu u sekundama')
+    bench_parser.add_argument('--seed', type=int, help='Seed za ponovljiv redosled operacija')
+    bench_parser.add_argument('--json', action='store_true', help='Ispiši izveštaj kao JSON')
+
+    # profiles
+    profiles_parser = subparsers.add_parser('profiles', help='Pregled profila sporih zahteva')
+    profiles_parser.add_argument('name', nargs='?', help="Fajl profila ili 'latest' (default: lista)")
+    profiles_parser.add_argument('-e', '--endpoint', help='Samo ovaj endpoint (spaja sve njegove profile)')
+    profiles_parser.add_argument('-t', '--top', type=int, default=20, help='Broj funkcija u izveštaju')
+    profiles_parser.add_argument('-s', '--sort', choices=['cumulative', 'tottime', 'calls'], default='cumulative',
+                                 help='Sortiranje funkcija')
+    profiles_parser.add_argument('-n', '--limit', type=int, default=30, help='Broj profila u listi')
+    profiles_parser.add_argument('--clear', action='store_true', help='Obriši profile (ili samo za -e endpoint)')
+
     # start
     start_parser = subparsers.add_parser('start', help='Pokreni aplikaciju')
     start_parser.add_argument('-f', '--foreground', action='store_true', 
@@ -684,11 +921,33 @@ def main():
     
     # db
     db_parser = subparsers.add_parser('db', help='Database operacije')
-    db_parser.add_argument('action', choices=['info', 'backup', 'vacuum'], 
-                           help='info/backup/vacuum')
+    db_parser.add_argument('action', choices=['info', 'stats', 'backup', 'vacuum', 'migrate', 'maintenance'], 
+                           help='info/stats/backup/vacuum/migrate/maintenance')
+    db_parser.add_argument('--method', choices=['backup', 'vacuum'], default='backup',
+                           help='backup: online backup API u koracima, vacuum: VACUUM INTO')
+    db_parser.add_argument('--status', action='store_true', help='migrate: samo prikaži pending migracije')
+    db_parser.add_argument('--batch-size', type=int, default=5000,
+                           help='migrate: redova po transakciji pri rebuild-u tabele')
+    db_parser.add_argument('--history', action='store_true',
+                           help='maintenance: samo prikaži poslednja automatska pokretanja')
+    db_parser.add_argument('--json', action='store_true', help='stats: izveštaj kao JSON')
+    db_parser.add_argument('--keep-last', type=int, default=7, help='Zadrži N najnovijih backup-a')
+    db_parser.add_argument('--keep-weekly', type=int, default=4, help='Zadrži po jedan backup za N nedelja')
+    db_parser.add_argument('--keep-monthly', type=int, default=6, help='Zadrži po jedan backup za N meseci')
 
     # reset-users
     subparsers.add_parser('reset-users', help='Obriši sve korisnike i kreiraj admina')
+
+    # import-lager
+    import_parser = subparsers.add_parser('import-lager', help='Bulk uvoz/dopuna lagera iz CSV/JSON fajla')
+    import_parser.add_argument('file', help='Putanja do .csv, .jsonl/.ndjson ili .json fajla')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl', 'json'],
+                               help='Format fajla (default: po ekstenziji)')
+    import_parser.add_argument('--chunk-size', type=int, default=500,
+                               help='Broj redova po transakciji (default: 500)')
+    
+    # rebuild-rollups
+    subparsers.add_parser('rebuild-rollups', help='Ponovo izračunaj agregate prodaje (backfill)')
     
     # enable/disable autostart
     subparsers.add_parser('enable', help='Uključi autostart na boot')
@@ -703,6 +962,8 @@ def main():
         'status': cmd_status,
         'info': cmd_info,
         'health': cmd_health,
+        'bench': cmd_bench,
+        'profiles': cmd_profiles,
         'start': cmd_start,
         'stop': cmd_stop,
         'restart': cmd_restart,
@@ -713,6 +974,8 @@ def main():
         'update': cmd_update,
         'db': cmd_db,
         'reset-users': cmd_reset_users,
+        'import-lager': cmd_import_lager,
+        'rebuild-rollups': cmd_rebuild_rollups,
         'enable': cmd_enable,
         'disable': cmd_disable,
         'uninstall': cmd_uninstall,
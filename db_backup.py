@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+db_backup.py - Online, consistent SQLite backups of the live ERP database.
+
+Uses the SQLite online backup API in small page steps (sleeping between
+steps so the running server keeps getting the write lock), or VACUUM INTO
+for a compacted copy. Every backup is verified with PRAGMA integrity_check
+before it is kept, then old backups are rotated by a retention policy.
+
+Only the standard library is used, so cli.py can run it without the venv.
+
+Run:
+    python db_backup.py [--data-dir DIR] [--method backup|vacuum]
+                        [--keep-last 7] [--keep-weekly 4] [--keep-monthly 6]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = 'erp_backup_'
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_SLEEP = 0.05
+SIDECAR_SUFFIXES = ('-wal', '-shm', '-journal')
+
+
+def _remove_sidecars(path):
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _set_rollback_journal(path):
+    """Switch a copy to journal_mode=DELETE.
+
+    The backup API and VACUUM INTO carry over the source's WAL mode, and
+    every later open of a WAL file leaves -wal/-shm next to it.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    _remove_sidecars(path)
+
+
+def verify_backup(path):
+    """Run PRAGMA integrity_check on a backup file. Returns (ok, message)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+    finally:
+        conn.close()
+    ok = rows == ['ok']
+    return ok, 'ok' if ok else '; '.join(rows[:5])
+
+
+def backup_database(db_file, backup_dir, method='backup', pages=DEFAULT_PAGES_PER_STEP,
+                    sleep=DEFAULT_STEP_SLEEP, verify=True, progress=None):
+    """Create a consistent copy of db_file in backup_dir. Returns the backup path.
+
+    method='backup' copies `pages` pages per step and sleeps `sleep` seconds
+    after each step (and before retrying a busy step); if the source changes mid-copy SQLite restarts the copy,
+    so the result is always a consistent snapshot. method='vacuum' uses
+    VACUUM INTO, which reads in one transaction and writes a defragmented file.
+    The copy is written to a .partial file and only renamed once verified.
+    """
+    if not os.path.exists(db_file):
+        raise FileNotFoundError(f"Database not found: {db_file}")
+    os.makedirs(backup_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+    final_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}.db")
+    partial_path = final_path + '.partial'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    started = time.monotonic()
+    src = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        if method == 'vacuum':
+            logger.info(f"VACUUM INTO {partial_path}")
+            src.execute("VACUUM INTO ?", (partial_path,))
+        elif method == 'backup':
+            logger.info(f"Online backup to {partial_path} ({pages} pages/step, sleep {sleep}s)")
+            dst = sqlite3.connect(partial_path)
+            try:
+                # backup()'s own sleep only applies when a step hits SQLITE_BUSY;
+                # pause after every step here so live writers get the lock in between
+                def _progress(status, remaining, total):
+                    if progress:
+                        progress(total - remaining, total)
+                    if remaining > 0 and sleep > 0:
+                        time.sleep(sleep)
+                src.backup(dst, pages=pages, progress=_progress, sleep=sleep)
+            finally:
+                dst.close()
+        else:
+            raise ValueError(f"Unknown backup method: {method}")
+        _set_rollback_journal(partial_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        _remove_sidecars(partial_path)
+        raise
+    finally:
+        src.close()
+
+    if verify:
+        ok, message = verify_backup(partial_path)
+        if not ok:
+            os.remove(partial_path)
+            _remove_sidecars(partial_path)
+            raise RuntimeError(f"Backup failed integrity check: {message}")
+        logger.info("Backup integrity check passed")
+
+    os.replace(partial_path, final_path)
+    elapsed = time.monotonic() - started
+    size_mb = os.path.getsize(final_path) / (1024 * 1024)
+    logger.info(f"Backup created: {final_path} ({size_mb:.2f} MB in {elapsed:.2f}s)")
+    return final_path
+
+
+def list_backups(backup_dir):
+    """Return [(datetime, path)] of backups in backup_dir, newest first."""
+    backups = []
+    if not os.path.isdir(backup_dir):
+        return backups
+    for name in os.listdir(backup_dir):
+        if not (name.startswith(BACKUP_PREFIX) and name.endswith('.db')):
+            continue
+        try:
+            taken = datetime.strptime(name[len(BACKUP_PREFIX):-3], TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+        backups.append((taken, os.path.join(backup_dir, name)))
+    return sorted(backups, reverse=True)
+
+
+def rotate_backups(backup_dir, keep_last=7, keep_weekly=4, keep_monthly=6):
+    """Delete backups outside the retention policy. Returns removed paths.
+
+    Keeps the newest keep_last backups, plus the newest backup of each of
+    the last keep_weekly ISO weeks and keep_monthly months.
+    """
+    backups = list_backups(backup_dir)
+    keep = {path for _, path in backups[:keep_last]}
+    weeks, months = [], []
+    for taken, path in backups:
+        week = taken.isocalendar()[:2]
+        month = (taken.year, taken.month)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(path)
+        if month not in months and len(months) < keep_monthly:
+            months.append(month)
+            keep.add(path)
+
+    removed = []
+    for _, path in backups:
+        if path not in keep:
+            os.remove(path)
+            _remove_sidecars(path)
+            removed.append(path)
+            logger.info(f"Old backup removed: {path}")
+    remove_stray_sidecars(backup_dir)
+    return removed
+
+
+def remove_stray_sidecars(backup_dir):
+    """Delete -wal/-shm/-journal files whose backup (or .partial) no longer exists.
+
+    Older versions left these behind after every online backup.
+    """
+    removed = []
+    if not os.path.isdir(backup_dir):
+        return removed
+    for name in os.listdir(backup_dir):
+        if not name.startswith(BACKUP_PREFIX):
+            continue
+        suffix = next((s for s in SIDECAR_SUFFIXES if name.endswith(s)), None)
+        if suffix is None or os.path.exists(os.path.join(backup_dir, name[:-len(suffix)])):
+            continue
+        os.remove(os.path.join(backup_dir, name))
+        removed.append(name)
+        logger.info(f"Stray backup sidecar removed: {name}")
+    return removed
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] - [%(name)s] - %(message)s'
+    )
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Online SQLite backup of the ERP database')
+    parser.add_argument('--data-dir', default=os.path.join(base_dir, 'data'), help='DATA_DIR sa erp.db')
+    parser.add_argument('--method', choices=['backup', 'vacuum'], default='backup',
+                        help='backup = online backup API u koracima, vacuum = VACUUM INTO')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_STEP, help='Stranica po koraku')
+    parser.add_argument('--sleep', type=float, default=DEFAULT_STEP_SLEEP, help='Pauza posle svakog koraka i pre ponavljanja zauzetog (s)')
+    parser.add_argument('--keep-last', type=int, default=7, help='Broj najnovijih backup-a')
+    parser.add_argument('--keep-weekly', type=int, default=4, help='Broj nedeljnih backup-a')
+    parser.add_argument('--keep-monthly', type=int, default=6, help='Broj mesečnih backup-a')
+    args = parser.parse_args(argv)
+
+    db_file = os.path.join(args.data_dir, 'erp.db')
+    backup_dir = os.path.join(args.data_dir, 'backups')
+    try:
+        path = backup_database(db_file, backup_dir, method=args.method, pages=args.pages, sleep=args.sleep)
+        removed = rotate_backups(backup_dir, args.keep_last, args.keep_weekly, args.keep_monthly)
+    except Exception as e:
+        logger.error(f"Backup failed: {e}", exc_info=True)
+        print(f"✗ Backup nije uspeo: {e}")
+        return 1
+    print(f"✓ Backup kreiran: {path}")
+    if removed:
+        print(f"  Obrisano starih backup-a: {len(removed)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+db_stats.py - Size, page-level and query-plan report for the ERP database.
+
+Collects, without writing to the database:
+  - rows per table and pages/bytes per table and index (dbstat)
+  - fill: share of each b-tree's page bytes holding data
+  - fragmentation: share of leaf pages not directly following the
+    previous leaf of the same b-tree (what VACUUM would fix)
+  - page size, freelist, auto_vacuum mode and WAL size
+  - EXPLAIN QUERY PLAN of the app's hot queries, flagging full scans
+
+Used by `erp db stats`.
+
+Run:
+    python db_stats.py [--data-dir DIR] [--json]
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+# Ensure blueprints import from the project root when run as a script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from blueprints.reports import ORDER_DAY_SQL
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# The queries behind the busiest endpoints and jobs, with sample parameters.
+# Keep them in step with the code they mirror.
+HOT_QUERIES = (
+    ('orders by status (list pages)',
+     "SELECT * FROM orders WHERE status = :status", {'status': 'new'}),
+    ('order lines of a status list (orders_with_items)',
+     "SELECT order_items.* FROM order_items JOIN orders ON orders.id = order_items.order_id "
+     "WHERE orders.status = :status ORDER BY order_items.order_id, order_items.id", {'status': 'new'}),
+    ('order by id',
+     "SELECT * FROM orders WHERE id = :id", {'id': 1}),
+    ('notification key lookup (check_and_notify)',
+     "SELECT 1 FROM notification_log WHERE notify_key = :key", {'key': '1_01.01.2026'}),
+    ('notification backlog (health)',
+     "SELECT COUNT(*) FROM orders o WHERE o.status IN ('new', 'for_delivery') AND o.date IN (:d0, :d1) "
+     "AND NOT EXISTS (SELECT 1 FROM notification_log n WHERE n.notify_key = o.id || '_' || o.date)",
+     {'d0': '01.01.2026', 'd1': '02.01.2026'}),
+    ('report buckets (bucketed_totals)',
+     f"SELECT {ORDER_DAY_SQL} AS day, COUNT(*), SUM(COALESCE(quantity, 0)), SUM(COALESCE(price_minor, 0)) "
+     f"FROM orders WHERE status = :status AND {ORDER_DAY_SQL} BETWEEN :start AND :end GROUP BY day",
+     {'status': 'realized', 'start': '2026-01-01', 'end': '2026-12-31'}),
+    ('customer autocomplete',
+     "SELECT c.id, c.name, (SELECT COUNT(*) FROM orders o WHERE o.customer_id = c.id) AS n "
+     "FROM customers c WHERE c.key >= :lo AND c.key < :hi ORDER BY n DESC LIMIT 10",
+     {'lo': 'pet', 'hi': 'pet\U0010ffff'}),
+    ('customer order history',
+     "SELECT * FROM orders WHERE customer_id = :id ORDER BY id DESC LIMIT 100", {'id': 1}),
+    ('sales rollups',
+     "SELECT * FROM sales_rollups WHERE dimension = :dimension", {'dimension': 'month'}),
+    ('stock movements of an item',
+     "SELECT * FROM stock_movements WHERE lager_id = :id ORDER BY id DESC LIMIT 50", {'id': 1}),
+    ('stock as of a date',
+     "SELECT * FROM stock_snapshots WHERE lager_id = :id AND taken_at <= :at "
+     "ORDER BY taken_at DESC, id DESC LIMIT 1", {'id': 1, 'at': '2026-01-01T00:00:00'}),
+    ('order search (FTS)',
+     "SELECT orders_fts.rowid, bm25(orders_fts) AS score FROM orders_fts "
+     "WHERE orders_fts MATCH :match ORDER BY score LIMIT 20", {'match': '"buket"*'}),
+    ('filtered order search (FTS)',
+     "SELECT orders_fts.rowid, bm25(orders_fts) AS score FROM orders_fts "
+     "CROSS JOIN orders t ON t.id = orders_fts.rowid WHERE orders_fts MATCH :match "
+     "AND t.status = :status ORDER BY score LIMIT 20", {'match': '"buket"*', 'status': 'new'}),
+)
+
+
+def _full_scan(detail):
+    """True for a plan step that reads a whole table or index."""
+    return (detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail
+            and 'CONSTANT ROW' not in detail)
+
+
+def btree_stats(conn):
+    """Per b-tree pages, bytes, fill and fragmentation from dbstat; None without dbstat."""
+    try:
+        rows = conn.execute("SELECT name, pageno, pagetype, pgsize, unused FROM dbstat").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    owners = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    trees = {}
+    for name, pageno, pagetype, pgsize, unused in rows:
+        tree = trees.get(name)
+        if tree is None:
+            tree = trees[name] = {'name': name, 'table': owners.get(name, name), 'pages': 0, 'bytes': 0,
+                                  'unused': 0, 'leaves': 0, 'out_of_order': 0, 'last_leaf': None}
+        if pagetype == 'leaf':
+            # dbstat walks each b-tree in key order, so a gap means a leaf out of place
+            if tree['last_leaf'] is not None and pageno != tree['last_leaf'] + 1:
+                tree['out_of_order'] += 1
+            tree['last_leaf'] = pageno
+            tree['leaves'] += 1
+        tree['pages'] += 1
+        tree['bytes'] += pgsize
+        tree['unused'] += unused
+    result = []
+    for tree in trees.values():
+        result.append({
+            'name': tree['name'],
+            'table': tree['table'],
+            'kind': 'table' if tree['name'] == tree['table'] else 'index',
+            'pages': tree['pages'],
+            'bytes': tree['bytes'],
+            'fill_pct': round((1 - tree['unused'] / tree['bytes']) * 100, 1) if tree['bytes'] else 0.0,
+            'fragmentation_pct': round(tree['out_of_order'] / max(tree['leaves'] - 1, 1) * 100, 1),
+        })
+    result.sort(key=lambda t: t['bytes'], reverse=True)
+    return result
+
+
+def query_plans(conn):
+    plans = []
+    for label, sql, params in HOT_QUERIES:
+        try:
+            steps = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.OperationalError as e:
+            plans.append({'query': label, 'error': str(e), 'plan': [], 'full_scan': False})
+            continue
+        plans.append({'query': label, 'plan': steps, 'full_scan': any(_full_scan(s) for s in steps)})
+    return plans
+
+
+def collect_stats(db_file):
+    """Everything `erp db stats` shows, as a dict."""
+    if not os.path.exists(db_file):
+        raise FileNotFoundError(f"Database not found: {db_file}")
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%' "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        rows = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables}
+        btrees = btree_stats(conn)
+        plans = query_plans(conn)
+    finally:
+        conn.close()
+
+    wal_file = f'{db_file}-wal'
+    return {
+        'file': db_file,
+        'file_bytes': os.path.getsize(db_file),
+        'wal_bytes': os.path.getsize(wal_file) if os.path.exists(wal_file) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_pages': freelist,
+        'freelist_pct': round(freelist / page_count * 100, 1) if page_count else 0.0,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, auto_vacuum),
+        'rows': rows,
+        'btrees': btrees,
+        'plans': plans,
+    }
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:.2f} MB"
+
+
+def format_stats(stats):
+    """Human-readable report for the CLI."""
+    lines = [
+        f"Database:     {stats['file']}",
+        f"Veličina:     {_mb(stats['file_bytes'])} ({stats['page_count']} stranica x {stats['page_size']} B)",
+        f"WAL:          {_mb(stats['wal_bytes'])}",
+        f"Slobodno:     {stats['freelist_pages']} stranica ({stats['freelist_pct']}%, "
+        f"{_mb(stats['freelist_pages'] * stats['page_size'])}), auto_vacuum={stats['auto_vacuum']}",
+        '',
+        f"{'tabela':28} {'redova':>10}",
+    ]
+    for name, count in sorted(stats['rows'].items(), key=lambda item: -item[1]):
+        lines.append(f"{name:28} {count:>10}")
+
+    lines.append('')
+    if stats['btrees'] is None:
+        lines.append("dbstat nije dostupan u ovom SQLite build-u (bez analize stranica)")
+    else:
+        lines.append(f"{'tabela/indeks':40} {'vrsta':6} {'stranica':>9} {'veličina':>11} {'popunj.':>8} {'fragm.':>7}")
+        for tree in stats['btrees']:
+            name = tree['name'] if tree['kind'] == 'table' else f"  {tree['name']}"
+            lines.append(f"{name[:40]:40} {tree['kind']:6} {tree['pages']:>9} {_mb(tree['bytes']):>11} "
+                         f"{tree['fill_pct']:>7}% {tree['fragmentation_pct']:>6}%")
+
+    lines += ['', 'Planovi glavnih upita (⚠ = čitanje cele tabele/indeksa):']
+    for plan in stats['plans']:
+        lines.append(f"  {'⚠' if plan['full_scan'] else '✓'} {plan['query']}")
+        if plan.get('error'):
+            lines.append(f"      greška: {plan['error']}")
+        for step in plan['plan']:
+            lines.append(f"      {step}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ERP database size and query plan report')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+                        help='Folder sa erp.db')
+    parser.add_argument('--json', action='store_true', help='Izveštaj kao JSON')
+    args = parser.parse_args(argv)
+    try:
+        stats = collect_stats(os.path.join(args.data_dir, 'erp.db'))
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"✗ {e}")
+        return 1
+    print(json.dumps(stats, indent=2, ensure_ascii=False) if args.json else format_stats(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+health.py - Liveness and readiness probes.
+
+    /health/live   the process answers requests; touches nothing else
+    /health/ready  timed round-trip on both SQLite engines, WAL size, free
+                   disk space for DATA_DIR and IMAGES_DIR, background
+                   scheduler heartbeats, the e-mail notification backlog
+                   and connection pool usage
+    /health        same as /health/ready (kept for existing monitors)
+
+Every readiness check reports ok, warn or fail; any fail turns the
+response into a 503. Thresholds are app.config values that .erp.conf
+can override (see ERP_server.main). Schedulers call heartbeat() after
+each cycle so a thread that died or hangs shows up as a stale beat.
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import jsonify, current_app
+from sqlalchemy import text
+from models import db, READONLY_BIND
+from migrations import LATEST_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Defaults for app.config
+HEALTH_DB_WARN_MS = 100
+HEALTH_WAL_WARN_MB = 64
+HEALTH_DISK_WARN_MB = 1024
+HEALTH_DISK_FAIL_MB = 100
+POOL_WARN_RATIO = 0.8
+STATUS_RANK = {'ok': 0, 'warn': 1, 'fail': 2}
+
+_heartbeats = {}    # scheduler name -> {'interval', 'last_beat', 'last_error', 'cycles'}
+_heartbeats_lock = threading.Lock()
+
+
+def heartbeat(name, interval, error=None):
+    """Record a finished scheduler cycle; the next one is due `interval` seconds later."""
+    with _heartbeats_lock:
+        beat = _heartbeats.setdefault(name, {'cycles': 0})
+        beat.update(interval=interval, last_beat=time.time(),
+                    last_error=str(error) if error else None)
+        beat['cycles'] += 1
+
+
+# ─── Checks ────────────────────────────────────────────────────
+
+def _worst(statuses):
+    return max(statuses, key=STATUS_RANK.get, default='ok')
+
+
+def check_database():
+    """Timed round-trip on the read-write and read-only engines."""
+    warn_ms = current_app.config['HEALTH_DB_WARN_MS']
+    engines = {}
+    for name, bind in (('primary', None), ('readonly', READONLY_BIND)):
+        started = time.perf_counter()
+        try:
+            with db.engines[bind].connect() as conn:
+                version = conn.execute(text("PRAGMA user_version")).scalar()
+                conn.execute(text("SELECT COUNT(*) FROM sqlite_master")).scalar()
+        except Exception as e:
+            logger.error(f"Health check: {name} database unreachable: {e}")
+            engines[name] = {'status': 'fail', 'error': str(e)}
+            continue
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        engines[name] = {'status': 'warn' if latency_ms > warn_ms else 'ok', 'latency_ms': latency_ms}
+        engines[name]['schema_version'] = version
+        if version != LATEST_VERSION:
+            engines[name]['status'] = 'warn'
+    return {'status': _worst(e['status'] for e in engines.values()), **engines}
+
+
+def check_wal():
+    """Size of the write-ahead log; a large one means checkpoints are starved."""
+    wal_file = f'{db.engines[None].url.database}-wal'
+    size_mb = round(os.path.getsize(wal_file) / 1024 / 1024, 2) if os.path.exists(wal_file) else 0.0
+    limit = current_app.config['HEALTH_WAL_WARN_MB']
+    return {'status': 'warn' if size_mb > limit else 'ok', 'size_mb': size_mb, 'warn_mb': limit}
+
+
+def check_disk():
+    """Free space on the volumes holding DATA_DIR and IMAGES_DIR."""
+    config = current_app.config
+    volumes = {}
+    for name in ('DATA_DIR', 'IMAGES_DIR'):
+        try:
+            usage = shutil.disk_usage(config[name])
+        except OSError as e:
+            volumes[name] = {'status': 'fail', 'path': config[name], 'error': str(e)}
+            continue
+        free_mb = usage.free // (1024 * 1024)
+        if free_mb < config['HEALTH_DISK_FAIL_MB']:
+            status = 'fail'
+        elif free_mb < config['HEALTH_DISK_WARN_MB']:
+            status = 'warn'
+        else:
+            status = 'ok'
+        volumes[name] = {'status': status, 'path': config[name], 'free_mb': free_mb,
+                         'free_pct': round(usage.free / usage.total * 100, 1)}
+    return {'status': _worst(v['status'] for v in volumes.values()), **volumes}
+
+
+def check_schedulers():
+    """Heartbeat age per scheduler; stale after two missed intervals."""
+    now = time.time()
+    with _heartbeats_lock:
+        beats = {name: dict(beat) for name, beat in _heartbeats.items()}
+    if not beats:
+        # Schedulers only run under ERP_server.main (not in scripts or tests)
+        return {'status': 'warn', 'error': 'no scheduler has reported yet'}
+    schedulers = {}
+    for name, beat in beats.items():
+        age = round(now - beat['last_beat'], 1)
+        status = 'warn' if age > 2 * beat['interval'] or beat['last_error'] else 'ok'
+        schedulers[name] = {'status': status, 'age_s': age, 'interval_s': beat['interval'],
+                            'cycles': beat['cycles'], 'last_error': beat['last_error']}
+    return {'status': _worst(s['status'] for s in schedulers.values()), **schedulers}
+
+
+def check_notification_backlog():
+    """Open orders inside the notification window that no e-mail has covered yet."""
+    from blueprints.email_notify import get_email_config
+
+    config = get_email_config()
+    if not config.enabled:
+        return {'status': 'ok', 'enabled': False}
+    today = datetime.now().date()
+    # Dates are stored as dd.mm.YYYY text, so match the window day by day
+    window = [(today + timedelta(days=d)).strftime('%d.%m.%Y') for d in range(config.days_before + 1)]
+    params = {f'd{i}': day for i, day in enumerate(window)}
+    pending, due_today = db.session.execute(text(
+        "SELECT COUNT(*), COALESCE(SUM(o.date = :d0), 0) FROM orders o "
+        "WHERE o.status IN ('new', 'for_delivery') "
+        f"AND o.date IN ({', '.join(':' + key for key in params)}) "
+        "AND NOT EXISTS (SELECT 1 FROM notification_log n WHERE n.notify_key = o.id || '_' || o.date)"
+    ), params).one()
+    # Orders due today should have been mailed by an earlier cycle
+    return {'status': 'warn' if due_today else 'ok', 'enabled': True,
+            'pending': pending, 'due_today': due_today, 'days_before': config.days_before}
+
+
+def check_pool():
+    """Checked-out connections against the pool capacity of each engine."""
+    pools, statuses = {}, []
+    for name, bind in (('primary', None), ('readonly', READONLY_BIND)):
+        pool = db.engines[bind].pool
+        if not hasattr(pool, 'checkedout'):
+            pools[name] = {'status': 'ok', 'pool': type(pool).__name__}
+            continue
+        capacity = pool.size() + max(getattr(pool, '_max_overflow', 0), 0)
+        checked_out = pool.checkedout()
+        ratio = checked_out / capacity if capacity else 0.0
+        pools[name] = {'status': 'warn' if ratio >= POOL_WARN_RATIO else 'ok', 'pool': type(pool).__name__,
+                       'checked_out': checked_out, 'capacity': capacity, 'saturation': round(ratio, 2)}
+        statuses.append(pools[name]['status'])
+    return {'status': _worst(statuses), **pools}
+
+
+# Pool first, so the probe's own connection is not counted
+CHECKS = (
+    ('pool', check_pool),
+    ('database', check_database),
+    ('wal', check_wal),
+    ('disk', check_disk),
+    ('schedulers', check_schedulers),
+    ('notifications', check_notification_backlog),
+)
+
+
+def readiness():
+    """Run every check. Returns (report dict, HTTP status)."""
+    started = time.perf_counter()
+    checks = {}
+    for name, check in CHECKS:
+        try:
+            checks[name] = check()
+        except Exception as e:
+            logger.error(f"Health check '{name}' raised: {e}", exc_info=True)
+            checks[name] = {'status': 'fail', 'error': str(e)}
+    db.session.rollback()
+    worst = _worst(c['status'] for c in checks.values())
+    report = {
+        'status': {'ok': 'ready', 'warn': 'degraded', 'fail': 'not_ready'}[worst],
+        'version': current_app.config.get('VERSION', 'unknown'),
+        'uptime_s': round(time.time() - current_app.extensions['health']['started'], 1),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        'checks': checks,
+    }
+    if worst == 'fail':
+        failed = [name for name, c in checks.items() if c['status'] == 'fail']
+        logger.warning(f"Readiness check failed: {', '.join(failed)}")
+    return report, 503 if worst == 'fail' else 200
+
+
+# ─── Flask Integration ─────────────────────────────────────────
+
+def init_health(app):
+    """Register /health, /health/live and /health/ready on app."""
+    for key in ('HEALTH_DB_WARN_MS', 'HEALTH_WAL_WARN_MB', 'HEALTH_DISK_WARN_MB', 'HEALTH_DISK_FAIL_MB'):
+        app.config.setdefault(key, globals()[key])
+    app.extensions['health'] = {'started': time.time()}
+
+    @app.route('/health/live')
+    def health_live():
+        return jsonify({
+            'status': 'alive',
+            'pid': os.getpid(),
+            'threads': threading.active_count(),
+            'uptime_s': round(time.time() - app.extensions['health']['started'], 1),
+        })
+
+    @app.route('/health')
+    @app.route('/health/ready')
+    def health_ready():
+        report, code = readiness()
+        return jsonify(report), code
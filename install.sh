@@ -332,6 +332,15 @@ PORT=$PORT
 HOST=0.0.0.0
 PUBLIC_URL=$PUBLIC_URL
 DEBUG=false
+# SQL upiti sporiji od ovoga (ms) se loguju sa EXPLAIN QUERY PLAN
+SLOW_QUERY_MS=200
+# Udeo zahteva koji se profiliše (0-1), npr. 0.01; pregled: erp profiles
+PROFILE_SAMPLE_RATE=0
+# Pragovi za /health/ready: upozorenje/greška kad je slobodno manje MB na disku
+HEALTH_DISK_WARN_MB=1024
+HEALTH_DISK_FAIL_MB=100
+# Održavanje baze: checkpoint kad WAL pređe N MB; pregled: erp db maintenance --history
+WAL_CHECKPOINT_MB=16
 
 # Sistem
 VERSION=$DEFAULT_VERSION
@@ -0,0 +1,332 @@
+"""
+loadtest.py - Concurrent HTTP load generator behind `erp bench`.
+
+Each worker thread logs in with its own session cookie and replays a
+weighted mix of operations until the duration or request budget runs out:
+
+    dashboard  the three list fetches the dashboard page polls every 30s
+    list       one list fetch (orders, inventory or a status list)
+    status     flips a 'new' order to 'for_delivery' and back (restored at the end)
+    image      fetches an uploaded image referenced by an order or lager item
+
+Only loopback targets are accepted, so it cannot be pointed at someone
+else's server. Stdlib only; runs from the CLI without the app imported.
+"""
+
+import json
+import time
+import random
+import socket
+import logging
+import threading
+import ipaddress
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = {'dashboard': 40, 'list': 35, 'status': 15, 'image': 10}
+DASHBOARD_PATHS = ('/api/orders/new', '/api/orders/for_delivery', '/api/orders/realized')
+LIST_PATHS = ('/api/orders', '/api/inventory', '/api/orders/new', '/api/orders/for_delivery',
+              '/api/orders/realized')
+STATUS_POOL = 20
+
+
+def parse_mix(text):
+    """'dashboard=50,list=30' -> {'dashboard': 50, 'list': 30}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Nepoznata operacija '{name}' (dozvoljeno: {', '.join(DEFAULT_MIX)})")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise ValueError(f"Težina za '{name}' mora biti ceo broj")
+        if mix[name] < 0:
+            raise ValueError(f"Težina za '{name}' ne može biti negativna")
+    if not any(mix.values()):
+        raise ValueError("Mix mora imati bar jednu operaciju sa težinom > 0")
+    return mix
+
+
+def ensure_local(base_url):
+    """Raise ValueError unless base_url points at this machine."""
+    parsed = urllib.parse.urlparse(base_url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError(f"Neispravan URL: {base_url}")
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or 80)
+    except socket.gaierror as e:
+        raise ValueError(f"Host {parsed.hostname} se ne može razrešiti: {e}")
+    for info in infos:
+        address = info[4][0].split('%')[0]
+        if not ipaddress.ip_address(address).is_loopback:
+            raise ValueError(f"Load test je dozvoljen samo na lokalnom serveru ({parsed.hostname} -> {address})")
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Session:
+    """urllib opener with its own cookie jar (one logged-in user)."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None, form=None):
+        """Returns (status, body bytes); HTTP errors are returned, not raised."""
+        data, headers = None, {}
+        if body is not None:
+            data, headers = json.dumps(body).encode(), {'Content-Type': 'application/json'}
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, username, password):
+        status, _ = self.request('POST', '/login', form={'username': username, 'password': password})
+        # A successful login redirects to the dashboard; a failed one re-renders the form
+        status, body = self.request('GET', '/api/user/profile')
+        if status != 200 or not body.lstrip().startswith(b'{'):
+            raise RuntimeError(f"Prijava kao '{username}' nije uspela")
+
+
+class LoadTest:
+    """Runs the workers and collects per-operation latencies and errors."""
+
+    def __init__(self, base_url, username, password, mix=None, concurrency=10,
+                 duration=30.0, max_requests=None, timeout=10.0, seed=None):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.latencies = {}         # operation -> [seconds, ...]
+        self.errors = {}            # operation -> {reason: count}
+        self.issued = 0
+        self.status_orders = []     # [order id, ...] flipped by 'status'
+        self.original_status = {}   # order id -> status before the run
+        self.flipped = {}           # order id -> times flipped
+        self.images = []
+        self.started = None
+        self.deadline = float('inf')
+        self.login_errors = []
+
+    # ─── Setup ─────────────────────────────────────────────────
+
+    def prepare(self, session):
+        """Pick orders for status flips and image names from the live data."""
+        if self.mix.get('status'):
+            status, body = session.request('GET', '/api/orders/new')
+            orders = json.loads(body) if status == 200 else []
+            self.status_orders = [o['id'] for o in orders[:STATUS_POOL]]
+            self.original_status = {o['id']: o['status'] for o in orders[:STATUS_POOL]}
+            if not self.status_orders:
+                logger.warning("No 'new' orders to flip, status updates disabled")
+                self.mix['status'] = 0
+        if self.mix.get('image'):
+            names = set()
+            for path in ('/api/inventory', '/api/orders/new'):
+                status, body = session.request('GET', path)
+                if status == 200:
+                    names.update(r.get('image') for r in json.loads(body) if r.get('image'))
+            self.images = sorted(names)[:200]
+            if not self.images:
+                logger.warning("No uploaded images found, image fetches disabled")
+                self.mix['image'] = 0
+        if not any(self.mix.values()):
+            raise RuntimeError("Nijedna operacija iz mix-a nije moguća na ovim podacima")
+
+    # ─── Operations ────────────────────────────────────────────
+
+    def _op_dashboard(self, session, rng):
+        for path in DASHBOARD_PATHS:
+            status, _ = session.request('GET', path)
+            if status != 200:
+                return status
+        return 200
+
+    def _op_list(self, session, rng):
+        return session.request('GET', rng.choice(LIST_PATHS))[0]
+
+    def _op_status(self, session, rng):
+        order_id = rng.choice(self.status_orders)
+        with self.lock:
+            flips = self.flipped.get(order_id, 0)
+            self.flipped[order_id] = flips + 1
+        new_status = 'for_delivery' if flips % 2 == 0 else 'new'
+        return session.request('POST', '/api/update_status', body={'id': order_id, 'status': new_status})[0]
+
+    def _op_image(self, session, rng):
+        name = urllib.parse.quote(rng.choice(self.images))
+        return session.request('GET', f'/images/{name}')[0]
+
+    # ─── Run ───────────────────────────────────────────────────
+
+    def _take_ticket(self):
+        with self.lock:
+            if self.max_requests is not None and self.issued >= self.max_requests:
+                return False
+            self.issued += 1
+            return True
+
+    def _record(self, operation, elapsed, error=None):
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(elapsed)
+            if error:
+                reasons = self.errors.setdefault(operation, {})
+                reasons[error] = reasons.get(error, 0) + 1
+
+    def _worker(self, index, ready):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        operations = [name for name, weight in self.mix.items() if weight]
+        weights = [self.mix[name] for name in operations]
+        session = Session(self.base_url, self.timeout)
+        try:
+            session.login(self.username, self.password)
+        except Exception as e:
+            with self.lock:
+                self.login_errors.append(str(e))
+            session = None
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return      # run() aborted before the clock started
+        if session is None:
+            return
+        while time.monotonic() < self.deadline and self._take_ticket():
+            operation = rng.choices(operations, weights)[0]
+            started = time.perf_counter()
+            error = None
+            try:
+                status = getattr(self, f'_op_{operation}')(session, rng)
+                if status >= 400:
+                    error = f'HTTP {status}'
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                error = type(e).__name__ if not str(e) else str(getattr(e, 'reason', e))
+            self._record(operation, time.perf_counter() - started, error)
+
+    def restore(self, session):
+        """Put flipped orders back to their original status (concurrent flips may arrive out of order).
+
+        Only orders still in 'for_delivery', the status the bench sets, are
+        touched; anything a real user moved meanwhile is left alone.
+        """
+        for order_id in self.flipped:
+            try:
+                status, body = session.request('GET', f'/api/order/{order_id}')
+                if status != 200 or json.loads(body).get('status') != 'for_delivery':
+                    continue
+                session.request('POST', '/api/update_status',
+                                body={'id': order_id, 'status': self.original_status.get(order_id, 'new')})
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                logger.warning(f"Could not restore order {order_id}: {e}")
+
+    def _start_clock(self):
+        self.started = time.monotonic()
+        if self.duration:
+            self.deadline = self.started + self.duration
+
+    def run(self):
+        ensure_local(self.base_url)
+        admin = Session(self.base_url, self.timeout)
+        admin.login(self.username, self.password)
+        self.prepare(admin)
+
+        # Workers log in first; the clock starts once all of them are ready
+        ready = threading.Barrier(self.concurrency + 1, action=self._start_clock)
+        threads = [threading.Thread(target=self._worker, args=(i, ready), daemon=True)
+                   for i in range(self.concurrency)]
+        try:
+            for thread in threads:
+                thread.start()
+            ready.wait()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - self.started
+        finally:
+            # Also on Ctrl+C or a worker crash: stop issuing flips, then undo them
+            self.deadline = float('-inf')
+            ready.abort()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join(self.timeout)
+            self.restore(admin)
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        operations = {}
+        all_latencies, total_errors = [], 0
+        for operation, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            errors = sum(self.errors.get(operation, {}).values())
+            total_errors += errors
+            all_latencies += ordered
+            operations[operation] = {
+                'requests': len(ordered),
+                'errors': errors,
+                'error_rate': round(errors / len(ordered), 4) if ordered else 0.0,
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+                'error_reasons': self.errors.get(operation, {}),
+            }
+        all_latencies.sort()
+        total = len(all_latencies)
+        return {
+            'url': self.base_url,
+            'concurrency': self.concurrency,
+            'mix': self.mix,
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'errors': total_errors,
+            'error_rate': round(total_errors / total, 4) if total else 0.0,
+            'login_errors': len(self.login_errors),
+            'p50_ms': round(percentile(all_latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(all_latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 2),
+            'operations': operations,
+        }
+
+
+def format_report(report):
+    """Human-readable summary for the CLI."""
+    lines = [
+        f"URL:          {report['url']}",
+        f"Konkurentno:  {report['concurrency']} korisnika, {report['elapsed_s']}s",
+        f"Zahteva:      {report['requests']} ({report['throughput_rps']} req/s)",
+        f"Greške:       {report['errors']} ({report['error_rate']:.2%})"
+        + (f", neuspelih prijava: {report['login_errors']}" if report['login_errors'] else ''),
+        f"Latencija:    p50 {report['p50_ms']}ms  p95 {report['p95_ms']}ms  p99 {report['p99_ms']}ms",
+        '',
+        f"{'operacija':12} {'zahteva':>8} {'greške':>8} {'p50':>9} {'p95':>9} {'p99':>9}",
+    ]
+    for name, stats in report['operations'].items():
+        lines.append(f"{name:12} {stats['requests']:>8} {stats['errors']:>8} {stats['p50_ms']:>7.1f}ms "
+                     f"{stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+        for reason, count in stats['error_reasons'].items():
+            lines.append(f"  ✗ {reason}: {count}")
+    return '\n'.join(lines)
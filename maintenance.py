@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+maintenance.py - Background SQLite upkeep for the live ERP database.
+
+Every MAINTENANCE_INTERVAL seconds the scheduler thread runs:
+
+    checkpoint   PRAGMA wal_checkpoint(PASSIVE) once the WAL file is larger
+                 than WAL_CHECKPOINT_MB; when the server is idle and every
+                 frame was copied, TRUNCATE resets the file to zero bytes
+    analyze      ANALYZE (bounded by PRAGMA analysis_limit) and PRAGMA
+                 optimize once per ANALYZE_INTERVAL, only while idle
+    vacuum       PRAGMA incremental_vacuum in VACUUM_STEP_PAGES steps while
+                 idle, for at most VACUUM_BUDGET seconds per run
+
+"Idle" means no request finished in the last IDLE_SECONDS (from the
+metrics store). Every step is its own short transaction on a dedicated
+connection with a small busy timeout, so the server's writers only ever
+wait for one step. incremental_vacuum needs auto_vacuum=INCREMENTAL: new
+databases get it from the connection setup, existing ones after one
+`erp db vacuum`.
+
+Timings, WAL sizes and freed pages of the recent runs are kept in
+DATA_DIR/maintenance.json. Only the standard library is used, so
+`erp db maintenance` can run a forced pass without the app.
+
+Run:
+    python maintenance.py [--data-dir DIR] [--history]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Defaults for app.config; .erp.conf can override them (see ERP_server.main)
+MAINTENANCE_INTERVAL = 60
+WAL_CHECKPOINT_MB = 16
+ANALYZE_INTERVAL = 3600 * 24
+ANALYSIS_LIMIT = 1000
+VACUUM_STEP_PAGES = 256
+VACUUM_BUDGET = 1.0
+IDLE_SECONDS = 30
+BUSY_TIMEOUT = 0.2
+HISTORY_KEEP = 100
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+class Maintenance:
+    """One database's upkeep tasks plus the run history in maintenance.json."""
+
+    def __init__(self, db_file, state_file, wal_checkpoint_mb=WAL_CHECKPOINT_MB,
+                 analyze_interval=ANALYZE_INTERVAL, analysis_limit=ANALYSIS_LIMIT,
+                 vacuum_step_pages=VACUUM_STEP_PAGES, vacuum_budget=VACUUM_BUDGET,
+                 idle_seconds=IDLE_SECONDS):
+        self.db_file = db_file
+        self.state_file = state_file
+        self.wal_checkpoint_mb = wal_checkpoint_mb
+        self.analyze_interval = analyze_interval
+        self.analysis_limit = analysis_limit
+        self.vacuum_step_pages = vacuum_step_pages
+        self.vacuum_budget = vacuum_budget
+        self.idle_seconds = idle_seconds
+        self.state = self._load_state()
+        self.warned_auto_vacuum = False
+
+    # ─── State ─────────────────────────────────────────────────
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return {'last_analyze': 0.0, 'history': [], **json.load(f)}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read maintenance state {self.state_file}: {e}")
+        return {'last_analyze': 0.0, 'history': []}
+
+    def _save_state(self):
+        self.state['history'] = self.state['history'][-HISTORY_KEEP:]
+        tmp = f'{self.state_file}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            logger.warning(f"Could not write maintenance state {self.state_file}: {e}")
+
+    def _record(self, task, started, **details):
+        result = {'task': task, 'at': datetime.now().isoformat(timespec='seconds'),
+                  'ms': round((time.perf_counter() - started) * 1000, 2), **details}
+        self.state['history'].append(result)
+        return result
+
+    # ─── Tasks ─────────────────────────────────────────────────
+
+    def wal_size_mb(self):
+        wal_file = f'{self.db_file}-wal'
+        return round(os.path.getsize(wal_file) / 1024 / 1024, 2) if os.path.exists(wal_file) else 0.0
+
+    def checkpoint(self, conn, idle, force=False):
+        size_before = self.wal_size_mb()
+        if size_before <= self.wal_checkpoint_mb and not force:
+            return None
+        started = time.perf_counter()
+        busy, frames, copied = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        mode = 'passive'
+        if idle and not busy and frames == copied:
+            # Everything is in the main file; shrink the WAL back to zero
+            busy, frames, copied = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            mode = 'truncate'
+        result = self._record('checkpoint', started, mode=mode, busy=bool(busy), frames=frames,
+                              checkpointed=copied, wal_mb_before=size_before, wal_mb_after=self.wal_size_mb())
+        level = logging.INFO if copied or mode == 'truncate' else logging.DEBUG
+        logger.log(level, f"WAL checkpoint ({mode}): {copied}/{frames} frames, "
+                          f"{size_before} MB -> {result['wal_mb_after']} MB in {result['ms']} ms")
+        return result
+
+    def analyze(self, conn, idle, force=False):
+        due = time.time() - self.state['last_analyze'] >= self.analyze_interval
+        if not force and not (idle and due):
+            return None
+        started = time.perf_counter()
+        conn.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)}")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        tables = conn.execute("SELECT COUNT(DISTINCT tbl) FROM sqlite_stat1").fetchone()[0]
+        self.state['last_analyze'] = time.time()
+        result = self._record('analyze', started, tables=tables, analysis_limit=self.analysis_limit)
+        logger.info(f"ANALYZE + optimize: {tables} table(s) in {result['ms']} ms")
+        return result
+
+    def vacuum(self, conn, idle, force=False, still_idle=None):
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if mode != 2:
+            if freelist_before and not self.warned_auto_vacuum:
+                logger.info(f"{freelist_before} free page(s) but auto_vacuum="
+                            f"{AUTO_VACUUM_MODES.get(mode, mode)}; run `erp db vacuum` once "
+                            f"to enable incremental vacuum")
+                self.warned_auto_vacuum = True
+            return None
+        if not freelist_before or not (idle or force):
+            return None
+        started = time.perf_counter()
+        freelist, steps = freelist_before, 0
+        while freelist and time.perf_counter() - started < self.vacuum_budget:
+            if not force and still_idle and not still_idle():
+                break
+            # execute() steps the pragma once, which frees a single page;
+            # executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_step_pages)})")
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            steps += 1
+        result = self._record('vacuum', started, steps=steps, freed_pages=freelist_before - freelist,
+                              freelist_before=freelist_before, freelist_after=freelist)
+        logger.info(f"Incremental vacuum: freed {result['freed_pages']} page(s) in {steps} step(s), "
+                    f"{freelist} left, {result['ms']} ms")
+        return result
+
+    def run(self, idle_for=None, force=False):
+        """One pass over all tasks. idle_for() -> seconds without requests. Returns results."""
+        if not os.path.exists(self.db_file):
+            raise FileNotFoundError(f"Database not found: {self.db_file}")
+
+        def still_idle():
+            return idle_for is None or idle_for() >= self.idle_seconds
+
+        idle = force or still_idle()
+        conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT, isolation_level=None)
+        results = []
+        try:
+            for task in (self.checkpoint, self.analyze):
+                try:
+                    result = task(conn, idle, force)
+                except sqlite3.OperationalError as e:
+                    # Locked by the server: try again on the next pass
+                    logger.debug(f"Maintenance {task.__name__} skipped: {e}")
+                    continue
+                if result:
+                    results.append(result)
+            try:
+                result = self.vacuum(conn, idle, force, still_idle)
+                if result:
+                    results.append(result)
+            except sqlite3.OperationalError as e:
+                logger.debug(f"Maintenance vacuum skipped: {e}")
+        finally:
+            conn.close()
+        if results:
+            self._save_state()
+        return results
+
+
+# ─── Scheduler ─────────────────────────────────────────────────
+
+def maintenance_from_config(config):
+    """Maintenance for the app's database, configured from app.config."""
+    return Maintenance(
+        os.path.join(config['DATA_DIR'], 'erp.db'),
+        os.path.join(config['DATA_DIR'], 'maintenance.json'),
+        wal_checkpoint_mb=float(config.get('WAL_CHECKPOINT_MB', WAL_CHECKPOINT_MB)),
+        analyze_interval=float(config.get('ANALYZE_INTERVAL', ANALYZE_INTERVAL)),
+        analysis_limit=int(config.get('ANALYSIS_LIMIT', ANALYSIS_LIMIT)),
+        vacuum_step_pages=int(config.get('VACUUM_STEP_PAGES', VACUUM_STEP_PAGES)),
+        vacuum_budget=float(config.get('VACUUM_BUDGET', VACUUM_BUDGET)),
+        idle_seconds=float(config.get('IDLE_SECONDS', IDLE_SECONDS)),
+    )
+
+
+def maintenance_scheduler(app):
+    """Background thread that runs a maintenance pass every MAINTENANCE_INTERVAL seconds."""
+    from health import heartbeat
+
+    logger.info("Maintenance scheduler thread started")
+    interval = float(app.config.get('MAINTENANCE_INTERVAL', MAINTENANCE_INTERVAL))
+    maintenance = maintenance_from_config(app.config)
+    store = app.extensions.get('metrics')
+    idle_for = store.idle_seconds if store else None
+    while True:
+        error = None
+        try:
+            maintenance.run(idle_for)
+        except Exception as e:
+            error = e
+            logger.exception(f"Maintenance error: {e}")
+        heartbeat('maintenance', interval, error)
+        time.sleep(interval)
+
+
+# ─── CLI ───────────────────────────────────────────────────────
+
+def format_result(result):
+    details = ', '.join(f"{k}={v}" for k, v in result.items() if k not in ('task', 'at', 'ms'))
+    return f"{result['at']}  {result['task']:10} {result['ms']:>9.1f}ms  {details}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ERP database maintenance (checkpoint, analyze, vacuum)')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+                        help='Folder sa erp.db')
+    parser.add_argument('--history', action='store_true', help='Samo prikaži poslednja pokretanja')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] - [%(name)s] - %(message)s')
+    maintenance = maintenance_from_config({'DATA_DIR': args.data_dir})
+    if args.history:
+        history = maintenance.state['history']
+        if not history:
+            print("Još nema zabeleženih pokretanja održavanja.")
+        for result in history[-20:]:
+            print(format_result(result))
+        return 0
+    try:
+        results = maintenance.run(force=True)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"✗ Održavanje nije uspelo: {e}")
+        return 1
+    for result in results:
+        print(format_result(result))
+    print(f"✓ Održavanje završeno ({len(results)} zadatak/a)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+metrics.py - Request timing middleware and Prometheus-style /metrics endpoint.
+
+Every request is timed per endpoint (blueprint.view): latency and DB-time
+histograms, a request counter by method and status code, SQL statement
+counts, and an in-flight gauge. DB time and statement counts come from
+SQLAlchemy cursor events on every engine; the same hook logs statements
+slower than SLOW_QUERY_MS together with their EXPLAIN QUERY PLAN. In debug
+mode responses carry X-Query-Count and Server-Timing headers.
+
+Each process keeps its numbers in memory and writes them at most once per
+FLUSH_INTERVAL to DATA_DIR/metrics/<pid>.json; /metrics merges its own
+live state with the files of all other worker processes. The file of a
+process that has exited is folded into a live process's counters and
+removed, so totals never go backwards and the folder does not grow with
+every restart; in-flight only counts live ones.
+
+/metrics answers direct loopback requests (a local scraper or curl) and
+logged-in users; anything arriving through a proxy needs a login.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from flask import g, request, current_app, has_app_context, has_request_context
+from flask_login import current_user
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+# Defaults for app.config; .erp.conf can override them (see ERP_server.main)
+SLOW_QUERY_MS = 200
+QUERY_COUNT_WARN = 50
+EXPLAIN_PREFIXES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+LOOPBACK_ADDRS = ('127.0.0.1', '::1')
+# nginx and cloudflared also connect from loopback but add one of these
+PROXY_HEADERS = ('X-Forwarded-For', 'X-Real-IP', 'Forwarded', 'CF-Connecting-IP')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    """In-process metrics plus the file-backed merge across workers."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.requests = {}      # (endpoint, method, status) -> count
+        self.latency = {}       # endpoint -> [bucket counts..., +Inf count, sum]
+        self.db_time = {}       # endpoint -> same layout as latency
+        self.queries = {}       # endpoint -> SQL statement count
+        self.in_flight = 0
+        self.last_flush = 0.0
+        self.last_request_end = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{self.pid}.json')
+
+    @staticmethod
+    def _observe(histograms, endpoint, value):
+        hist = histograms.get(endpoint)
+        if hist is None:
+            hist = histograms[endpoint] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[len(LATENCY_BUCKETS)] += 1
+        hist[-1] += value
+
+    def start_request(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end_request(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.last_request_end = time.monotonic()
+
+    def idle_seconds(self):
+        """Seconds since this process last finished a request (0 while one is running)."""
+        with self.lock:
+            return 0.0 if self.in_flight else time.monotonic() - self.last_request_end
+
+    def observe(self, endpoint, method, status, duration, db_seconds, queries=0):
+        with self.lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + queries
+            self._observe(self.latency, endpoint, duration)
+            self._observe(self.db_time, endpoint, db_seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': self.pid,
+                'requests': [list(k) + [v] for k, v in self.requests.items()],
+                'latency': {k: list(v) for k, v in self.latency.items()},
+                'db_time': {k: list(v) for k, v in self.db_time.items()},
+                'queries': dict(self.queries),
+                'in_flight': self.in_flight,
+            }
+
+    def flush(self, force=False):
+        """Write this process's numbers for the other workers (rate limited)."""
+        now = time.monotonic()
+        if not force and now - self.last_flush < FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        # A forked worker inherits the parent's store; give it its own file
+        if os.getpid() != self.pid:
+            with self.lock:
+                self.pid = os.getpid()
+                self.requests, self.latency, self.db_time, self.queries = {}, {}, {}, {}
+                self.in_flight = 0
+        tmp = f'{self.path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {self.path}: {e}")
+
+    def _absorb(self, path):
+        """Fold an exited worker's file into this process's counters, then delete it.
+
+        Renaming first claims the file, so only one live worker absorbs it.
+        """
+        claimed = f'{path}.{self.pid}.absorbing'
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return
+        try:
+            with open(claimed) as f:
+                snap = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable metrics file {path}: {e}")
+            snap = None
+        if snap is not None:
+            with self.lock:
+                for endpoint, method, status, count in snap.get('requests', []):
+                    key = (endpoint, method, status)
+                    self.requests[key] = self.requests.get(key, 0) + count
+                for kind, histograms in (('latency', self.latency), ('db_time', self.db_time)):
+                    for endpoint, hist in snap.get(kind, {}).items():
+                        total = histograms.setdefault(endpoint, [0] * len(hist))
+                        for i, value in enumerate(hist):
+                            total[i] += value
+                for endpoint, count in snap.get('queries', {}).items():
+                    self.queries[endpoint] = self.queries.get(endpoint, 0) + count
+            # Persist the absorbed counts before the claimed file goes away
+            self.flush(force=True)
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+        logger.debug(f"Absorbed metrics of exited process: {os.path.basename(path)}")
+
+    def collect(self):
+        """Merged snapshot of this process (live) and every other worker file."""
+        others = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == f'{self.pid}.json':
+                continue
+            path = os.path.join(self.directory, name)
+            pid = name[:-len('.json')]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                self._absorb(path)
+                continue
+            try:
+                with open(path) as f:
+                    others.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        snapshots = [self.snapshot()] + others
+
+        merged = {'requests': {}, 'latency': {}, 'db_time': {}, 'queries': {}, 'in_flight': 0}
+        for snap in snapshots:
+            for endpoint, method, status, count in snap.get('requests', []):
+                key = (endpoint, method, status)
+                merged['requests'][key] = merged['requests'].get(key, 0) + count
+            for kind in ('latency', 'db_time'):
+                for endpoint, hist in snap.get(kind, {}).items():
+                    total = merged[kind].setdefault(endpoint, [0] * len(hist))
+                    for i, value in enumerate(hist):
+                        total[i] += value
+            for endpoint, count in snap.get('queries', {}).items():
+                merged['queries'][endpoint] = merged['queries'].get(endpoint, 0) + count
+            if snap.get('pid') == self.pid or _pid_alive(snap.get('pid', 0)):
+                merged['in_flight'] += snap.get('in_flight', 0)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        data = self.collect()
+        lines = [
+            '# HELP erp_http_requests_total HTTP requests by endpoint, method and status code.',
+            '# TYPE erp_http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(data['requests'].items()):
+            lines.append(f'erp_http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                         f'status="{status}"}} {count}')
+
+        for kind, name, help_text in (
+            ('latency', 'erp_http_request_duration_seconds', 'Request latency by endpoint.'),
+            ('db_time', 'erp_http_request_db_seconds', 'Time spent in SQL per request by endpoint.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for endpoint, hist in sorted(data[kind].items()):
+                for bound, count in zip(LATENCY_BUCKETS, hist):
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist[len(LATENCY_BUCKETS)]}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {hist[-1]:.6f}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {hist[len(LATENCY_BUCKETS)]}')
+
+        lines += [
+            '# HELP erp_db_queries_total SQL statements executed by endpoint.',
+            '# TYPE erp_db_queries_total counter',
+        ]
+        for endpoint, count in sorted(data['queries'].items()):
+            lines.append(f'erp_db_queries_total{{endpoint="{endpoint}"}} {count}')
+
+        lines += [
+            '# HELP erp_http_requests_in_flight Requests currently being served.',
+            '# TYPE erp_http_requests_in_flight gauge',
+            f'erp_http_requests_in_flight {data["in_flight"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+# ─── Engine Instrumentation ────────────────────────────────────
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def explain_query_plan(dbapi_conn, statement, parameters=None):
+    """EXPLAIN QUERY PLAN on the raw sqlite3 connection (bypasses engine events)."""
+    rows = dbapi_conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    return [row[3] for row in rows]
+
+
+def _log_slow_query(cursor, statement, parameters, executemany, elapsed):
+    if executemany and parameters:
+        parameters = parameters[0]
+    plan = []
+    if statement.lstrip().upper().startswith(EXPLAIN_PREFIXES):
+        try:
+            plan = explain_query_plan(cursor.connection, statement, parameters)
+        except Exception as e:
+            plan = [f'EXPLAIN failed: {e}']
+    where = request.endpoint if has_request_context() else 'background'
+    logger.warning(
+        f"Slow query ({elapsed * 1000:.1f} ms, {where}{', executemany' if executemany else ''}): "
+        f"{' '.join(statement.split())[:1000]} | params={str(parameters)[:200]} | plan={' / '.join(plan)}"
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if not has_app_context():
+        return
+    g.query_count = g.get('query_count', 0) + 1
+    g.db_time = g.get('db_time', 0.0) + elapsed
+    threshold = current_app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    if threshold and elapsed * 1000 >= threshold:
+        _log_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+def instrument_engine(engine):
+    """Count and time SQL statements into flask.g of the running app context."""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+# ─── Flask Integration ─────────────────────────────────────────
+
+def init_metrics(app, db):
+    """Install the timing hooks and the /metrics route on app."""
+    store = MetricsStore(os.path.join(app.config['DATA_DIR'], 'metrics'))
+    app.extensions['metrics'] = store
+    app.config.setdefault('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    app.config.setdefault('QUERY_COUNT_WARN', QUERY_COUNT_WARN)
+
+    # Fold in files left by processes that exited since the last scrape
+    store.collect()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.db_time = 0.0
+        g.query_count = 0
+        g.query_scope = f'{request.method} {request.path}'
+        store.start_request()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            duration = time.perf_counter() - started
+            db_time, queries = g.get('db_time', 0.0), g.get('query_count', 0)
+            store.observe(request.endpoint or 'unmatched', request.method, response.status_code,
+                          duration, db_time, queries)
+            g.metrics_recorded = True
+            if app.debug:
+                response.headers['X-Query-Count'] = str(queries)
+                response.headers['Server-Timing'] = (
+                    f'db;dur={db_time * 1000:.2f};desc="{queries} queries", total;dur={duration * 1000:.2f}'
+                )
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.get('request_started') is None:
+            return
+        if not g.get('metrics_recorded'):
+            store.observe(request.endpoint or 'unmatched', request.method, 500,
+                          time.perf_counter() - g.request_started, g.get('db_time', 0.0),
+                          g.get('query_count', 0))
+        store.end_request()
+        store.flush()
+
+    @app.teardown_appcontext
+    def warn_query_count(exc):
+        # Also covers scheduler jobs that run inside app.app_context()
+        count = g.get('query_count', 0)
+        limit = app.config.get('QUERY_COUNT_WARN')
+        if limit and count > limit:
+            logger.warning(f"{count} SQL statements in {g.get('query_scope', 'background task')} "
+                           f"({g.get('db_time', 0.0) * 1000:.1f} ms) - possible N+1")
+
+    @app.route('/metrics')
+    def metrics():
+        local = request.remote_addr in LOOPBACK_ADDRS and not any(h in request.headers for h in PROXY_HEADERS)
+        if not local and not current_user.is_authenticated:
+            return app.login_manager.unauthorized()
+        store.flush(force=True)
+        return store.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    logger.info(f"Request metrics enabled (store: {store.directory})")
+    return store
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+migrations.py - Versioned schema migrations keyed on PRAGMA user_version.
+
+Each migration has a version number; the database stores the last applied
+version in PRAGMA user_version, so only pending steps ever run and nothing
+is re-probed on later startups. Simple steps run in one transaction
+together with the user_version bump. Table rebuilds (rename/retype of
+columns) copy rows in batches, each in its own short transaction, while
+temporary triggers mirror concurrent writes into the new table; only the
+final swap + user_version bump holds the write lock.
+
+New tables are created by db.create_all() in ERP_server.ensure_schema(),
+which only runs while user_version is behind LATEST_VERSION (or when
+missing_derived_schema() finds a repair to do). Steps here
+handle changes to tables that already exist and must be no-ops on a
+freshly created schema; a change that only adds a model still needs a
+(no-op) step so that existing databases run create_all once.
+
+Run at startup from create_app()/create_db_app(), or manually:
+    python migrations.py [--data-dir DIR] [--status]
+    erp db migrate
+"""
+
+import os
+import sys
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class MigrationContext:
+    """What a migration step gets: an autocommit connection and helpers."""
+
+    def __init__(self, conn, version, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        self.conn = conn
+        self.version = version
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: logger.info(message))
+
+    def columns(self, table):
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+
+    def table_exists(self, table):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+
+# ─── Helpers ───────────────────────────────────────────────────
+
+def add_column_if_missing(ctx, table, column, ddl):
+    """ALTER TABLE ADD COLUMN, skipped if the table is missing or already has it."""
+    if ctx.table_exists(table) and column not in ctx.columns(table):
+        ctx.progress(f"  → {table}: adding column {column}")
+        ctx.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _source(old, row):
+    return old.format(row=row) if '{row}' in old else f'{row}{old}'
+
+
+def rebuild_table(ctx, table, create_sql, column_map, post_sql=()):
+    """Rebuild `table` from `create_sql` (which must create `{table}_new`).
+
+    column_map is [(new_column, old_column), ...]; old_column may also be
+    an SQL expression that names the old row's columns as {row}column.
+    Rows are copied in batches of ctx.batch_size by id; triggers on the old table mirror
+    inserts/updates/deletes made meanwhile, so the server may keep running.
+    The final transaction drops the old table, renames the new one, runs
+    post_sql (indexes) and bumps user_version.
+    """
+    conn = ctx.conn
+    new = f"{table}_new"
+    new_cols = ', '.join(c for c, _ in column_map)
+    old_cols = ', '.join(_source(o, '') for _, o in column_map)
+    new_vals = ', '.join(_source(o, 'new.') for _, o in column_map)
+
+    # Setup runs in the runner's transaction; start from scratch if a
+    # previous run was interrupted
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    for suffix in ('ins', 'upd', 'del'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {new}_sync_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {new}")
+    conn.execute(create_sql)
+    conn.execute(f"CREATE TRIGGER {new}_sync_ins AFTER INSERT ON {table} BEGIN "
+                 f"INSERT OR REPLACE INTO {new} ({new_cols}) VALUES ({new_vals}); END")
+    conn.execute(f"CREATE TRIGGER {new}_sync_upd AFTER UPDATE ON {table} BEGIN "
+                 f"DELETE FROM {new} WHERE id = old.id; "
+                 f"INSERT OR REPLACE INTO {new} ({new_cols}) VALUES ({new_vals}); END")
+    conn.execute(f"CREATE TRIGGER {new}_sync_del AFTER DELETE ON {table} BEGIN "
+                 f"DELETE FROM {new} WHERE id = old.id; END")
+    conn.execute("COMMIT")
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    copied, last_id = 0, -1
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, ctx.batch_size)
+        ).fetchall()
+        if not rows:
+            conn.execute("COMMIT")
+            break
+        upper = rows[-1][0]
+        # OR IGNORE: rows already mirrored by the triggers are newer than ours
+        conn.execute(
+            f"INSERT OR IGNORE INTO {new} ({new_cols}) "
+            f"SELECT {old_cols} FROM {table} WHERE id > ? AND id <= ?", (last_id, upper)
+        )
+        conn.execute("COMMIT")
+        copied += len(rows)
+        last_id = upper
+        ctx.progress(f"  → {table}: copied {copied}/{total} rows")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for suffix in ('ins', 'upd', 'del'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {new}_sync_{suffix}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        for sql in post_sql:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {int(ctx.version)}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    ctx.progress(f"  ✓ {table} rebuilt ({copied} rows)")
+
+
+# ─── Migration steps ───────────────────────────────────────────
+# Append new steps at the end; never renumber or edit an applied step.
+
+def m001_users_password_change_required(ctx):
+    add_column_if_missing(ctx, 'users', 'password_change_required', 'BOOLEAN DEFAULT 0')
+
+
+def m002_orders_lager_id(ctx):
+    add_column_if_missing(ctx, 'orders', 'lager_id', 'INTEGER')
+
+
+def m003_orders_english_columns(ctx):
+    if not ctx.table_exists('orders') or 'naziv' not in ctx.columns('orders'):
+        return
+    rebuild_table(ctx, 'orders', """
+        CREATE TABLE orders_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price REAL NOT NULL DEFAULT 0,
+            paid BOOLEAN DEFAULT 0,
+            customer TEXT NOT NULL,
+            date TEXT DEFAULT '',
+            quantity INTEGER DEFAULT 1,
+            color TEXT DEFAULT '',
+            description TEXT DEFAULT '',
+            image TEXT DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'new',
+            lager_id INTEGER,
+            FOREIGN KEY (lager_id) REFERENCES lager (id)
+        )""", [
+        ('id', 'id'), ('name', 'naziv'), ('price', 'cena'), ('paid', 'placeno'),
+        ('customer', 'kupac'), ('date', 'datum'), ('quantity', 'kolicina'),
+        ('color', 'boja'), ('description', 'opis'), ('image', 'slika'),
+        ('status', 'status'), ('lager_id', 'lager_id'),
+    ])
+
+
+def m004_lager_english_columns(ctx):
+    if not ctx.table_exists('lager') or 'naziv' not in ctx.columns('lager'):
+        return
+    rebuild_table(ctx, 'lager', """
+        CREATE TABLE lager_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price REAL DEFAULT 0,
+            color TEXT DEFAULT '',
+            quantity INTEGER DEFAULT 0,
+            location TEXT DEFAULT 'House',
+            image TEXT DEFAULT ''
+        )""", [
+        ('id', 'id'), ('name', 'naziv'), ('price', 'cena'), ('color', 'boja'),
+        ('quantity', 'kolicina'), ('location', 'lokacija'), ('image', 'slika'),
+    ])
+
+
+# Money as integer para: the batched copy converts each row in SQL, so
+# the backfill is one INSERT ... SELECT per batch
+PRICE_TO_MINOR = 'CAST(ROUND({row}price * 100) AS INTEGER)'
+
+
+def m005_orders_price_minor(ctx):
+    if not ctx.table_exists('orders') or 'price' not in ctx.columns('orders'):
+        return
+    rebuild_table(ctx, 'orders', """
+        CREATE TABLE orders_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price_minor INTEGER NOT NULL DEFAULT 0,
+            paid BOOLEAN DEFAULT 0,
+            customer TEXT NOT NULL,
+            date TEXT DEFAULT '',
+            quantity INTEGER DEFAULT 1,
+            color TEXT DEFAULT '',
+            description TEXT DEFAULT '',
+            image TEXT DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'new',
+            lager_id INTEGER,
+            FOREIGN KEY (lager_id) REFERENCES lager (id)
+        )""", [
+        ('id', 'id'), ('name', 'name'), ('price_minor', PRICE_TO_MINOR), ('paid', 'paid'),
+        ('customer', 'customer'), ('date', 'date'), ('quantity', 'quantity'),
+        ('color', 'color'), ('description', 'description'), ('image', 'image'),
+        ('status', 'status'), ('lager_id', 'lager_id'),
+    ])
+
+
+def m006_lager_price_minor(ctx):
+    if not ctx.table_exists('lager') or 'price' not in ctx.columns('lager'):
+        return
+    rebuild_table(ctx, 'lager', """
+        CREATE TABLE lager_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price_minor INTEGER DEFAULT 0,
+            color TEXT DEFAULT '',
+            quantity INTEGER DEFAULT 0,
+            location TEXT DEFAULT 'House',
+            image TEXT DEFAULT ''
+        )""", [
+        ('id', 'id'), ('name', 'name'), ('price_minor', PRICE_TO_MINOR), ('color', 'color'),
+        ('quantity', 'quantity'), ('location', 'location'), ('image', 'image'),
+    ])
+
+
+def m007_sales_rollups_revenue_minor(ctx):
+    # Derived data: recreated empty, ensure_sales_rollups() refills it from orders
+    if not ctx.table_exists('sales_rollups') or 'revenue' not in ctx.columns('sales_rollups'):
+        return
+    ctx.progress("  → sales_rollups: recreating with revenue_minor (refilled from orders at startup)")
+    ctx.conn.execute("DROP TABLE sales_rollups")
+    ctx.conn.execute("""
+        CREATE TABLE sales_rollups (
+            dimension VARCHAR(10) NOT NULL,
+            bucket VARCHAR(200) NOT NULL,
+            orders INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            revenue_minor INTEGER NOT NULL,
+            PRIMARY KEY (dimension, bucket)
+        )""")
+
+
+def m008_orders_customer_id(ctx):
+    # customers itself comes from create_all; blueprints.customers.ensure_customers()
+    # fills it and links the orders in batches
+    add_column_if_missing(ctx, 'orders', 'customer_id', 'INTEGER REFERENCES customers (id)')
+    if ctx.table_exists('orders'):
+        ctx.conn.execute("CREATE INDEX IF NOT EXISTS ix_orders_customer_id_id ON orders (customer_id, id)")
+
+
+def m009_order_items(ctx):
+    # New table only: created by create_all, this step makes existing databases run it
+    pass
+
+
+def m010_product_rollups_from_lines(ctx):
+    # Product rollups now count order lines; emptied here, ensure_sales_rollups() refills them
+    if not ctx.table_exists('sales_rollups'):
+        return
+    ctx.progress("  → sales_rollups: cleared, product buckets are refilled from order lines at startup")
+    ctx.conn.execute("DELETE FROM sales_rollups")
+
+
+def m011_lager_opening_snapshots(ctx):
+    # Items older than the stock ledger have no 'initial' movement and maybe
+    # no snapshot; give each one an opening snapshot where its history starts
+    if not all(ctx.table_exists(t) for t in ('lager', 'stock_movements', 'stock_snapshots')):
+        return
+    cursor = ctx.conn.execute("""
+        INSERT INTO stock_snapshots (lager_id, quantity, movement_id, taken_at)
+        SELECT l.id,
+               COALESCE(l.quantity, 0)
+                 - COALESCE((SELECT SUM(m.delta) FROM stock_movements m WHERE m.lager_id = l.id), 0),
+               0,
+               COALESCE((SELECT MIN(m.created_at) FROM stock_movements m WHERE m.lager_id = l.id), ?)
+        FROM lager l
+        WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots s WHERE s.lager_id = l.id)
+          AND NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.lager_id = l.id AND m.reason = 'initial')
+    """, (datetime.now().isoformat(timespec='seconds'),))
+    ctx.progress(f"  → stock_snapshots: opening balance for {cursor.rowcount} item(s)")
+
+
+MIGRATIONS = [
+    (1, 'users.password_change_required', m001_users_password_change_required),
+    (2, 'orders.lager_id', m002_orders_lager_id),
+    (3, 'orders: Serbian → English columns', m003_orders_english_columns),
+    (4, 'lager: Serbian → English columns', m004_lager_english_columns),
+    (5, 'orders: price → integer price_minor', m005_orders_price_minor),
+    (6, 'lager: price → integer price_minor', m006_lager_price_minor),
+    (7, 'sales_rollups: revenue → integer revenue_minor', m007_sales_rollups_revenue_minor),
+    (8, 'orders.customer_id (customers table)', m008_orders_customer_id),
+    (9, 'order_items table', m009_order_items),
+    (10, 'sales_rollups: products from order lines', m010_product_rollups_from_lines),
+    (11, 'stock_snapshots: opening balance for items older than the ledger', m011_lager_opening_snapshots),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ─── Runner ────────────────────────────────────────────────────
+
+def get_user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def schema_version(db_file):
+    """PRAGMA user_version of db_file, or None if the file does not exist."""
+    if not os.path.exists(db_file):
+        return None
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        return get_user_version(conn)
+    finally:
+        conn.close()
+
+
+def pending_migrations(current):
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def run_migrations(db_file, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Apply all pending migrations to db_file. Returns the list of applied versions."""
+    conn = sqlite3.connect(db_file, isolation_level=None, timeout=30)
+    applied = []
+    try:
+        current = get_user_version(conn)
+        pending = pending_migrations(current)
+        if not pending:
+            logger.debug(f"Schema up to date (user_version={current})")
+            return applied
+
+        logger.info(f"Schema at version {current}, {len(pending)} migration(s) pending")
+        for version, description, step in pending:
+            ctx = MigrationContext(conn, version, batch_size, progress)
+            ctx.progress(f"▶ Migration {version}: {description}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                step(ctx)
+                # A batched rebuild commits its own final transaction
+                if conn.in_transaction:
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                    conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                logger.error(f"Migration {version} failed", exc_info=True)
+                raise
+            applied.append(version)
+            logger.info(f"Migration {version} applied: {description}")
+    finally:
+        conn.close()
+    return applied
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] - [%(name)s] - %(message)s'
+    )
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Run pending ERP schema migrations')
+    parser.add_argument('--data-dir', default=os.path.join(base_dir, 'data'), help='DATA_DIR sa erp.db')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Redova po transakciji pri rebuild-u tabele')
+    parser.add_argument('--status', action='store_true', help='Samo prikaži verziju i pending migracije')
+    args = parser.parse_args(argv)
+
+    db_file = os.path.join(args.data_dir, 'erp.db')
+    current = schema_version(db_file)
+    if current is None:
+        print(f"✗ Database ne postoji: {db_file}")
+        return 1
+
+    pending = pending_migrations(current)
+    print(f"Schema verzija: {current} (najnovija: {LATEST_VERSION})")
+    if args.status or not pending:
+        for version, description, _ in pending:
+            print(f"  pending {version}: {description}")
+        if not pending:
+            print("✓ Schema je ažurna")
+        return 0
+
+    try:
+        applied = run_migrations(db_file, args.batch_size, progress=print)
+    except Exception as e:
+        print(f"✗ Migracija nije uspela: {e}")
+        return 1
+    if applied:
+        # New tables and the indexes/triggers outside the models (FTS, report
+        # change log) are the app's part of the schema; a table rebuild drops them
+        from ERP_server import create_db_app, ensure_schema
+        ensure_schema(create_db_app(args.data_dir), db_file, force=True)
+    print(f"✓ Primenjeno migracija: {len(applied)} (verzija {LATEST_VERSION})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,72 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import wraps
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import logging
 
-db = SQLAlchemy()
 logger = logging.getLogger(__name__)
 
+READONLY_BIND = 'readonly'
+# Money is stored as integer para (1/100 dinar) so SUMs are exact
+MINOR_UNITS = 100
+# SQLite INTEGER is a signed 64-bit value; larger ints fail at bind time
+MINOR_MIN, MINOR_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def to_minor(amount):
+    """Amount in dinars (str, int, float or Decimal) -> integer para, rounded half up.
+
+    Strings are parsed exactly (no float step). Raises ValueError for
+    anything that is not a finite number or does not fit a 64-bit column.
+    """
+    if amount is None or amount == '':
+        return 0
+    try:
+        value = Decimal(str(amount).strip())
+        if not value.is_finite():
+            raise ValueError(f"Not an amount: {amount!r}")
+        minor = int((value * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+    except ArithmeticError:
+        raise ValueError(f"Not an amount: {amount!r}")
+    if not MINOR_MIN <= minor <= MINOR_MAX:
+        raise ValueError(f"Amount out of range: {amount!r}")
+    return minor
+
+
+def from_minor(minor):
+    """Integer para -> dinars as a float, the shape the JSON API has always used."""
+    return (minor or 0) / MINOR_UNITS
+
+
+class RoutingSession(Session):
+    """Session that sends queries to the read-only engine while a
+    ``@read_only`` view is running. Flushes always go to the writer."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_readonly_db'):
+            engine = self._db.engines.get(READONLY_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def read_only(view):
+    """Route every query issued by the view to the read-only connection pool."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_readonly_db = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.use_readonly_db = False
+    return wrapper
+
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -46,7 +107,7 @@ class Order(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    price = db.Column(db.Float, nullable=False, default=0)
+    price_minor = db.Column(db.Integer, nullable=False, default=0)
     paid = db.Column(db.Boolean, default=False)
     customer = db.Column(db.String(200), nullable=False)
     date = db.Column(db.String(20), default='')
@@ -56,6 +117,20 @@ class Order(db.Model):
     image = db.Column(db.String(300), default='')
     status = db.Column(db.String(20), nullable=False, default='new')
     lager_id = db.Column(db.Integer, db.ForeignKey('lager.id'), nullable=True)
+    # Set from `customer` by blueprints.customers.customer_id_for()
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_orders_customer_id_id', 'customer_id', 'id'),
+    )
+
+    @property
+    def price(self):
+        return from_minor(self.price_minor)
+
+    @price.setter
+    def price(self, amount):
+        self.price_minor = to_minor(amount)
 
     def to_dict(self):
         return {
@@ -70,7 +145,69 @@ class Order(db.Model):
             'description': self.description,
             'image': self.image,
             'status': self.status,
-            'lager_id': self.lager_id
+            'lager_id': self.lager_id,
+            'customer_id': self.customer_id
+        }
+
+
+class OrderItem(db.Model):
+    """One inventory line of a multi-line order (see orders.order_from_lager).
+
+    The parent order keeps the totals (price, quantity) used by reports and
+    notifications; orders created without lines describe a single product
+    in their own columns.
+    """
+    __tablename__ = 'order_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    lager_id = db.Column(db.Integer, db.ForeignKey('lager.id'), nullable=True)
+    name = db.Column(db.String(200), nullable=False, default='')
+    color = db.Column(db.String(100), default='')
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    # Price of the whole line (all pieces), like Order.price
+    price_minor = db.Column(db.Integer, nullable=False, default=0)
+    reserved = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+    )
+
+    @property
+    def price(self):
+        return from_minor(self.price_minor)
+
+    @price.setter
+    def price(self, amount):
+        self.price_minor = to_minor(amount)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'lager_id': self.lager_id,
+            'name': self.name,
+            'color': self.color,
+            'quantity': self.quantity,
+            'price': self.price,
+            'reserved': self.reserved
+        }
+
+
+class Customer(db.Model):
+    """One row per distinct customer; `key` is the normalized name (see blueprints.customers)."""
+    __tablename__ = 'customers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    key = db.Column(db.String(200), unique=True, nullable=False)
+    created_at = db.Column(db.String(50), nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created_at': self.created_at
         }
 
 
@@ -79,12 +216,20 @@ class LagerItem(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    price = db.Column(db.Float, default=0)
+    price_minor = db.Column(db.Integer, default=0)
     color = db.Column(db.String(100), default='')
     quantity = db.Column(db.Integer, default=0)
     location = db.Column(db.String(100), default='House')
     image = db.Column(db.String(300), default='')
 
+    @property
+    def price(self):
+        return from_minor(self.price_minor)
+
+    @price.setter
+    def price(self, amount):
+        self.price_minor = to_minor(amount)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -113,3 +258,85 @@ class NotificationLog(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     notify_key = db.Column(db.String(200), unique=True, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'notify_key': self.notify_key
+        }
+
+
+class StockMovement(db.Model):
+    """Append-only ledger of every change to LagerItem.quantity."""
+    __tablename__ = 'stock_movements'
+
+    id = db.Column(db.Integer, primary_key=True)
+    lager_id = db.Column(db.Integer, db.ForeignKey('lager.id'), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(30), nullable=False, default='')
+    order_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_stock_movements_lager_id_id', 'lager_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'lager_id': self.lager_id,
+            'delta': self.delta,
+            'reason': self.reason,
+            'order_id': self.order_id,
+            'created_at': self.created_at
+        }
+
+
+class StockSnapshot(db.Model):
+    """Per-item stock level including all movements up to movement_id."""
+    __tablename__ = 'stock_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    lager_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    movement_id = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_lager_id_taken_at', 'lager_id', 'taken_at'),
+    )
+
+
+class SalesRollup(db.Model):
+    """Realized sales pre-aggregated per day, month, customer and product.
+
+    Kept in step with orders by blueprints.reports.update_sales_rollups().
+    """
+    __tablename__ = 'sales_rollups'
+
+    dimension = db.Column(db.String(10), primary_key=True)
+    bucket = db.Column(db.String(200), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue_minor = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'bucket': self.bucket,
+            'orders': self.orders,
+            'quantity': self.quantity,
+            'revenue': from_minor(self.revenue_minor)
+        }
+
+
+class OrderChange(db.Model):
+    """Days touched by order writes, filled by triggers (see blueprints.reports).
+
+    Report caches use it to drop only the buckets that changed.
+    """
+    __tablename__ = 'order_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(10), nullable=True)
+
+    __table_args__ = {'sqlite_autoincrement': True}
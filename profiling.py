@@ -0,0 +1,219 @@
+"""
+profiling.py - On-demand cProfile capture for live requests.
+
+A request is profiled when either
+  - an admin sends it with the header `X-Profile: 1`, or
+  - sampling is on: a fraction of all requests (optionally only one
+    endpoint) set by an admin via POST /api/admin/profiling or by
+    PROFILE_SAMPLE_RATE in .erp.conf.
+
+Each profile is a pstats file in DATA_DIR/profiles named
+<time>_<endpoint>_<ms>ms_<pid>.prof; the response carries its name in
+X-Profile-Id. Only the newest PROFILE_KEEP files are kept. The sampling
+settings live in DATA_DIR/profiles/settings.json so every worker process
+follows the same switch. Browse the files with `erp profiles`.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import random
+import pstats
+import logging
+import cProfile
+from datetime import datetime
+from flask import g, request, jsonify
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_KEEP = 200
+PRUNE_EVERY = 20
+PROFILE_NAME = re.compile(r'^(\d{8}-\d{6})_(.+)_(\d+)ms_(\d+)\.prof$')
+
+
+# ─── Profile Files ─────────────────────────────────────────────
+
+def list_profiles(directory, endpoint=None):
+    """Profiles in directory, newest first, as dicts (name, path, time, endpoint, ms, pid)."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        match = PROFILE_NAME.match(name)
+        if not match:
+            continue
+        stamp, ep, ms, pid = match.groups()
+        if endpoint and ep != endpoint:
+            continue
+        profiles.append({
+            'name': name,
+            'path': os.path.join(directory, name),
+            'time': datetime.strptime(stamp, '%Y%m%d-%H%M%S').isoformat(),
+            'endpoint': ep,
+            'ms': int(ms),
+            'pid': int(pid),
+        })
+    profiles.sort(key=lambda p: (p['time'], p['name']), reverse=True)
+    return profiles
+
+
+def summarize_profiles(paths, limit=20, sort='cumulative'):
+    """pstats top-`limit` report for one or more profile files (merged)."""
+    out = io.StringIO()
+    stats = pstats.Stats(*paths, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def prune_profiles(directory, keep=PROFILE_KEEP):
+    for profile in list_profiles(directory)[keep:]:
+        try:
+            os.remove(profile['path'])
+        except OSError:
+            pass
+
+
+# ─── Sampling Settings ─────────────────────────────────────────
+
+class ProfilingSettings:
+    """settings.json shared by all workers, re-read when its mtime changes."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, 'settings.json')
+        self.values = None
+        self.mtime = None
+
+    def current(self):
+        """Saved settings, or None if no admin has set them yet."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime != self.mtime:
+            try:
+                with open(self.path) as f:
+                    self.values = {'sample_rate': 0.0, 'endpoint': None, **json.load(f)}
+                self.mtime = mtime
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read profiling settings {self.path}: {e}")
+        return self.values
+
+    def save(self, sample_rate, endpoint=None):
+        values = {'sample_rate': sample_rate, 'endpoint': endpoint or None}
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(values, f)
+        os.replace(tmp, self.path)
+        return values
+
+
+# ─── Flask Integration ─────────────────────────────────────────
+
+def _is_admin():
+    return current_user.is_authenticated and current_user.is_admin
+
+
+def init_profiling(app):
+    """Install the profiling hooks and the /api/admin/profiling routes on app."""
+    directory = os.path.join(app.config['DATA_DIR'], 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    settings = ProfilingSettings(directory)
+    app.extensions['profiling'] = settings
+    written = [0]
+
+    def sampling():
+        # Settings saved by an admin override PROFILE_SAMPLE_RATE from .erp.conf
+        return settings.current() or {'sample_rate': app.config['PROFILE_SAMPLE_RATE'], 'endpoint': None}
+
+    def should_profile():
+        if request.endpoint in (None, 'static'):
+            return False
+        if request.headers.get(PROFILE_HEADER) == '1':
+            if _is_admin():
+                return True
+            logger.warning(f"Ignoring {PROFILE_HEADER} header from non-admin request to {request.path}")
+            return False
+        values = sampling()
+        rate = values['sample_rate']
+        if not rate or (values['endpoint'] and values['endpoint'] != request.endpoint):
+            return False
+        return random.random() < rate
+
+    def finish():
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return None
+        profiler.disable()
+        elapsed_ms = int((time.perf_counter() - g.pop('profile_started')) * 1000)
+        name = (f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{request.endpoint}_"
+                f"{elapsed_ms}ms_{os.getpid()}.prof")
+        try:
+            profiler.dump_stats(os.path.join(directory, name))
+        except OSError as e:
+            logger.warning(f"Could not write profile {name}: {e}")
+            return None
+        logger.info(f"Profiled {request.method} {request.path} ({elapsed_ms} ms) -> {name}")
+        written[0] += 1
+        if written[0] % PRUNE_EVERY == 0:
+            prune_profiles(directory)
+        return name
+
+    @app.before_request
+    def start_profiler():
+        if should_profile():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Only one profiler per thread (another request or a debugger holds it)
+                logger.debug(f"Skipping profile of {request.path}: {e}")
+                return
+            g.profile_started = time.perf_counter()
+            g.profiler = profiler
+
+    @app.after_request
+    def stop_profiler(response):
+        name = finish()
+        if name:
+            response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def stop_profiler_on_error(exc):
+        # after_request is skipped when the view raised
+        finish()
+
+    @app.route('/api/admin/profiling', methods=['GET'])
+    def profiling_status():
+        if not _is_admin():
+            return jsonify({'error': 'Samo administrator može da vidi profilisanje'}), 403
+        profiles = list_profiles(directory)
+        for profile in profiles:
+            del profile['path']
+        return jsonify({**sampling(), 'directory': directory, 'profiles': profiles[:50]})
+
+    @app.route('/api/admin/profiling', methods=['POST'])
+    def profiling_update():
+        if not _is_admin():
+            return jsonify({'error': 'Samo administrator može da uključi profilisanje'}), 403
+        data = request.get_json(silent=True) or {}
+        try:
+            rate = float(data.get('sample_rate', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate mora biti broj'}), 400
+        if not 0 <= rate <= 1:
+            return jsonify({'error': 'sample_rate mora biti između 0 i 1'}), 400
+        endpoint = data.get('endpoint') or None
+        if endpoint and endpoint not in app.view_functions:
+            return jsonify({'error': f'Nepoznat endpoint: {endpoint}'}), 400
+        values = settings.save(rate, endpoint)
+        logger.info(f"Profiling sampling set by {current_user.username}: rate={rate}, endpoint={endpoint}")
+        return jsonify({'ok': True, **values})
+
+    logger.info(f"Request profiling available (store: {directory})")
+    return settings
@@ -4,6 +4,9 @@ add_missing_columns.py - Add missing database columns to existing tables.
 
 This script safely adds any missing columns to the database schema.
 Run this when the model definitions are updated but the database hasn't been migrated.
+
+Superseded by migrations.py (run at startup or via `erp db migrate`);
+kept for reference.
 """
 
 import sqlite3
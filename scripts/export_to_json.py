@@ -8,13 +8,30 @@ in the data/ directory. It creates a snapshot of the current state of the databa
 Run manually:
     python export_to_json.py
 
+Full export streams rows from the database cursor, so memory use does not
+depend on table size. --format ndjson writes one record per line and
+--compress gzip|zstd compresses the output:
+    python export_to_json.py --format ndjson --compress gzip
+
+Incremental mode (used by backup.sh) writes data/export/ as stable,
+id-range shards with one record per line, and rewrites only shards whose
+content hash changed, so each git backup commit is a small diff:
+    python export_to_json.py --sharded [--shard-size 1000]
+
+--data-dir exports another database (e.g. a scratch copy) into that folder.
+
 Or schedule it to run daily at 3 AM using cron (Linux) or Task Scheduler (Windows).
 """
 
+import io
 import json
 import os
 import sys
+import gzip
+import hashlib
+import textwrap
 import logging
+import argparse
 from datetime import datetime
 
 # Setup logging
@@ -28,69 +45,137 @@ logger = logging.getLogger(__name__)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
-from ERP_server import create_app
-from models import db, Order, LagerItem, EmailConfig, NotificationLog
+from ERP_server import create_db_app
+from models import db, Order, OrderItem, LagerItem, EmailConfig, NotificationLog
 
 
 BASE_DIR = PROJECT_ROOT
 DATA_DIR = os.path.join(BASE_DIR, 'data')
+EXPORT_DIR = os.path.join(DATA_DIR, 'export')
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_SHARD_SIZE = 1000
+
+
+# ─── Streaming writer ──────────────────────────────────────────
+# Records are pulled from the database cursor in batches (yield_per) and
+# written one at a time, so memory use does not grow with row count.
+
+STREAM_BATCH_SIZE = 500
+EXPORT_FORMATS = ('json', 'ndjson')
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+
+
+class StreamWriter:
+    """Incrementally write records as a JSON array or as NDJSON, optionally compressed.
+
+    The JSON array output is byte-identical to json.dump(records, indent=2).
+    """
+
+    def __init__(self, path, fmt='json', compress='none'):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.fmt = fmt
+        self.count = 0
+        if fmt == 'ndjson':
+            path = os.path.splitext(path)[0] + '.ndjson'
+        if compress == 'gzip':
+            self.path = path + '.gz'
+            self._raw = None
+            self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        elif compress == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+            self.path = path + '.zst'
+            self._raw = open(self.path, 'wb')
+            stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+            self._file = io.TextIOWrapper(stream, encoding='utf-8')
+        else:
+            self.path = path
+            self._raw = None
+            self._file = open(self.path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        if self.fmt == 'ndjson':
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._file.write('\n')
+        else:
+            self._file.write('[\n' if self.count == 0 else ',\n')
+            self._file.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), '  '))
+        self.count += 1
 
+    def close(self):
+        if self.fmt == 'json':
+            self._file.write('[]' if self.count == 0 else '\n]')
+        self._file.close()
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+        return self.count
 
-def export_orders():
-    """Export orders to separate JSON files based on status."""
-    logger.debug("Exporting orders...")
-    # Get orders by status
-    new_orders = Order.query.filter_by(status='new').all()
-    for_delivery = Order.query.filter_by(status='for_delivery').all()
-    realized = Order.query.filter_by(status='realized').all()
+    def __enter__(self):
+        return self
 
-    logger.debug(f"Found {len(new_orders)} new, {len(for_delivery)} for_delivery, {len(realized)} realized orders")
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-    # Convert to dictionaries
-    new_data = [o.to_dict() for o in new_orders]
-    delivery_data = [o.to_dict() for o in for_delivery]
-    realized_data = [o.to_dict() for o in realized]
 
-    # Save to files
-    try:
-        with open(os.path.join(DATA_DIR, 'new_ord.json'), 'w', encoding='utf-8') as f:
-            json.dump(new_data, f, ensure_ascii=False, indent=2)
-        logger.debug("new_ord.json saved")
+def stream_query(stmt, filename, fmt='json', compress='none', to_record=None):
+    """Stream the rows of a SELECT into DATA_DIR/filename. Returns (path, count)."""
+    to_record = to_record or (lambda obj: obj.to_dict())
+    with StreamWriter(os.path.join(DATA_DIR, filename), fmt, compress) as writer:
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for obj in result.scalars():
+            writer.write(to_record(obj))
+    logger.debug(f"{os.path.basename(writer.path)} saved: {writer.count} records")
+    return writer.path, writer.count
 
-        with open(os.path.join(DATA_DIR, 'for_delivery.json'), 'w', encoding='utf-8') as f:
-            json.dump(delivery_data, f, ensure_ascii=False, indent=2)
-        logger.debug("for_delivery.json saved")
 
-        with open(os.path.join(DATA_DIR, 'realized.json'), 'w', encoding='utf-8') as f:
-            json.dump(realized_data, f, ensure_ascii=False, indent=2)
-        logger.debug("realized.json saved")
-        
-        logger.debug(f"Orders exported: {len(new_data)} new, {len(delivery_data)} delivery, {len(realized_data)} realized")
+def export_orders(fmt='json', compress='none'):
+    """Export orders to separate JSON files based on status."""
+    logger.debug("Exporting orders...")
+    counts = []
+    try:
+        for filename, status in [
+            ('new_ord.json', 'new'),
+            ('for_delivery.json', 'for_delivery'),
+            ('realized.json', 'realized')
+        ]:
+            stmt = db.select(Order).where(Order.status == status).order_by(Order.id)
+            _, count = stream_query(stmt, filename, fmt, compress)
+            counts.append(count)
+        logger.debug(f"Orders exported: {counts[0]} new, {counts[1]} delivery, {counts[2]} realized")
     except Exception as e:
         logger.error(f"Error exporting orders: {e}", exc_info=True)
         raise
 
-    return len(new_data), len(delivery_data), len(realized_data)
+    return tuple(counts)
 
 
-def export_lager():
+def export_lager(fmt='json', compress='none'):
     """Export lager items to JSON."""
     logger.debug("Exporting lager items...")
     try:
-        items = LagerItem.query.all()
-        data = [item.to_dict() for item in items]
-        logger.debug(f"Found {len(items)} lager items")
-
-        with open(os.path.join(DATA_DIR, 'lager.json'), 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        logger.debug(f"Lager exported: {len(data)} items")
-        return len(data)
+        _, count = stream_query(db.select(LagerItem).order_by(LagerItem.id), 'lager.json', fmt, compress)
+        logger.debug(f"Lager exported: {count} items")
+        return count
     except Exception as e:
         logger.error(f"Error exporting lager: {e}", exc_info=True)
         raise
 
 
+def export_order_items(fmt='json', compress='none'):
+    """Export the lines of multi-line orders to JSON."""
+    logger.debug("Exporting order items...")
+    try:
+        _, count = stream_query(db.select(OrderItem).order_by(OrderItem.id), 'order_items.json', fmt, compress)
+        logger.debug(f"Order items exported: {count} lines")
+        return count
+    except Exception as e:
+        logger.error(f"Error exporting order items: {e}", exc_info=True)
+        raise
+
+
 def export_email_config():
     """Export email config to JSON."""
     logger.debug("Exporting email config...")
@@ -115,32 +200,168 @@ def export_email_config():
         raise
 
 
-def export_notifications():
+def export_notifications(fmt='json', compress='none'):
     """Export notification log to JSON."""
     logger.debug("Exporting notification log...")
     try:
-        logs = NotificationLog.query.all()
-        data = [log.notify_key for log in logs]
-        logger.debug(f"Found {len(logs)} notification log entries")
-
-        with open(os.path.join(DATA_DIR, 'notified.json'), 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        logger.debug(f"Notification log exported: {len(data)} entries")
-        return len(data)
+        stmt = db.select(NotificationLog).order_by(NotificationLog.id)
+        _, count = stream_query(stmt, 'notified.json', fmt, compress, to_record=lambda log: log.notify_key)
+        logger.debug(f"Notification log exported: {count} entries")
+        return count
     except Exception as e:
         logger.error(f"Error exporting notification log: {e}", exc_info=True)
         raise
 
 
-def main():
+# ─── Incremental (sharded) export ──────────────────────────────
+# Shards are keyed by id range, not status or date: a status change edits
+# one line inside the same shard instead of moving a record between files.
+
+def serialize_shard(records):
+    """Stable, diff-friendly JSON: sorted keys, one record per line."""
+    lines = [json.dumps(r, ensure_ascii=False, sort_keys=True) for r in records]
+    return ('[\n' + ',\n'.join(lines) + '\n]\n').encode('utf-8')
+
+
+def load_manifest(export_dir):
+    path = os.path.join(export_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.warning(f"Manifest unreadable, all shards will be rechecked: {e}")
+        return {}
+
+
+def write_if_changed(export_dir, rel_path, content, manifest):
+    """Write a shard only when its sha256 differs from the manifest. Returns True if written."""
+    digest = hashlib.sha256(content).hexdigest()
+    path = os.path.join(export_dir, rel_path)
+    if manifest.get(rel_path) == digest and os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    manifest[rel_path] = digest
+    return True
+
+
+def iter_shards(query, id_column, shard_size):
+    """Yield (shard_no, [records]) walking the table in id order without loading it all."""
+    current, records = None, []
+    for obj in query.order_by(id_column).yield_per(shard_size):
+        shard_no = obj.id // shard_size
+        if current is not None and shard_no != current:
+            yield current, records
+            records = []
+        current = shard_no
+        records.append(obj.to_dict())
+    if current is not None:
+        yield current, records
+
+
+def export_sharded(export_dir=EXPORT_DIR, shard_size=DEFAULT_SHARD_SIZE):
+    """Export orders, lager and notification log as id-range shards.
+
+    Returns {'written': n, 'unchanged': n, 'removed': n}.
+    """
+    logger.debug(f"Sharded export to {export_dir} (shard size {shard_size})")
+    os.makedirs(export_dir, exist_ok=True)
+    manifest = load_manifest(export_dir)
+    if manifest.get('_shard_size') not in (None, shard_size):
+        logger.info("Shard size changed, rewriting all shards")
+        manifest = {}
+    stats = {'written': 0, 'unchanged': 0, 'removed': 0}
+    seen = set()
+
+    tables = [
+        ('orders', Order.query, Order.id),
+        ('order_items', OrderItem.query, OrderItem.id),
+        ('lager', LagerItem.query, LagerItem.id),
+        ('notified', NotificationLog.query, NotificationLog.id),
+    ]
+    for name, query, id_column in tables:
+        for shard_no, records in iter_shards(query, id_column, shard_size):
+            start = shard_no * shard_size
+            rel_path = f"{name}/{name}_{start:09d}-{start + shard_size - 1:09d}.json"
+            seen.add(rel_path)
+            if write_if_changed(export_dir, rel_path, serialize_shard(records), manifest):
+                stats['written'] += 1
+                logger.debug(f"Shard written: {rel_path} ({len(records)} records)")
+            else:
+                stats['unchanged'] += 1
+
+    config = EmailConfig.query.first()
+    if config:
+        data = {
+            'enabled': config.enabled,
+            'sender_email': config.sender_email,
+            'app_password': config.app_password,
+            'receiver_email': config.receiver_email,
+            'days_before': config.days_before
+        }
+        rel_path = 'email_config.json'
+        seen.add(rel_path)
+        content = (json.dumps(data, ensure_ascii=False, sort_keys=True, indent=2) + '\n').encode('utf-8')
+        if write_if_changed(export_dir, rel_path, content, manifest):
+            stats['written'] += 1
+        else:
+            stats['unchanged'] += 1
+
+    # Drop shards whose id range is now empty. The table folders are scanned
+    # too: after a shard size change the reset manifest no longer lists the old files
+    stale = {k for k in manifest if not k.startswith('_') and k not in seen}
+    for name, _, _ in tables:
+        table_dir = os.path.join(export_dir, name)
+        if os.path.isdir(table_dir):
+            stale.update(f"{name}/{f}" for f in os.listdir(table_dir)
+                         if f.startswith(f"{name}_") and f.endswith('.json') and f"{name}/{f}" not in seen)
+    for rel_path in sorted(stale):
+        path = os.path.join(export_dir, rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+        manifest.pop(rel_path, None)
+        stats['removed'] += 1
+        logger.debug(f"Shard removed: {rel_path}")
+
+    manifest['_shard_size'] = shard_size
+    with open(os.path.join(export_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, sort_keys=True, indent=1)
+        f.write('\n')
+
+    logger.info(f"Sharded export: {stats['written']} written, {stats['unchanged']} unchanged, {stats['removed']} removed")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export SQLite database to JSON')
+    parser.add_argument('--sharded', action='store_true',
+                        help='Incremental export: id-range shards in data/export, only changed shards rewritten')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help=f'Records per shard id range (default: {DEFAULT_SHARD_SIZE})')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='json',
+                        help='json (array, default) or ndjson (one record per line)')
+    parser.add_argument('--compress', choices=COMPRESSIONS, default='none',
+                        help='Compress output files (zstd requires the zstandard package)')
+    parser.add_argument('--data-dir', help='DATA_DIR sa erp.db (default: data/)')
+    args = parser.parse_args(argv)
+
+    global DATA_DIR, EXPORT_DIR
+    if args.data_dir:
+        DATA_DIR = args.data_dir
+        EXPORT_DIR = os.path.join(DATA_DIR, 'export')
+
     logger.info("Starting database export to JSON...")
     print('=' * 50)
     print(f'Database Export to JSON - {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
     print('=' * 50)
 
     try:
-        app = create_app()
+        app = create_db_app(data_dir=args.data_dir)
     except Exception as e:
         logger.error(f"Failed to create app: {e}", exc_info=True)
         print(f"Error: {e}")
@@ -158,15 +379,27 @@ def main():
         os.makedirs(DATA_DIR, exist_ok=True)
         logger.debug(f"Data directory ensured: {DATA_DIR}")
 
+        if args.sharded:
+            print('\nIncremental sharded export...')
+            stats = export_sharded(export_dir=EXPORT_DIR, shard_size=args.shard_size)
+            print(f"  Shards written:   {stats['written']}")
+            print(f"  Shards unchanged: {stats['unchanged']}")
+            print(f"  Shards removed:   {stats['removed']}")
+            print(f'  Location: {EXPORT_DIR}')
+            print('=' * 50)
+            return
+
         print('\nExporting orders...')
-        new_count, delivery_count, realized_count = export_orders()
-        print(f'  new_ord.json: {new_count} orders')
-        print(f'  for_delivery.json: {delivery_count} orders')
-        print(f'  realized.json: {realized_count} orders')
+        new_count, delivery_count, realized_count = export_orders(args.format, args.compress)
+        print(f'  new_ord: {new_count} orders')
+        print(f'  for_delivery: {delivery_count} orders')
+        print(f'  realized: {realized_count} orders')
+        item_count = export_order_items(args.format, args.compress)
+        print(f'  order_items: {item_count} lines')
 
         print('\nExporting lager...')
-        lager_count = export_lager()
-        print(f'  lager.json: {lager_count} items')
+        lager_count = export_lager(args.format, args.compress)
+        print(f'  lager: {lager_count} items')
 
         print('\nExporting email config...')
         email_exported = export_email_config()
@@ -176,8 +409,8 @@ def main():
             print('  email_config.json: no config found')
 
         print('\nExporting notification log...')
-        notif_count = export_notifications()
-        print(f'  notified.json: {notif_count} entries')
+        notif_count = export_notifications(args.format, args.compress)
+        print(f'  notified: {notif_count} entries')
 
         print('\n' + '=' * 50)
         print('Export complete!')
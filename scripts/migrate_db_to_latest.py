@@ -2,6 +2,9 @@
 """
 Comprehensive Database Migration Script
 Migrates database from commit 585d193 (Serbian fields) to latest version (English fields)
+
+Superseded by migrations.py (run at startup or via `erp db migrate`);
+kept for reference.
 """
 
 import sqlite3
@@ -1,23 +1,33 @@
 #!/usr/bin/env python3
 """
-migrate_json.py - Migrate existing JSON data to SQLite database.
+migrate_json.py - Fast streaming import of JSON/NDJSON data into SQLite.
 
 Run this ONCE after the refactor to import your existing data:
-    python migrate_json.py
+    python migrate_json.py [--data-dir DIR] [--batch-size 5000] [--yes] [--from-export]
 
 It will:
-  1. Read all JSON files from data/ (new_ord.json, for_delivery.json, realized.json, lager.json)
-  2. Read email_config.json and notified.json if they exist
-  3. Insert everything into the new SQLite database (data/erp.db)
-  4. Skip migration if the database already has data
+  1. Stream orders from new_ord, for_delivery and realized (.json or .ndjson/.jsonl),
+     lager items from lager, and notification keys from notified
+  2. Map legacy Serbian field names (naziv, cena, kupac, ...) to the current columns
+  3. Insert with executemany in batches, notification keys with INSERT OR IGNORE
+  4. Report rows per second for every file
 
-The original JSON files are NOT deleted (kept as backup).
+Files are parsed incrementally, so a multi-GB JSON array never has to fit
+in memory. The original JSON files are NOT deleted (kept as backup).
+
+With --from-export the same tables are restored from the id-range shards
+that `export_to_json.py --sharded` (backup.sh) keeps in DATA_DIR/export.
 """
 
+import glob
 import json
 import os
 import sys
+import time
+import sqlite3
 import logging
+import argparse
+from datetime import datetime
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -30,206 +40,374 @@ logging.basicConfig(
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
-from ERP_server import create_app
-from models import db, Order, LagerItem, EmailConfig, NotificationLog
+from ERP_server import create_db_app
+from models import to_minor
+from blueprints.search import SEARCH_INDEXES, ensure_search_index
+from blueprints.reports import ensure_sales_rollups, ensure_report_schema
+from blueprints.customers import ensure_customers
 
 
 BASE_DIR = PROJECT_ROOT
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-
-def load_json(filename):
-    """Load a JSON file from the data directory, return empty list/dict on failure."""
-    filepath = os.path.join(DATA_DIR, filename)
-    logger.debug(f"Loading JSON file: {filepath}")
-    if not os.path.exists(filepath):
-        logger.warning(f"JSON file not found: {filename}")
-        return []
-    try:
-        with open(filepath, encoding='utf-8') as f:
-            data = json.load(f)
-        logger.info(f"Successfully loaded {filename}")
-        return data
-    except (json.JSONDecodeError, IOError) as e:
-        print(f'  [WARNING] Could not read {filename}: {e}')
-        logger.error(f"Could not read {filename}: {e}", exc_info=True)
-        return []
-
-
-def migrate_orders():
-    """Migrate orders from all 3 JSON files."""
-    logger.debug("Starting orders migration from JSON files...")
+BATCH_SIZE = 5000
+READ_CHUNK = 1 << 16
+EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+ORDER_FILES = [('new_ord', 'new'), ('for_delivery', 'for_delivery'), ('realized', 'realized')]
+
+# column -> (accepted source keys, default, converter)
+ORDER_FIELDS = {
+    'id': (('id',), None, int),
+    'name': (('name', 'naziv'), '', str),
+    'price_minor': (('price', 'cena'), 0, to_minor),
+    'paid': (('paid', 'placeno'), False, bool),
+    'customer': (('customer', 'kupac'), '', str),
+    'date': (('date', 'datum'), '', str),
+    'quantity': (('quantity', 'kolicina'), 1, int),
+    'color': (('color', 'boja'), '', str),
+    'description': (('description', 'opis'), '', str),
+    'image': (('image', 'slika'), '', str),
+    'lager_id': (('lager_id',), None, int),
+}
+
+ORDER_ITEM_FIELDS = {
+    'id': (('id',), None, int),
+    'order_id': (('order_id',), None, int),
+    'lager_id': (('lager_id',), None, int),
+    'name': (('name', 'naziv'), '', str),
+    'color': (('color', 'boja'), '', str),
+    'quantity': (('quantity', 'kolicina'), 1, int),
+    'price_minor': (('price', 'cena'), 0, to_minor),
+    'reserved': (('reserved',), False, bool),
+}
+
+LAGER_FIELDS = {
+    'id': (('id',), None, int),
+    'name': (('name', 'naziv'), '', str),
+    'price_minor': (('price', 'cena'), 0, to_minor),
+    'color': (('color', 'boja'), '', str),
+    'quantity': (('quantity', 'kolicina'), 0, int),
+    'location': (('location', 'lokacija'), 'House', str),
+    'image': (('image', 'slika'), '', str),
+}
+
+
+# ─── Streaming parser ──────────────────────────────────────────
+
+def iter_json_records(filepath, chunk_size=READ_CHUNK):
+    """Yield records from a JSON array, NDJSON or concatenated JSON values.
+
+    Reads chunk_size characters at a time and decodes complete values with
+    JSONDecoder.raw_decode; a top-level array is unwrapped element by element.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, encoding='utf-8') as f:
+        buf, pos, eof = '', 0, False
+        in_array = None
+        while True:
+            # Skip whitespace, and commas/brackets between array elements
+            while pos < len(buf) and (buf[pos] in ' \t\r\n' or (in_array and buf[pos] in ',]')):
+                pos += 1
+            if pos < len(buf) and in_array is None:
+                in_array = buf[pos] == '['
+                if in_array:
+                    pos += 1
+                    continue
+
+            need_more = pos >= len(buf)
+            if not need_more:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # A number is only complete once a delimiter follows it
+                    need_more = (not eof and not isinstance(value, (dict, list, str))
+                                 and (end == len(buf) or buf[end] not in ' \t\r\n,]}'))
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    need_more = True
+            if need_more:
+                if eof:
+                    return
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            pos = end
+            if not in_array and isinstance(value, list):
+                yield from value
+            else:
+                yield value
+
+
+def find_source(data_dir, base):
+    """Return the first existing data_dir/base{.json,.ndjson,.jsonl}, or None."""
+    for ext in EXTENSIONS:
+        path = os.path.join(data_dir, base + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_sources(source_dir, base, sharded=False):
+    """Files holding `base` records: the single JSON/NDJSON file, or every shard of a sharded export."""
+    if sharded:
+        return sorted(glob.glob(os.path.join(source_dir, base, f'{base}_*.json')))
+    path = find_source(source_dir, base)
+    return [path] if path else []
+
+
+def iter_source_records(paths):
+    for path in paths:
+        yield from iter_json_records(path)
+
+
+def _source_label(paths):
+    if len(paths) == 1:
+        return os.path.basename(paths[0])
+    return f'{os.path.basename(os.path.dirname(paths[0]))}/ ({len(paths)} shards)'
+
+
+# ─── Field mapping ─────────────────────────────────────────────
+
+def map_record(record, fields):
+    """Map a legacy or current record onto a tuple of column values."""
+    values = []
+    for column, (keys, default, convert) in fields.items():
+        value = default
+        for key in keys:
+            if record.get(key) not in (None, ''):
+                value = convert(record[key])
+                break
+        values.append(value)
+    return tuple(values)
+
+
+# ─── Import ────────────────────────────────────────────────────
+
+def _insert_stream(conn, sql, rows, batch_size):
+    """executemany() the rows iterator in batches. Returns (count, seconds)."""
+    started = time.monotonic()
     count = 0
-    for filename, status in [
-        ('new_ord.json', 'new'),
-        ('for_delivery.json', 'for_delivery'),
-        ('realized.json', 'realized')
-    ]:
-        orders = load_json(filename)
-        if not orders:
-            print(f'  {filename}: 0 orders (empty or missing)')
-            logger.debug(f"{filename}: No orders to migrate")
-            continue
-
-        for o in orders:
-            order = Order(
-                naziv=o.get('naziv', ''),
-                cena=float(o.get('cena', 0)),
-                placeno=bool(o.get('placeno', False)),
-                kupac=o.get('kupac', ''),
-                datum=o.get('datum', ''),
-                kolicina=int(o.get('kolicina', 1)),
-                boja=o.get('boja', ''),
-                opis=o.get('opis', ''),
-                slika=o.get('slika', ''),
-                status=status,
-                lager_id=o.get('lager_id')
-            )
-            db.session.add(order)
-            count += 1
-
-        print(f'  {filename}: {len(orders)} orders migrated as "{status}"')
-        logger.debug(f"Migrated {len(orders)} orders from {filename} with status '{status}'")
-
-    logger.debug(f"Total orders migrated: {count}")
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count, time.monotonic() - started
+
+
+def _report(filename, count, elapsed, what):
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f'  {filename}: {count} {what} in {elapsed:.2f}s ({rate:,.0f} rows/s)')
+    logger.info(f"Imported {count} {what} from {filename} ({rate:.0f} rows/s)")
+
+
+def import_lager(conn, data_dir, batch_size, sharded=False):
+    paths = find_sources(data_dir, 'lager', sharded)
+    if not paths:
+        print('  lager: not found, skipping')
+        return 0
+    start_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM lager").fetchone()[0]
+    cols = ', '.join(LAGER_FIELDS)
+    marks = ', '.join('?' * len(LAGER_FIELDS))
+    rows = (map_record(r, LAGER_FIELDS) for r in iter_source_records(paths) if isinstance(r, dict))
+    count, elapsed = _insert_stream(conn, f"INSERT INTO lager ({cols}) VALUES ({marks})", rows, batch_size)
+
+    # Opening balances for the stock ledger, one set-based insert
+    conn.execute(
+        "INSERT INTO stock_movements (lager_id, delta, reason, created_at) "
+        "SELECT id, COALESCE(quantity, 0), 'initial', ? FROM lager WHERE id > ?",
+        (datetime.now().isoformat(timespec='seconds'), start_id)
+    )
+    _report(_source_label(paths), count, elapsed, 'items')
     return count
 
 
-def migrate_lager():
-    """Migrate lager items from lager.json."""
-    logger.debug("Starting lager migration from JSON...")
-    items = load_json('lager.json')
-    if not items:
-        print('  lager.json: 0 items (empty or missing)')
-        logger.debug("No lager items to migrate")
+def import_orders(conn, data_dir, batch_size, sharded=False):
+    cols = ', '.join(ORDER_FIELDS) + ', status'
+    marks = ', '.join('?' * (len(ORDER_FIELDS) + 1))
+    sql = f"INSERT INTO orders ({cols}) VALUES ({marks})"
+    if sharded:
+        # One orders/ shard set for all statuses; each record carries its own
+        paths = find_sources(data_dir, 'orders', sharded)
+        if not paths:
+            print('  orders: not found, skipping')
+            return 0
+        rows = (map_record(r, ORDER_FIELDS) + (r.get('status') or 'new',)
+                for r in iter_source_records(paths) if isinstance(r, dict))
+        count, elapsed = _insert_stream(conn, sql, rows, batch_size)
+        _report(_source_label(paths), count, elapsed, 'orders')
+        return count
+    total = 0
+    for base, status in ORDER_FILES:
+        path = find_source(data_dir, base)
+        if not path:
+            print(f'  {base}: not found, skipping')
+            continue
+        rows = (map_record(r, ORDER_FIELDS) + (status,)
+                for r in iter_json_records(path) if isinstance(r, dict))
+        count, elapsed = _insert_stream(conn, sql, rows, batch_size)
+        _report(os.path.basename(path), count, elapsed, f'orders as "{status}"')
+        total += count
+    return total
+
+
+def import_order_items(conn, data_dir, batch_size, sharded=False):
+    paths = find_sources(data_dir, 'order_items', sharded)
+    if not paths:
+        print('  order_items: not found, skipping')
         return 0
-
-    for item in items:
-        lager_item = LagerItem(
-            naziv=item.get('naziv', ''),
-            cena=float(item.get('cena', 0)),
-            boja=item.get('boja', ''),
-            kolicina=int(item.get('kolicina', 0)),
-            lokacija=item.get('lokacija', 'Kuća'),
-            slika=item.get('slika', '')
-        )
-        db.session.add(lager_item)
-
-    print(f'  lager.json: {len(items)} items migrated')
-    logger.debug(f"Migrated {len(items)} lager items")
-    return len(items)
-
-
-def migrate_email_config():
-    """Migrate email config from email_config.json."""
-    logger.debug("Starting email config migration...")
-    config_data = load_json('email_config.json')
-    if not config_data:
-        print('  email_config.json: not found or empty, skipping')
-        logger.debug("No email config to migrate")
+    cols = ', '.join(ORDER_ITEM_FIELDS)
+    marks = ', '.join('?' * len(ORDER_ITEM_FIELDS))
+    rows = (map_record(r, ORDER_ITEM_FIELDS) for r in iter_source_records(paths) if isinstance(r, dict))
+    count, elapsed = _insert_stream(conn, f"INSERT INTO order_items ({cols}) VALUES ({marks})", rows, batch_size)
+    # Orders keep their exported ids, so lines attach as-is; drop any whose order was not imported
+    orphans = conn.execute(
+        "DELETE FROM order_items WHERE order_id IS NULL OR order_id NOT IN (SELECT id FROM orders)"
+    ).rowcount
+    _report(_source_label(paths), count, elapsed, f'lines ({orphans} without order skipped)')
+    return count - orphans
+
+
+def import_notifications(conn, data_dir, batch_size, sharded=False):
+    paths = find_sources(data_dir, 'notified', sharded)
+    if not paths:
+        print('  notified: not found, skipping')
+        return 0
+    before = conn.execute("SELECT COUNT(*) FROM notification_log").fetchone()[0]
+    # Legacy files hold plain strings, exports hold {"notify_key": ...} objects
+    keys = ((r if isinstance(r, str) else r.get('notify_key'),) for r in iter_source_records(paths)
+            if isinstance(r, str) or (isinstance(r, dict) and r.get('notify_key')))
+    count, elapsed = _insert_stream(
+        conn, "INSERT OR IGNORE INTO notification_log (notify_key) VALUES (?)", keys, batch_size
+    )
+    added = conn.execute("SELECT COUNT(*) FROM notification_log").fetchone()[0] - before
+    _report(_source_label(paths), count, elapsed, f'keys ({added} new)')
+    return added
+
+
+def import_email_config(conn, data_dir):
+    filepath = os.path.join(data_dir, 'email_config.json')
+    if not os.path.exists(filepath):
+        print('  email_config.json: not found, skipping')
         return
-
-    # email_config.json is a dict, not a list
-    if isinstance(config_data, dict):
-        config = EmailConfig(
-            enabled=config_data.get('enabled', False),
-            sender_email=config_data.get('sender_email', ''),
-            app_password=config_data.get('app_password', ''),
-            receiver_email=config_data.get('receiver_email', ''),
-            days_before=int(config_data.get('days_before', 2))
-        )
-        db.session.add(config)
-        print('  email_config.json: migrated')
-        logger.debug("Email config migrated successfully")
-    else:
+    try:
+        with open(filepath, encoding='utf-8') as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        print(f'  [WARNING] Could not read email_config.json: {e}')
+        logger.error(f"Could not read email_config.json: {e}", exc_info=True)
+        return
+    if not isinstance(config, dict):
         print('  email_config.json: unexpected format, skipping')
-        logger.warning(f"Email config has unexpected format: {type(config_data)}")
-
-
-def migrate_notifications():
-    """Migrate notification log from notified.json."""
-    logger.debug("Starting notification log migration...")
-    notified = load_json('notified.json')
-    if not notified:
-        print('  notified.json: not found or empty, skipping')
-        logger.debug("No notifications to migrate")
+        logger.warning(f"Email config has unexpected format: {type(config)}")
         return
+    conn.execute(
+        "INSERT INTO email_config (enabled, sender_email, app_password, receiver_email, days_before) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (bool(config.get('enabled', False)), config.get('sender_email', ''),
+         config.get('app_password', ''), config.get('receiver_email', ''),
+         int(config.get('days_before', 2)))
+    )
+    print('  email_config.json: migrated')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream JSON/NDJSON data into the ERP SQLite database')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Folder sa JSON fajlovima i erp.db')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Redova po executemany pozivu')
+    parser.add_argument('--yes', action='store_true', help='Obriši postojeće podatke bez pitanja')
+    parser.add_argument('--from-export', action='store_true',
+                        help='Vrati podatke iz inkrementalnog exporta (DATA_DIR/export, backup.sh)')
+    args = parser.parse_args(argv)
+    source_dir = os.path.join(args.data_dir, 'export') if args.from_export else args.data_dir
+    if args.from_export and not os.path.isdir(source_dir):
+        print(f'GREŠKA: Export folder nije pronađen: {source_dir}')
+        return 1
 
-    count = 0
-    for key in notified:
-        if isinstance(key, str):
-            existing = NotificationLog.query.filter_by(notify_key=key).first()
-            if not existing:
-                db.session.add(NotificationLog(notify_key=key))
-                count += 1
-
-    print(f'  notified.json: {count} notification keys migrated')
-    logger.debug(f"Migrated {count} notification keys")
-
-
-def main():
     logger.info("Starting JSON to SQLite migration")
     print('=' * 50)
     print('JSON → SQLite Migration')
     print('=' * 50)
 
-    app = create_app()
+    # create_db_app() creates the schema and applies pending migrations
+    app = create_db_app(data_dir=args.data_dir)
+    db_file = os.path.join(args.data_dir, 'erp.db')
+    conn = sqlite3.connect(db_file, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA synchronous=NORMAL")
 
-    with app.app_context():
-        # Check if database already has data
-        existing_orders = Order.query.count()
-        existing_lager = LagerItem.query.count()
-        logger.debug(f"Current database state: {existing_orders} orders, {existing_lager} lager items")
-        
-        if existing_orders > 0 or existing_lager > 0:
+    try:
+        existing_orders = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        existing_lager = conn.execute("SELECT COUNT(*) FROM lager").fetchone()[0]
+        if existing_orders or existing_lager:
             print(f'\n  Database already has data ({existing_orders} orders, {existing_lager} lager items).')
             logger.warning("Database contains existing data")
-            answer = input('  Overwrite? (y/N): ').strip().lower()
-            logger.debug(f"User overwrite choice: {answer}")
+            answer = 'y' if args.yes else input('  Overwrite? (y/N): ').strip().lower()
             if answer != 'y':
                 print('  Migration cancelled.')
                 logger.info("Migration cancelled by user")
                 return
-            # Clear existing data
-            logger.debug("Clearing existing data...")
-            NotificationLog.query.delete()
-            EmailConfig.query.delete()
-            LagerItem.query.delete()
-            Order.query.delete()
-            db.session.commit()
-            print('  Existing data cleared.\n')
-            logger.debug("Existing data cleared successfully")
-
-        print('\nMigrating orders...')
-        order_count = migrate_orders()
-
-        print('\nMigrating lager...')
-        lager_count = migrate_lager()
 
-        print('\nMigrating email config...')
-        migrate_email_config()
-
-        print('\nMigrating notification log...')
-        migrate_notifications()
-
-        # Commit all changes
+        started = time.monotonic()
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            db.session.commit()
-            logger.debug("All migrations committed to database")
+            # Per-row FTS and change-log triggers would dominate the import;
+            # drop them here and let the ensure_* helpers recreate them after commit
+            triggers = [f"{name}_{suffix}" for name in list(SEARCH_INDEXES) + ['order_changes']
+                        for suffix in ('ai', 'ad', 'au')]
+            for trigger in triggers:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+            if existing_orders or existing_lager:
+                for table in ('notification_log', 'email_config', 'stock_movements',
+                              'stock_snapshots', 'sales_rollups', 'order_items', 'orders',
+                              'customers', 'lager'):
+                    conn.execute(f"DELETE FROM {table}")
+                print('  Existing data cleared.\n')
+
+            print('\nMigrating lager...')
+            lager_count = import_lager(conn, source_dir, args.batch_size, args.from_export)
+            print('\nMigrating orders...')
+            order_count = import_orders(conn, source_dir, args.batch_size, args.from_export)
+            print('\nMigrating order items...')
+            import_order_items(conn, source_dir, args.batch_size, args.from_export)
+            print('\nMigrating email config...')
+            import_email_config(conn, source_dir)
+            print('\nMigrating notification log...')
+            import_notifications(conn, source_dir, args.batch_size, args.from_export)
+            conn.execute("COMMIT")
         except Exception as e:
-            logger.error(f"Failed to commit migrations: {e}", exc_info=True)
-            db.session.rollback()
+            conn.execute("ROLLBACK")
+            logger.error(f"Migration failed, rolled back: {e}", exc_info=True)
             raise
+    finally:
+        conn.close()
 
-        print('\n' + '=' * 50)
-        print(f'Migration complete!')
-        print(f'  Orders: {order_count}')
-        print(f'  Lager items: {lager_count}')
-        print(f'  Database: {os.path.join(DATA_DIR, "erp.db")}')
-        print(f'\nOriginal JSON files are preserved in data/ as backup.')
-        print('=' * 50)
-        logger.debug(f"Migration completed: {order_count} orders, {lager_count} lager items")
+    with app.app_context():
+        ensure_search_index()
+        ensure_report_schema()
+        ensure_sales_rollups()
+        ensure_customers()
+    elapsed = time.monotonic() - started
+
+    total = lager_count + order_count
+    print('\n' + '=' * 50)
+    print('Migration complete!')
+    print(f'  Orders: {order_count}')
+    print(f'  Lager items: {lager_count}')
+    print(f'  Time: {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)')
+    print(f'  Database: {db_file}')
+    print('\nOriginal JSON files are preserved as backup.')
+    print('=' * 50)
+    logger.info(f"Migration completed: {order_count} orders, {lager_count} lager items in {elapsed:.2f}s")
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+stress_lager.py - Concurrency stress test for atomic stock reservation.
+
+Creates a scratch database, then runs many threads against ONE lager item
+through the real API routes (order_from_lager, increase_quantity,
+return_to_lager). At the end the stock must balance exactly:
+
+    initial + increases + returned - reserved == final quantity
+
+and the item must never go negative or be oversold.
+
+Run:
+    python scripts/stress_lager.py --threads 16 --requests 50 --stock 200
+"""
+
+import os
+import sys
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+# Ensure we can import from the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from ERP_server import create_app
+from models import db, User, Order, LagerItem
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='[%(levelname)s] - [%(name)s] - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+USERNAME = 'stress'
+PASSWORD = 'stress-pass'
+
+
+def setup(app, stock):
+    """Create the test user and the single contested lager item."""
+    with app.app_context():
+        user = User(username=USERNAME, email='stress@local')
+        user.set_password(PASSWORD)
+        item = LagerItem(name='Stress item', price=100, quantity=stock)
+        db.session.add_all([user, item])
+        db.session.commit()
+        return item.id
+
+
+def worker(app, item_id, requests, stats, lock, errors):
+    """One thread: own test client, random mix of reserve/increase/return."""
+    client = app.test_client()
+    client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+    rng = random.Random()
+    my_orders = []
+
+    for _ in range(requests):
+        action = rng.random()
+        try:
+            if action < 0.7:
+                qty = rng.randint(1, 3)
+                r = client.post('/api/order_from_lager', json={
+                    'lager_id': item_id, 'quantity': qty,
+                    'name': 'Stress order', 'customer': 'Stress', 'price': 100
+                })
+                status = r.get_json()['status']
+                with lock:
+                    if status == 'for_delivery':
+                        stats['reserved'] += qty
+                    else:
+                        stats['rejected'] += 1
+            elif action < 0.85:
+                qty = rng.randint(1, 5)
+                r = client.post(f'/api/inventory/{item_id}/increase_quantity', json={'quantity': qty})
+                if r.status_code == 200:
+                    with lock:
+                        stats['increased'] += qty
+                else:
+                    errors.append(f"increase_quantity -> {r.status_code}")
+            else:
+                if not my_orders:
+                    with app.app_context():
+                        rows = db.session.execute(
+                            db.select(Order.id).where(Order.status == 'for_delivery').limit(5)
+                        ).scalars().all()
+                    my_orders.extend(rows)
+                if my_orders:
+                    order_id = my_orders.pop()
+                    with app.app_context():
+                        order = db.session.get(Order, order_id)
+                        qty = order.quantity if order else 0
+                    r = client.post(f'/api/return_to_lager/{order_id}')
+                    if r.status_code == 200:
+                        with lock:
+                            stats['returned'] += qty
+        except Exception as e:
+            errors.append(repr(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress test atomic lager reservation')
+    parser.add_argument('--threads', type=int, default=16, help='Broj niti (default: 16)')
+    parser.add_argument('--requests', type=int, default=50, help='Zahteva po niti (default: 50)')
+    parser.add_argument('--stock', type=int, default=200, help='Početna količina (default: 200)')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='erp_stress_')
+    try:
+        app = create_app(data_dir=data_dir)
+        logging.getLogger().setLevel(logging.WARNING)
+        item_id = setup(app, args.stock)
+
+        stats = {'reserved': 0, 'rejected': 0, 'increased': 0, 'returned': 0}
+        lock = threading.Lock()
+        errors = []
+        threads = [
+            threading.Thread(target=worker, args=(app, item_id, args.requests, stats, lock, errors))
+            for _ in range(args.threads)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with app.app_context():
+            final = db.session.get(LagerItem, item_id).quantity
+            reserved_in_db = db.session.execute(
+                db.select(db.func.coalesce(db.func.sum(Order.quantity), 0))
+                .where(Order.status == 'for_delivery', Order.lager_id == item_id)
+            ).scalar()
+
+        expected = args.stock + stats['increased'] + stats['returned'] - stats['reserved']
+        print('=' * 50)
+        print(f"Threads: {args.threads} x {args.requests} requests")
+        print(f"Initial stock:  {args.stock}")
+        print(f"Reserved:       {stats['reserved']} (rejected {stats['rejected']})")
+        print(f"Increased:      {stats['increased']}")
+        print(f"Returned:       {stats['returned']}")
+        print(f"Final stock:    {final} (expected {expected})")
+        print(f"Held by orders: {reserved_in_db}")
+        print('=' * 50)
+
+        ok = True
+        if errors:
+            ok = False
+            print(f"✗ {len(errors)} request errors, first: {errors[0]}")
+        if final != expected:
+            ok = False
+            print("✗ Lost update detected: final stock does not balance")
+        if final < 0:
+            ok = False
+            print("✗ Stock went negative")
+        if final + reserved_in_db != args.stock + stats['increased']:
+            ok = False
+            print("✗ Stock + reserved orders does not match total supply")
+        print("✓ Stock balances under concurrency" if ok else "✗ Stress test FAILED")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()